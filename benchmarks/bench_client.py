@@ -0,0 +1,131 @@
+
+""" Benchmarks of the overhead of making API calls. """
+
+import threading
+from time import time
+
+from domain.cache import MemoryCache
+from domain.ratelimit import (RateLimiter, SlidingWindow)
+
+from .common import client
+
+
+class Dispatch(object):
+
+    r""" The overhead of choosing credentials and a token for an API call. """
+
+    def setup(self):
+        self.client = client()
+        # Skip the request itself, to time only `requires_scope`.
+        self.client._api_request = lambda end_point, token, **kwargs: token
+        self.client.agencies(1)
+
+
+    def teardown(self):
+        self.client.close()
+
+
+    def time_requires_scope(self):
+        self.client.agencies(1)
+
+
+    def time_requires_scope_with_token(self):
+        self.client.agencies(1, token=self.client._credentials[0].token)
+
+
+
+class Request(object):
+
+    r""" The overhead of a complete API call to an in-process stand-in. """
+
+    params = [False, True]
+    param_names = ["cache"]
+
+    def setup(self, cache):
+        self.client = client(cache=MemoryCache() if cache else None)
+        self.client.agencies(1)
+
+
+    def teardown(self, cache):
+        self.client.close()
+
+
+    def time_api_request(self, cache):
+        self.client.agencies(1)
+
+
+    def time_api_request_models(self, cache):
+        self.client.agencies(1, models=True)
+
+
+    def time_session_setup(self, cache):
+        self.client._sessions.pop("api").close()
+        self.client._api_session
+
+
+
+class Throttle(object):
+
+    r""" The accuracy of the rate limiter with many threads waiting. """
+
+    params = [5, 20]
+    param_names = ["rate"]
+    timeout = 120
+
+    def _calls(self, rate, threads=8, seconds=2):
+        limiter = RateLimiter(SlidingWindow(rate))
+        times, lock = ([], threading.Lock())
+
+        def work():
+            for _ in range(rate * seconds // threads + 1):
+                limiter.acquire()
+                with lock:
+                    times.append(time())
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return sorted(times)
+
+
+    def track_max_calls_per_second(self, rate):
+        times = self._calls(rate)
+        return max(sum(1 for t in times[i:] if t < start + 1)
+                   for i, start in enumerate(times))
+
+    track_max_calls_per_second.unit = "calls"
+
+
+    def track_achieved_rate(self, rate):
+        times = self._calls(rate)
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    track_achieved_rate.unit = "calls/s"
+
+
+
+class Pagination(object):
+
+    r""" The throughput of iterating over every item of a paginated end point. """
+
+    params = [0, 2]
+    param_names = ["prefetch"]
+
+    def setup(self, prefetch):
+        self.client = client()
+
+
+    def teardown(self, prefetch):
+        self.client.close()
+
+
+    def time_iter_agencies_listings(self, prefetch):
+        for _ in self.client.iter_agencies_listings(1, prefetch=prefetch):
+            pass
+
+
+    def time_batch(self, prefetch):
+        for _ in self.client.map_endpoint("agencies", range(100)):
+            pass
@@ -0,0 +1,49 @@
+
+""" Benchmarks of the memory held by decoded responses and their models. """
+
+import gc
+import json
+import tracemalloc
+
+from domain import models
+from domain.standin import _listing
+
+
+class Memory(object):
+
+    r"""
+    The bytes held per listing: as decoded dictionaries, as models, and as
+    models after every field has been accessed.
+    """
+
+    params = ["dicts", "models", "models_accessed"]
+    param_names = ["kind"]
+
+    def setup(self, kind):
+        self.body = json.dumps([_listing(i) for i in range(20000)]).encode()
+
+
+    def _held(self, kind):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            listings = json.loads(self.body)
+            if kind != "dicts":
+                listings = models.wrap("agencies/1/listings", listings)
+            if kind == "models_accessed":
+                for listing in listings:
+                    for name in ("address", "geo_location", "price_details",
+                                 "media", "date_listed", "date_updated"):
+                        getattr(listing, name)
+            gc.collect()
+            held = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        return held / len(listings)
+
+
+    def track_bytes_per_listing(self, kind):
+        return self._held(kind)
+
+    track_bytes_per_listing.unit = "bytes"
@@ -0,0 +1,73 @@
+
+""" Benchmarks of decoding and parsing responses. """
+
+import json
+
+from domain import (decoders, export, models, streaming)
+from domain.standin import (_listing, _sales_result)
+
+
+class Decode(object):
+
+    r""" Decoding listing payloads of different sizes with each decoder. """
+
+    params = ([10, 200, 1000], decoders.available_decoders())
+    param_names = ["items", "decoder"]
+
+    def setup(self, items, decoder):
+        self.body = json.dumps([_listing(i) for i in range(items)]).encode()
+        self.decode = decoders.get_decoder(decoder)
+
+
+    def time_decode(self, items, decoder):
+        self.decode(self.body)
+
+
+    def time_stream(self, items, decoder):
+        parser = streaming.ArrayParser()
+        for start in range(0, len(self.body), 65536):
+            for item in parser.feed(self.body[start:start + 65536]):
+                self.decode(item)
+
+
+    def track_bytes(self, items, decoder):
+        return len(self.body)
+
+    track_bytes.unit = "bytes"
+
+
+
+class Models(object):
+
+    r""" Wrapping responses in models, and accessing their fields. """
+
+    def setup(self):
+        self.listings = [_listing(i) for i in range(1000)]
+
+
+    def time_wrap(self):
+        models.wrap("agencies/1/listings", self.listings)
+
+
+    def time_nested_fields(self):
+        for listing in models.wrap("agencies/1/listings", self.listings):
+            listing.address.suburb
+            listing.date_updated
+
+
+    def peakmem_models(self):
+        [models.Listing(dict(each)) for each in self.listings]
+
+
+
+class Export(object):
+
+    r""" Converting sales results to columns. """
+
+    def setup(self):
+        self.sales = [_sales_result(i) for i in range(5000)]
+
+
+    def time_iter_columns(self):
+        for _ in export.iter_columns(self.sales, "sales_results_listings"):
+            pass
@@ -0,0 +1,29 @@
+
+""" Benchmarks of parameter validation. """
+
+from domain import validate
+
+
+class Validate(object):
+
+    def setup(self):
+        self.parameters = [dict(city=["sydney", "Melbourne", "BRISBANE"][i % 3],
+                                level="suburb")
+                           for i in range(10000)]
+
+
+    def time_case_insensitive_string(self):
+        validate.case_insensitive_string("suburb", ("Postcode", "Suburb"))
+
+
+    def time_city(self):
+        validate.city("melbourne")
+
+
+    def time_property_types(self):
+        validate.property_types(["house", "Townhouse", "villa"])
+
+
+    def time_batch(self):
+        validate.batch(self.parameters, city=validate.city,
+                       level=("Postcode", "Suburb"))
@@ -0,0 +1,49 @@
+
+""" Shared set up for the benchmarks. """
+
+import os
+import tempfile
+
+import yaml
+
+from domain.client import DomainClient
+from domain.standin import (StandIn, StandInAdapter)
+
+
+def credentials(rate_limit=0, daily_quota=None):
+    r"""
+    Write a credentials file for the stand-in API, and return its path.
+
+    :param rate_limit: [optional]
+        The client-side rate limit (calls per second). Zero disables it.
+
+    :param daily_quota: [optional]
+        The client-side daily quota.
+    """
+    entries = [dict(client_id=f"benchmark-{plan}", client_secret="secret",
+                    package_and_plan=plan, rate_limit=rate_limit,
+                    daily_quota=daily_quota)
+               for plan in ("AgentsAndListingsBusinessPlan",
+                            "PropertyAndLocationBusinessPlan")]
+    fd, path = tempfile.mkstemp(suffix=".yaml")
+    with os.fdopen(fd, "w") as fp:
+        yaml.dump(entries, fp)
+    return path
+
+
+def client(standin=None, rate_limit=0, **kwargs):
+    r"""
+    Return a client that sends requests to a stand-in API in this process.
+
+    :param standin: [optional]
+        The :class:`domain.standin.StandIn` to use.
+
+    :param rate_limit: [optional]
+        The client-side rate limit (calls per second). Zero disables it.
+    """
+    path = credentials(rate_limit)
+    try:
+        return DomainClient(path, transport=StandInAdapter(standin or StandIn()),
+                            **kwargs)
+    finally:
+        os.remove(path)
@@ -0,0 +1,495 @@
+
+""" Resolve addresses to properties, in bulk. """
+
+import json
+import re
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from itertools import islice
+from time import time
+
+from .sqlite import Database
+
+__all__ = ["street_types", "states", "normalise", "components", "given",
+           "similarity",
+           "AddressCache", "AddressResolver"]
+
+# Street types and their abbreviations, as given in `addressComponents`.
+street_types = OrderedDict([
+    ("street", "st"), ("road", "rd"), ("avenue", "ave"), ("av", "ave"),
+    ("crescent", "cres"), ("cr", "cres"), ("court", "ct"), ("drive", "dr"),
+    ("parade", "pde"), ("place", "pl"), ("terrace", "tce"), ("highway", "hwy"),
+    ("close", "cl"), ("boulevard", "bvd"), ("boulevarde", "bvd"), ("lane", "ln"),
+    ("grove", "gr"), ("circuit", "cct"), ("esplanade", "esp"), ("square", "sq"),
+    ("parkway", "pkwy"), ("circle", "cir"), ("way", "way"), ("rise", "rise"),
+    ("walk", "walk"), ("mews", "mews"), ("row", "row"), ("track", "trk"),
+    ("gardens", "gdns"), ("heights", "hts"), ("promenade", "prom"),
+])
+
+# The abbreviations of states and territories.
+states = OrderedDict([
+    ("new south wales", "nsw"), ("victoria", "vic"), ("queensland", "qld"),
+    ("south australia", "sa"), ("western australia", "wa"), ("tasmania", "tas"),
+    ("northern territory", "nt"), ("australian capital territory", "act"),
+])
+
+_abbreviations = frozenset(street_types.values())
+_states = frozenset(states.values())
+_state_names = re.compile(r"\b(" + "|".join(states) + r")\b")
+# A unit prefix is only taken as one when it is followed by a unit number (or
+# letter) and then the street number, so "Unley Road" is left alone.
+_units = re.compile(r"^(?:(?:unit|apartment|apt|flat|shop|suite)\s+|u)"
+                    r"(\d\w*|[a-z])\s*,?\s*(?:/\s*)?(?=\d)")
+
+
+def normalise(address):
+    r"""
+    Return an address in a canonical form, so that equivalent addresses are
+    equal: lower case, without punctuation, with abbreviated street types and
+    states, and with units given as `unit/number`. For example,
+
+    - `Unit 3, 12 Smith Street, Kew, Victoria 3101` becomes
+      `3/12 smith st kew vic 3101`,
+    - `U4 55 High St.` becomes `4/55 high st`,
+    - `Unley Road, Unley SA 5061` becomes `unley rd unley sa 5061`, and
+    - `12 Flat Rock Road` (and `Flat Rock Road`) keep `flat rock rd`.
+
+    :param address:
+        The address.
+    """
+    address = f"{address}".casefold().strip()
+    address = _state_names.sub(lambda match: states[match.group(1)], address)
+    address = _units.sub(lambda match: f"{match.group(1)}/", address, count=1)
+    address = re.sub(r"\s*/\s*", "/", address)
+    address = re.sub(r"[^\w/\-\s]", " ", address)
+
+    tokens = address.split()
+    for i, token in enumerate(tokens):
+        # Only the first street type is abbreviated, so that suburbs named
+        # like streets (e.g., Ocean Grove) are left alone.
+        if token in street_types and i > 0 and street_types[token] != token:
+            tokens[i] = street_types[token]
+            break
+        if token in _abbreviations and i > 0:
+            break
+    return " ".join(tokens)
+
+
+def components(address):
+    r"""
+    Return a dictionary of the components of a normalised address (see
+    :func:`normalise`): `unit_number`, `street_number`, `street_name`,
+    `street_type`, `suburb`, `state`, and `postcode`. Components that cannot
+    be found are `None`.
+
+    :param address:
+        The normalised address.
+    """
+    tokens = address.split()
+    parts = dict(unit_number=None, street_number=None, street_name=None,
+                 street_type=None, suburb=None, state=None, postcode=None)
+
+    if tokens and re.fullmatch(r"\d{4}", tokens[-1]):
+        parts["postcode"] = tokens.pop()
+    if tokens and tokens[-1] in _states:
+        parts["state"] = tokens.pop()
+
+    if tokens and re.match(r"^([\w\-]+/)?[\w\-]*\d[\w\-]*$", tokens[0]):
+        number = tokens.pop(0)
+        if "/" in number:
+            parts["unit_number"], number = number.split("/", 1)
+        parts["street_number"] = number
+
+    for i, token in enumerate(tokens):
+        if token in _abbreviations and i > 0:
+            parts.update(street_name=" ".join(tokens[:i]), street_type=token,
+                         suburb=" ".join(tokens[i + 1:]) or None)
+            break
+    else:
+        parts["street_name"] = " ".join(tokens) or None
+    return parts
+
+
+def similarity(a, b):
+    r"""
+    Return the similarity (between 0 and 1) of two normalised addresses.
+    Addresses with different street (or unit) numbers are not similar.
+
+    :param a:
+        A normalised address.
+
+    :param b:
+        Another normalised address.
+    """
+    if a == b:
+        return 1.0
+    numbers_a, numbers_b = (re.findall(r"\d+", a.split(" ", 1)[0]),
+                            re.findall(r"\d+", b.split(" ", 1)[0]))
+    if numbers_a != numbers_b:
+        return 0.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def _join(parts):
+    r""" Return a normalised address from its components. """
+    number = parts["street_number"]
+    if number is not None and parts["unit_number"] is not None:
+        number = f"{parts['unit_number']}/{number}"
+    return " ".join(part for part in (
+        number, parts["street_name"], parts["street_type"], parts["suburb"],
+        parts["state"], parts["postcode"]) if part is not None)
+
+
+def given(address, like):
+    r"""
+    Return a normalised address with only the components that another one
+    has, so that a suggested address (e.g., `12 smith st kew vic 3101`) can be
+    compared with what was given (e.g., `12 smith st kew`).
+
+    :param address:
+        The normalised address to restrict (e.g., a suggestion).
+
+    :param like:
+        The normalised address that was given.
+    """
+    parts, wanted = (components(address), components(like))
+    return _join(dict((name, value if wanted[name] is not None else None)
+                      for name, value in parts.items()))
+
+
+def _block(address):
+    r"""
+    Return the key that candidates for fuzzy matching are grouped by: the
+    street (and unit) number and the postcode, or the first letter of the
+    street name if there is no postcode.
+    """
+    parts = components(address)
+    if parts["street_number"] is None:
+        return None
+    number = f"{parts['unit_number'] or ''}/{parts['street_number']}"
+    if parts["postcode"] is not None:
+        return f"{number} {parts['postcode']}"
+    return f"{number} {(parts['street_name'] or ' ')[0]}"
+
+
+
+class AddressCache(Database):
+
+    r"""
+    A cache of resolved addresses, backed by SQLite, keyed by the normalised
+    address (see :func:`normalise`).
+
+    The best suggestion for each address is cached with its confidence, even if
+    it is not confident enough to resolve the address, so that the minimum
+    confidence can be changed without requesting the address again (unless
+    `refresh` is given to the resolver).
+
+    :param path: [optional]
+        The path of the SQLite database. If `:memory:` is given, the cache is
+        held in memory.
+
+    :param timeout: [optional]
+        The number of seconds to wait for the database to be unlocked.
+    """
+
+    def __init__(self, path=":memory:", timeout=30):
+        super(AddressCache, self).__init__(path, timeout)
+        with self._transaction() as connection:
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS addresses (
+                    key TEXT PRIMARY KEY,
+                    block TEXT,
+                    property_id TEXT,
+                    address TEXT,
+                    confidence REAL,
+                    source TEXT,
+                    ids TEXT,
+                    resolved REAL NOT NULL)""")
+            connection.execute(
+                """CREATE INDEX IF NOT EXISTS addresses_block
+                    ON addresses (block)""")
+        return None
+
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM addresses").fetchone()[0]
+
+
+    def get_many(self, keys):
+        r"""
+        Return a dictionary of the cached resolutions of normalised addresses.
+
+        :param keys:
+            A list of normalised addresses.
+        """
+        found = dict()
+        keys = list(keys)
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._connection.execute(
+                    f"""SELECT key, property_id, address, confidence, source, ids
+                        FROM addresses WHERE key IN ({', '.join('?' * len(chunk))})""",
+                    chunk)
+                for row in rows:
+                    found[row[0]] = _resolution(*row)
+        return found
+
+
+    def candidates(self, block):
+        r"""
+        Return a list of the resolved addresses (and their resolutions) that
+        are candidates for a fuzzy match with an address in the given block.
+        """
+        rows = self._rows(
+            """SELECT key, property_id, address, confidence, source, ids
+                FROM addresses WHERE block = ? AND property_id IS NOT NULL""",
+            (block, ))
+        return [(row[0], _resolution(*row)) for row in rows]
+
+
+    def set_many(self, resolutions):
+        r"""
+        Cache the resolutions of normalised addresses.
+
+        :param resolutions:
+            A dictionary of normalised addresses and their resolutions.
+        """
+        now = time()
+        rows = [(key, _block(key), r["property_id"], r["address"],
+                 r["confidence"], r["source"],
+                 None if r.get("ids", None) is None else json.dumps(r["ids"]), now)
+                for key, r in resolutions.items()]
+        with self._transaction() as connection:
+            connection.executemany(
+                """REPLACE INTO addresses (key, block, property_id, address,
+                    confidence, source, ids, resolved)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+
+
+
+def _failed(exception):
+    r""" Return the resolution of an address whose request failed. """
+    return dict(property_id=None, address=None, confidence=0.0, source="error",
+                ids=None, error=f"{type(exception).__name__}: {exception}")
+
+
+def _resolution(key, property_id, address, confidence, source, ids=None):
+    if isinstance(ids, str):
+        ids = json.loads(ids)
+    return dict(property_id=property_id, address=address, confidence=confidence,
+                source=source, ids=ids)
+
+
+
+class AddressResolver(object):
+
+    r"""
+    Resolve addresses to Domain property identifiers, in bulk.
+
+    Addresses are normalised (see :func:`normalise`) and deduplicated, and
+    resolved from the cache where possible: first exactly, and then by fuzzy
+    matching against cached addresses with the same street number and
+    postcode. Only the remaining addresses are requested from the API (with
+    :meth:`domain.client.DomainClient.properties_suggest`), concurrently.
+
+    The confidence of a suggestion is its `relativeScore` (as a fraction)
+    times the similarity of its address to the given address (see
+    :func:`similarity`), where only the components of the address that were
+    given are compared (see :func:`given`). For example, `12 Smith St, Kew`
+    matches the suggestion `12 Smith Street, Kew VIC 3101` exactly.
+
+    :param client:
+        A :class:`domain.client.DomainClient`.
+
+    :param cache: [optional]
+        An :class:`AddressCache`, or the path of one. Defaults to a cache in
+        memory.
+
+    :param min_confidence: [optional]
+        The minimum confidence of a resolution. Addresses whose best
+        suggestion is less certain are unresolved (their `property_id` is
+        `None`, but the suggestion and its confidence are given). This is
+        applied when addresses are resolved, including from the cache.
+
+    :param fuzzy: [optional]
+        The minimum similarity of a cached address for a fuzzy match. If
+        `None` is given, there is no fuzzy matching.
+
+    :param locate: [optional]
+        Also look up the identifiers of each address with
+        :meth:`domain.client.DomainClient.address_locators` (this requires
+        the `api_addresslocators_read` scope).
+
+    :param chunk_size: [optional]
+        The number of addresses to resolve at a time.
+    """
+
+    def __init__(self, client, cache=None, min_confidence=0.8, fuzzy=0.92,
+                 locate=False, chunk_size=10000):
+        if not isinstance(cache, AddressCache):
+            cache = AddressCache(":memory:" if cache is None else cache)
+        self.client = client
+        self.cache = cache
+        self.min_confidence = min_confidence
+        self.fuzzy = fuzzy
+        self.locate = locate
+        self.chunk_size = chunk_size
+        return None
+
+
+    def resolve(self, address, refresh=False):
+        r"""
+        Resolve an address, and return a dictionary of the `address` given,
+        its `normalised` form, the `property_id` (or `None`), the suggested
+        `address`, the `confidence`, and the `source` of the resolution
+        (`cache`, `fuzzy`, or `suggest`). If the request for the address
+        failed, the `source` is `error` and the `error` is given; these
+        addresses are not cached, so they are requested again next time.
+        If `locate` is enabled and only the `address_locators` request failed,
+        the resolution is kept and the failure is given as `locate_error`.
+
+        :param address:
+            The address.
+
+        :param refresh: [optional]
+            Request the address from the API, even if it is cached.
+        """
+        return next(self.resolve_many([address], refresh))
+
+
+    def resolve_many(self, addresses, refresh=False):
+        r"""
+        Resolve many addresses, and yield their resolutions (see
+        :meth:`resolve`) in the same order. Addresses are consumed lazily, in
+        chunks, so any number can be given.
+
+        :param addresses:
+            An iterable of addresses.
+
+        :param refresh: [optional]
+            Request the addresses from the API, even if they are cached.
+        """
+        addresses = iter(addresses)
+        while True:
+            chunk = list(islice(addresses, self.chunk_size))
+            if not chunk:
+                break
+            yield from self._resolve_chunk(chunk, refresh)
+
+
+    def _resolve_chunk(self, addresses, refresh):
+        keys = [normalise(address) for address in addresses]
+        distinct = list(OrderedDict.fromkeys(key for key in keys if key))
+
+        found = dict() if refresh else self.cache.get_many(distinct)
+        for key in found:
+            found[key] = dict(found[key], source="cache")
+
+        missing = [key for key in distinct if key not in found]
+        if self.fuzzy is not None and not refresh:
+            for key in list(missing):
+                match = self._fuzzy(key)
+                if match is not None:
+                    found[key] = match
+                    missing.remove(key)
+
+        found.update(self._suggest(missing))
+
+        empty = dict(property_id=None, address=None, confidence=0.0, source=None,
+                     ids=None)
+        for address, key in zip(addresses, keys):
+            resolution = dict(found.get(key, empty), input=address, normalised=key)
+            if (resolution["confidence"] or 0) < self.min_confidence:
+                resolution["property_id"] = None
+            yield resolution
+
+
+    def _fuzzy(self, key):
+        r"""
+        Return the resolution of the most similar cached address, if it is
+        similar enough.
+        """
+        block = _block(key)
+        if block is None:
+            return None
+
+        best, best_similarity = (None, self.fuzzy)
+        for candidate, resolution in self.cache.candidates(block):
+            s = similarity(key, candidate)
+            if s >= best_similarity:
+                best, best_similarity = (resolution, s)
+
+        if best is None:
+            return None
+        confidence = round((best["confidence"] or 0) * best_similarity, 4)
+        if confidence < self.min_confidence:
+            return None
+        return dict(best, source="fuzzy", confidence=confidence)
+
+
+    def _suggest(self, keys):
+        r"""
+        Request suggestions for addresses from the API, and cache the
+        resolutions.
+        """
+        if not keys:
+            return dict()
+
+        resolutions = dict()
+        results = self.client.map_endpoint(
+            "properties_suggest", [dict(terms=key) for key in keys])
+        for key, suggestions in zip(keys, results):
+            if isinstance(suggestions, Exception):
+                resolutions[key] = _failed(suggestions)
+            else:
+                resolutions[key] = self._best(key, suggestions or [])
+
+        if self.locate:
+            self._locate(resolutions)
+
+        # Failed requests are not cached, so that they are tried again.
+        self.cache.set_many(dict((key, resolution)
+                                 for key, resolution in resolutions.items()
+                                 if resolution.get("error", None) is None))
+        return resolutions
+
+
+    def _best(self, key, suggestions):
+        r""" Return the resolution of the best of the suggestions. """
+        best = dict(property_id=None, address=None, confidence=0.0,
+                    source="suggest", ids=None)
+        for suggestion in suggestions:
+            score = (suggestion.get("relativeScore", None) or 0) / 100
+            suggested = given(normalise(suggestion.get("address", "")), key)
+            confidence = round(score * similarity(key, suggested), 4)
+            if confidence > best["confidence"]:
+                best.update(property_id=suggestion.get("id", None),
+                            address=suggestion.get("address", None),
+                            confidence=confidence)
+        # The minimum confidence is applied when addresses are resolved, so
+        # that the best suggestion can be cached.
+        return best
+
+
+    def _locate(self, resolutions):
+        r""" Add the identifiers of each address from `address_locators`. """
+        keys = [key for key, resolution in resolutions.items()
+                if resolution.get("error", None) is None]
+        calls = [dict(search_level="Address", **components(key)) for key in keys]
+
+        for key, located in zip(keys, self.client.map_endpoint(
+                "address_locators", calls)):
+            if isinstance(located, Exception):
+                # The suggestion is still good (and cached).
+                resolutions[key]["locate_error"] = \
+                    f"{type(located).__name__}: {located}"
+                continue
+            ids = dict()
+            for each in located or []:
+                for identifier in each.get("ids", None) or []:
+                    ids.setdefault(identifier.get("level", None),
+                                   identifier.get("id", None))
+            resolutions[key]["ids"] = ids or None
@@ -1,4 +1,6 @@
+import inspect
 from functools import wraps
+from ..exceptions import QuotaExceededException
 from .exceptions import AuthorisationException
 
 
@@ -7,8 +9,8 @@ def requires_scope(*scopes):
     A decorator to specify the authorisation scopes required for a given method.
 
     :param scopes:
-        The scopes that are required for the method. The decorator will search
-        for the first available token with any of the scopes given.
+        The scopes that are required for the method. The client's credential
+        scheduler chooses between all credentials with any of the scopes given.
     """
 
     def wrapper(method):
@@ -17,20 +19,39 @@ def requires_scope(*scopes):
 
         @wraps(method)
         def wrapped(self, *args, **kwargs):
-            # If no token is supplied, then find the right one.
-            kwds = kwargs.copy()
-            if kwds.get("token", None) is None:
-                # Find credentials with that token.
-                for client_credentials in self._credentials:
-                    if client_credentials.token.has_any_scope(scopes):
-                        kwds["token"] = client_credentials.token
-                        break
-                else:
-                    raise AuthorisationException(f"no authorised token found"\
-                                                 f" for the required scopes "\
-                                                 f"({scopes})")
-                    
-            return method(self, *args, **kwds)
+            # If a token is supplied, then use it.
+            if kwargs.get("token", None) is not None:
+                return method(self, *args, **kwargs)
+
+            # Otherwise find the right one.
+            def call():
+                credentials = self._scheduler.select(self._credentials, scopes)
+                kwds = kwargs.copy()
+                kwds["token"] = self._token(credentials)
+                return method(self, *args, **kwds)
+
+            # If the quota of the selected credentials runs out before the
+            # request is sent, fail over to other credentials.
+            for _ in range(len(self._credentials)):
+                try:
+                    result = call()
+                except QuotaExceededException:
+                    continue
+
+                if inspect.isawaitable(result):
+                    return _failover(result, call, len(self._credentials))
+                return result
+
+            return call()
         return wrapped
 
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+async def _failover(result, call, attempts):
+    for _ in range(attempts):
+        try:
+            return await result
+        except QuotaExceededException:
+            result = call()
+    return await result
@@ -1,15 +1,48 @@
 
-import requests
-from .scopes import package_plan_scopes
+import asyncio
+import logging
+import threading
+from functools import partial
+from time import (perf_counter, time)
+
+from ..ratelimit import RateLimiter
+from .scopes import (package_plan_scopes, package_plan_rate_limits)
 from .token import Token
 
 class AuthorisationGrant(object):
 
-    def __init__(self, client, client_id, client_secret, package_and_plan=None):
+    def __init__(self, client, client_id, client_secret, package_and_plan=None,
+                 rate_limit=None, daily_quota=None, refresh_skew=300, scopes=None):
 
         self._auth = (client_id, client_secret)
         self.client = client
         self.package_and_plan = package_and_plan
+        # Scopes that these credentials are granted beyond those of their plan
+        # (e.g., `api_locations_read`), given in the credentials file.
+        self.extra_scopes = tuple(scopes.split() if isinstance(scopes, str)
+                                  else (scopes or ()))
+
+        # Tokens are refreshed in the background once they are within
+        # `refresh_skew` seconds of expiring. Only one refresh can be in flight.
+        self.refresh_skew = refresh_skew
+        self._token = None
+        self._token_lock = threading.Lock()
+        self._next_background_refresh = 0
+
+        # The rate limiter belongs to the credentials (not to each token) so
+        # that it persists when tokens are refreshed.
+        limits = dict(rate_limit=2, daily_quota=None)
+        limits.update(package_plan_rate_limits.get(package_and_plan, dict()))
+        if rate_limit is not None:
+            limits.update(rate_limit=rate_limit)
+        if daily_quota is not None:
+            limits.update(daily_quota=daily_quota)
+        # A token store shares tokens and rate limits with other processes.
+        store = getattr(client, "_token_store", None)
+        if store is None:
+            self.rate_limiter = RateLimiter.from_plan(**limits)
+        else:
+            self.rate_limiter = store.rate_limiter(client_id, **limits)
         return None
 
 
@@ -20,32 +53,131 @@ class AuthorisationGrant(object):
         raise NotImplementedError
 
 
+    @property
+    def client_id(self):
+        return self._auth[0]
+
+
+    @property
+    def scope(self):
+        r""" The scopes available to tokens created by this authorisation. """
+        scopes = tuple(package_plan_scopes.get(self.package_and_plan, ()))
+        return scopes + tuple(s for s in self.extra_scopes if s not in scopes)
+
+
+    def has_any_scope(self, scopes):
+        return len(set(scopes).intersection(self.scope)) > 0
+
+
     @property
     def token(self):
-        token = getattr(self, "_token", None)
+        r"""
+        Return a valid token. A new token is created if the current one has
+        expired, and is created in the background if it expires soon.
+        """
+        token = self._token
         if token is None or token.expired:
-            self._token = self.create_token()
+            return self._refresh_token()
+
+        if token.expires_within(self._refresh_window(token)):
+            self._refresh_token_in_background()
+        return token
+
+
+    async def atoken(self):
+        r"""
+        Return a valid token (like :attr:`token`), without blocking the event
+        loop.
+        """
+        token = self._token
+        if token is None or token.expired:
+            loop = asyncio.get_running_loop()
+            executor = getattr(self.client, "_executor", None)
+            return await loop.run_in_executor(executor, self._refresh_token)
+
+        if token.expires_within(self._refresh_window(token)):
+            self._refresh_token_in_background()
+        return token
+
 
-        return self._token
+    def _refresh_window(self, token):
+        return min(self.refresh_skew, token.expires_in / 2)
+
+
+    def _new_token(self, min_ttl=0):
+        r"""
+        Create a new token, or take one from the client's token store that is
+        valid for at least `min_ttl` seconds.
+        """
+        started = perf_counter()
+        store = getattr(self.client, "_token_store", None)
+        if store is None:
+            token = self.create_token()
+
+        else:
+            scope = " ".join(self.scope)
+            token = store.token(self.client_id, scope, self.create_token,
+                                min_ttl=min_ttl, rate_limiter=self.rate_limiter)
+
+        instruments = getattr(self.client, "instruments", None)
+        if instruments is not None:
+            instruments.token_refreshed(self.client_id, perf_counter() - started,
+                                        token.expires_in)
+        return token
+
+
+    def _refresh_token(self):
+        r"""
+        Create a new token if the current one has expired, and return a valid
+        token. Concurrent callers wait for (and share) the same new token.
+        """
+        with self._token_lock:
+            if self._token is None or self._token.expired:
+                self._token = self._new_token()
+            return self._token
+
+
+    def _refresh_token_in_background(self):
+        r"""
+        Create a new token in a background thread, unless a token is already
+        being created.
+        """
+        if time() < self._next_background_refresh \
+        or not self._token_lock.acquire(blocking=False):
+            return None
+
+        min_ttl = self._refresh_window(self._token)
+
+        def refresh():
+            try:
+                self._token = self._new_token(min_ttl)
+            except Exception:
+                logging.exception(f"Failed to refresh token for {self.client_id}")
+                # Try again later, or when the current token expires.
+                self._next_background_refresh = time() + 30
+            finally:
+                self._token_lock.release()
+
+        threading.Thread(target=refresh, daemon=True).start()
+        return None
 
 
     def create_token(self, scope=None):
 
         if scope is None:
-            scope = " ".join(package_plan_scopes[self.package_and_plan])
+            scope = " ".join(self.scope)
 
-        r = requests.post(
-            self.client._auth_uri("connect/token"),
-            auth=self._auth,
-            data=dict(
-                grant_type="client_credentials",
-                scope=scope))
+        send = partial(self.client._auth_session.post,
+                       self.client._auth_uri("connect/token"),
+                       auth=self._auth,
+                       data=dict(grant_type="client_credentials", scope=scope))
+
+        r = self.client._send(self.client._AUTH_HOST, send)
 
         if not r.ok:
             r.raise_for_status()
 
-        kwds = dict(scope=scope)
+        kwds = dict(scope=scope, rate_limiter=self.rate_limiter)
         kwds.update(r.json())
 
         return Token(**kwds)
-
@@ -0,0 +1,115 @@
+
+import threading
+from itertools import count
+
+from ..exceptions import QuotaExceededException
+from .exceptions import AuthorisationException
+
+__all__ = ["CredentialScheduler"]
+
+
+class CredentialScheduler(object):
+
+    r"""
+    Spread API calls across all credentials that are authorised for them.
+
+    :param strategy: [optional]
+        How to choose between eligible credentials. Available strategies are:
+
+        - `round_robin` (default): take turns between credentials;
+        - `least_recently_used`: use the credentials that were used longest ago;
+        - `most_remaining_quota`: use the credentials with the most calls left
+          in their daily quota.
+
+        Credentials with an exhausted quota are never chosen, so calls fail
+        over to the remaining credentials.
+    """
+
+    strategies = ("round_robin", "least_recently_used", "most_remaining_quota")
+
+    def __init__(self, strategy="round_robin"):
+        if strategy not in self.strategies:
+            raise ValueError(f"unrecognised strategy ('{strategy}') - must be "
+                             f"in {self.strategies}")
+
+        self.strategy = strategy
+        self._turns = dict()
+        self._last_used = dict()
+        self._order = count()
+        self._lock = threading.Lock()
+        return None
+
+
+    def select(self, credentials, scopes):
+        r"""
+        Select the credentials to use for a call that requires any of the given
+        scopes.
+
+        :param credentials:
+            A list of authorisation grants.
+
+        :param scopes:
+            The scopes required for the call.
+
+        :raises AuthorisationException:
+            If no credentials have any of the required scopes.
+
+        :raises QuotaExceededException:
+            If all credentials with the required scopes have exhausted their
+            quota.
+        """
+
+        eligible = [each for each in credentials if each.has_any_scope(scopes)]
+        if not eligible:
+            raise AuthorisationException(f"no authorised token found for the "
+                                         f"required scopes ({scopes})")
+
+        available = [each for each in eligible if not each.rate_limiter.exhausted]
+        if not available:
+            raise QuotaExceededException(f"all credentials with the required "
+                                         f"scopes ({scopes}) have exhausted "
+                                         f"their quota")
+
+        with self._lock:
+            if self.strategy == "round_robin":
+                turn = self._turns.get(scopes, 0)
+                self._turns[scopes] = turn + 1
+                selected = available[turn % len(available)]
+
+            elif self.strategy == "least_recently_used":
+                selected = min(available,
+                               key=lambda each: self._last_used.get(id(each), -1))
+
+            else:
+                # Unlimited quotas are preferred, then the least recently used.
+                selected = max(available, key=lambda each: (
+                    _remaining(each), -self._last_used.get(id(each), -1)))
+
+            # Use a counter to break ties between calls in the same instant.
+            self._last_used[id(selected)] = next(self._order)
+
+        return selected
+
+
+    def usage(self, credentials):
+        r"""
+        Return the quota usage of each of the given credentials, keyed by the
+        client identifier.
+
+        :param credentials:
+            A list of authorisation grants.
+        """
+        usage = dict()
+        for each in credentials:
+            quota = each.rate_limiter.quota
+            usage[each.client_id] = dict(
+                used=None if quota is None else quota.used,
+                remaining=each.rate_limiter.remaining,
+                resets=None if quota is None else quota.resets)
+        return usage
+
+
+
+def _remaining(credentials):
+    remaining = credentials.rate_limiter.remaining
+    return float("inf") if remaining is None else remaining
@@ -24,3 +24,12 @@ package_plan_scopes = OrderedDict([
     )),
 ])
 
+
+# Default client-side rate limits for each package and plan: the maximum
+# number of calls per second, and per day (None if not limited).
+package_plan_rate_limits = OrderedDict([
+    ("AgentsAndListingsInnovationPlan", dict(rate_limit=2, daily_quota=500)),
+    ("PropertyAndLocationInnovationPlan", dict(rate_limit=2, daily_quota=500)),
+    ("AgentsAndListingsBusinessPlan", dict(rate_limit=2, daily_quota=None)),
+    ("PropertyAndLocationBusinessPlan", dict(rate_limit=2, daily_quota=None)),
+])
@@ -0,0 +1,175 @@
+
+import json
+from contextlib import contextmanager
+from time import (sleep, time)
+
+from ..ratelimit import RateLimiter
+from ..sqlite import Database
+from .token import Token
+
+__all__ = ["TokenStore", "SharedRateLimiter"]
+
+
+class TokenStore(Database):
+
+    r"""
+    A token store and rate limit ledger that is shared between processes (and
+    persists between sessions), backed by SQLite.
+
+    Tokens are stored for each client identifier and scope, so that processes
+    using the same credentials share tokens instead of each creating their own.
+    Only one process creates a new token at a time. The state of each
+    credential's rate limiter is also kept in the store, so that the combined
+    request rate of all processes stays within the limits.
+
+    :param path:
+        The path of the SQLite database.
+
+    :param timeout: [optional]
+        The number of seconds to wait for another process to create a token,
+        or for the database to be unlocked.
+    """
+
+    def __init__(self, path, timeout=30):
+        super(TokenStore, self).__init__(path, timeout)
+        with self._transaction() as connection:
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS tokens (
+                    client_id TEXT NOT NULL,
+                    scope TEXT NOT NULL,
+                    access_token TEXT,
+                    token_type TEXT,
+                    expires REAL,
+                    expires_in REAL,
+                    lease REAL,
+                    PRIMARY KEY (client_id, scope))""")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS rate_limits (
+                    client_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL)""")
+        return None
+
+
+    def token(self, client_id, scope, create, min_ttl=0, rate_limiter=None):
+        r"""
+        Return a stored token that is valid for at least `min_ttl` seconds, or
+        create and store a new token.
+
+        If another process is already creating a token for the same client and
+        scope, this waits for that token instead of creating another.
+
+        :param client_id:
+            The client identifier.
+
+        :param scope:
+            The space-separated scopes of the token.
+
+        :param create:
+            A function that creates and returns a new :class:`Token`.
+
+        :param min_ttl: [optional]
+            The minimum number of seconds that a stored token must be valid for.
+
+        :param rate_limiter: [optional]
+            The rate limiter to give tokens loaded from the store.
+        """
+
+        waited = 0
+        while True:
+            with self._transaction() as connection:
+                row = connection.execute(
+                    """SELECT access_token, token_type, expires, expires_in,
+                        lease FROM tokens WHERE client_id = ? AND scope = ?""",
+                    (client_id, scope)).fetchone()
+
+                now = time()
+                if row is not None and row[0] is not None \
+                and row[2] - now > min_ttl:
+                    access_token, token_type, expires, expires_in, _ = row
+                    token = Token(access_token, scope, expires_in, token_type,
+                                  rate_limiter=rate_limiter)
+                    token.expires = expires
+                    return token
+
+                # Take out a lease to create the token, unless another process
+                # holds one.
+                lease = None if row is None else row[4]
+                leased = lease is None or lease < now or waited >= self.timeout
+                if leased:
+                    connection.execute(
+                        """INSERT INTO tokens (client_id, scope, lease)
+                            VALUES (?, ?, ?) ON CONFLICT (client_id, scope)
+                            DO UPDATE SET lease = excluded.lease""",
+                        (client_id, scope, now + self.timeout))
+
+            if leased:
+                break
+
+            sleep(0.05)
+            waited += 0.05
+
+        try:
+            token = create()
+
+        except:
+            with self._transaction() as connection:
+                connection.execute(
+                    "UPDATE tokens SET lease = NULL WHERE client_id = ? AND scope = ?",
+                    (client_id, scope))
+            raise
+
+        with self._transaction() as connection:
+            connection.execute(
+                """UPDATE tokens SET access_token = ?, token_type = ?,
+                    expires = ?, expires_in = ?, lease = NULL
+                    WHERE client_id = ? AND scope = ?""",
+                (token.access_token, token.token_type, token.expires,
+                 token.expires_in, client_id, scope))
+        return token
+
+
+    def rate_limiter(self, client_id, rate_limit=None, daily_quota=None):
+        r"""
+        Return a rate limiter for the given client identifier, which is shared
+        with all other processes using this store.
+
+        :param client_id:
+            The client identifier.
+
+        :param rate_limit: [optional]
+            The maximum number of calls per second.
+
+        :param daily_quota: [optional]
+            The maximum number of calls per day.
+        """
+        limiter = SharedRateLimiter.from_plan(rate_limit, daily_quota)
+        limiter.store = self
+        limiter.client_id = client_id
+        return limiter
+
+
+
+class SharedRateLimiter(RateLimiter):
+
+    r"""
+    A rate limiter whose state is kept in a :class:`TokenStore`, so that it is
+    shared between processes. Create these with :meth:`TokenStore.rate_limiter`.
+    """
+
+    store = None
+    client_id = None
+
+    @contextmanager
+    def _synchronised(self):
+        with self._lock, self.store._transaction() as connection:
+            row = connection.execute(
+                "SELECT state FROM rate_limits WHERE client_id = ?",
+                (self.client_id, )).fetchone()
+            if row is not None:
+                self.load(json.loads(row[0]))
+
+            yield
+
+            connection.execute(
+                "REPLACE INTO rate_limits (client_id, state) VALUES (?, ?)",
+                (self.client_id, json.dumps(self.state())))
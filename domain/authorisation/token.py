@@ -1,21 +1,25 @@
 
-from collections import deque
-from time import (sleep, time) # yea it is
+from time import time
+
+from ..ratelimit import (RateLimiter, SlidingWindow)
 
 
 class Token(object):
 
     def __init__(self, access_token, scope, expires_in, token_type="Bearer",
-                 throttle_rate=2):
+                 throttle_rate=2, rate_limiter=None):
 
         self.access_token = access_token
         self.token_type = token_type
+        self.expires_in = expires_in
         self.expires = time() + expires_in
         self.scope = tuple(scope.split(" "))
 
         # Automagically handle throttling.
-        self._api_call_times = deque()
-        self._api_throttle_rate = int(throttle_rate)
+        if rate_limiter is None:
+            limits = [SlidingWindow(throttle_rate)] if throttle_rate > 0 else []
+            rate_limiter = RateLimiter(*limits)
+        self.rate_limiter = rate_limiter
         return None
 
 
@@ -23,6 +27,9 @@ class Token(object):
     def expired(self):
         return time() >= self.expires
 
+    def expires_within(self, seconds):
+        return time() + seconds >= self.expires
+
     def __repr__(self):
         return f"{self.token_type} {self.access_token}"
 
@@ -33,21 +40,23 @@ class Token(object):
         return len(set(scopes).intersection(self.scope)) > 0
 
 
-    @property
-    def headers(self):
-        r""" Return the authorization token for Domain. """
+    def throttle(self):
+        r"""
+        Block until an API call can be made with this token, and return the
+        number of seconds waited.
+        """
+        return self.rate_limiter.acquire()
 
-        # If necessary, throttle this request so that Domain does not kill us.
-        if self._api_throttle_rate > 0:
-            while len(self._api_call_times) > self._api_throttle_rate \
-            and (time() - self._api_call_times[-self._api_throttle_rate]) < 1:
-                self._api_call_times.popleft()
-                sleep(1) 
 
-        self._api_call_times.append(time())
+    async def athrottle(self):
+        r""" Wait (without blocking the event loop) until an API call can be made. """
+        return await self.rate_limiter.aacquire()
 
+
+    @property
+    def headers(self):
+        r""" Return the authorization token for Domain. """
         return dict([
             ("Authorization", f"{self}"),
             ("Content-Type", "application/json"),
         ])
-
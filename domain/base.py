@@ -1,9 +1,22 @@
+
 import logging
+import threading
 import yaml
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from time import perf_counter
 
-from .utils import uri
+from . import (batch as batching, cache as caching, decoders as decoding,
+               models as modelling, pagination, streaming)
+from .retry import (Retry, RetryPolicy)
+from .utils import (copied, uri)
 from .authorisation.client_credentials import ClientCredentials
+from .authorisation.scheduler import CredentialScheduler
+from .authorisation.store import TokenStore
+from .coalesce import SingleFlight
+from .instrumentation import (Instruments, _no_span)
+from .store import Store
 
 __all__ = ["BaseDomainClient"]
 
@@ -11,23 +24,246 @@ class BaseDomainClient(object):
 
     """ A base object to access the Domain client API. """
 
-    def __init__(self, credentials_path, **kwargs):
+    def __init__(self, credentials_path, api_pool_size=10, auth_pool_size=2,
+                 pool_block=False, scheduler="round_robin", max_workers=10,
+                 cache=None, cache_ttls=None, retry=True, token_refresh_skew=300,
+                 token_store=None, models=False, decoder=None, coalesce=True,
+                 transport=None, instruments=True, store=None, **kwargs):
         r"""
         Initialize a client with the Domain API.
+
+        :param credentials_path:
+            The path to a YAML file that lists the client credentials.
+
+        :param api_pool_size: [optional]
+            The maximum number of keep-alive connections to hold open to the
+            API host.
+
+        :param auth_pool_size: [optional]
+            The maximum number of keep-alive connections to hold open to the
+            authorisation host.
+
+        :param pool_block: [optional]
+            Block when no free connection is available in a pool, instead of
+            opening (and then discarding) an additional connection.
+
+        :param scheduler: [optional]
+            How to spread API calls across credentials: either the name of a
+            strategy (`round_robin`, `least_recently_used`, or
+            `most_remaining_quota`) or a
+            :class:`domain.authorisation.scheduler.CredentialScheduler`.
+
+        :param max_workers: [optional]
+            The maximum number of worker threads used to make requests in the
+            background (e.g., to prefetch pages).
+
+        :param cache: [optional]
+            A response cache (e.g., :class:`domain.cache.MemoryCache` or
+            :class:`domain.cache.SQLiteCache`). If `None` is given, responses
+            are not cached.
+
+        :param cache_ttls: [optional]
+            A dictionary of end point patterns (e.g., `properties/*`) and the
+            time-to-live of their cached responses in seconds, which take
+            precedence over :data:`domain.cache.default_ttls`.
+
+        :param retry: [optional]
+            How to retry transient failures of API and token requests: either a
+            :class:`domain.retry.Retry` or :class:`domain.retry.RetryPolicy`, or
+            `True` for the default policy. If `None` or `False` is given,
+            failed requests are not retried.
+
+        :param token_refresh_skew: [optional]
+            The number of seconds before a token expires that a new token is
+            created in the background.
+
+        :param token_store: [optional]
+            A :class:`domain.authorisation.store.TokenStore` (or the path of
+            one) to share tokens and rate limits with other processes that use
+            the same credentials. If `None` is given, tokens and rate limits
+            are kept in memory for this client only.
+
+        :param models: [optional]
+            Return responses as lightweight models (see :mod:`domain.models`)
+            instead of dictionaries. This can also be set for a single request
+            with the `models` keyword argument of any API method.
+
+        :param decoder: [optional]
+            How to decode responses: the name of a JSON decoder (`orjson`,
+            `simdjson`, `ujson`, or `json`), `bytes` or `memoryview` to return
+            responses without decoding them, or a function that decodes the
+            response body. If `None` is given, the fastest installed JSON
+            decoder is used. This can also be set for a single request with
+            the `decoder` keyword argument of any API method.
+
+        :param coalesce: [optional]
+            Coalesce identical requests (the same end point, parameters, and
+            scopes) that are in flight at the same time, so that only one is
+            sent and all callers are given (a copy of) its response.
+
+        :param transport: [optional]
+            A :class:`requests.adapters.BaseAdapter` to send all requests with,
+            instead of the pooled connections to the Domain hosts (e.g., a
+            :class:`domain.standin.StandInAdapter` to use the client offline,
+            or a :class:`domain.transport.CassetteAdapter` to record and replay
+            responses). The pool size arguments are then ignored.
+
+        :param instruments: [optional]
+            A :class:`domain.instrumentation.Instruments` to record event
+            hooks, histograms, and spans of API calls with, or `True` to create
+            one. If `None` or `False` is given, API calls are not instrumented.
+
+        :param store: [optional]
+            A :class:`domain.store.Store` (or the path of one) to add every
+            listing, property, agency, and agent that is fetched to, so that
+            they can be queried locally.
         """
 
         # Load the credentials.
         with open(credentials_path, "r") as fp:
             contents = yaml.load(fp, Loader=yaml.FullLoader)
 
-        self._credentials = [ClientCredentials(self, **ea) for ea in contents]
+        if token_store is not None and not isinstance(token_store, TokenStore):
+            token_store = TokenStore(token_store)
+        self._token_store = token_store
+
+        defaults = dict(refresh_skew=token_refresh_skew)
+        self._credentials = [ClientCredentials(self, **{**defaults, **ea})
+                             for ea in contents]
 
         if len(self._credentials) < 1:
             logging.warn("No API credentials found!")
 
+        if not isinstance(scheduler, CredentialScheduler):
+            scheduler = CredentialScheduler(scheduler)
+        self._scheduler = scheduler
+
+        self._pool_sizes = dict(api=api_pool_size, auth=auth_pool_size)
+        self._pool_block = pool_block
+        self._transport = transport
+        self._sessions = dict()
+        self._sessions_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._max_workers = max_workers
+        self.cache = cache
+        self._cache_ttls = cache_ttls
+        self.models = models
+        self._decoder = decoding.get_decoder(decoder)
+        self._flights = SingleFlight(copied) if coalesce else None
+        self.instruments = Instruments() if instruments is True \
+                           else (instruments or None)
+
+        if store is not None and not isinstance(store, Store):
+            store = Store(store)
+        self.store = store
+
+        if retry is True or isinstance(retry, RetryPolicy):
+            retry = Retry(None if retry is True else retry)
+        self._retry = retry or None
+        return None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def close(self):
+        r"""
+        Close all pooled connections and worker threads held by this client.
+        """
+        self._executor.shutdown(wait=False)
+
+        with self._sessions_lock:
+            sessions, self._sessions = (self._sessions, dict())
+
+        for session in sessions.values():
+            session.close()
+
         return None
 
 
+    def _session(self, kind):
+        r"""
+        Return the persistent HTTP session for the given kind of host, creating
+        it on first use.
+
+        :param kind:
+            The kind of host: either `api` or `auth`.
+        """
+        try:
+            return self._sessions[kind]
+
+        except KeyError:
+            with self._sessions_lock:
+                if kind not in self._sessions:
+                    adapter = self._transport
+                    if adapter is None:
+                        adapter = HTTPAdapter(pool_connections=1,
+                                              pool_maxsize=self._pool_sizes[kind],
+                                              pool_block=self._pool_block)
+                    session = requests.Session()
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._sessions[kind] = session
+
+            return self._sessions[kind]
+
+
+    def on(self, event, function=None):
+        r"""
+        Add a hook that is called whenever an event happens (e.g.,
+        `after_response` or `retry`; see :data:`domain.instrumentation.events`).
+        This can also be used as a decorator.
+
+        :param event:
+            The name of the event.
+
+        :param function: [optional]
+            The hook, which is called with keyword arguments.
+        """
+        if self.instruments is None:
+            raise ValueError("this client is not instrumented")
+        return self.instruments.on(event, function)
+
+
+    @property
+    def _api_session(self):
+        return self._session("api")
+
+
+    @property
+    def _auth_session(self):
+        return self._session("auth")
+
+
+    def _send(self, host, send, before_retry=None):
+        r"""
+        Send a request to a host, retrying transient failures, and return the
+        response.
+
+        :param host:
+            The host the request is sent to.
+
+        :param send:
+            A function that sends the request and returns the response.
+
+        :param before_retry: [optional]
+            A function to call before each retry.
+        """
+        if self._retry is None:
+            return send()
+
+        on_retry = None
+        if self.instruments is not None:
+            on_retry = lambda attempt, response, delay: \
+                self.instruments.retried(host, attempt, response, delay)
+        return self._retry.call(host, send, before_retry, on_retry)
+
+
     def _auth_uri(self, end_point):
         kwds = dict(host=self._AUTH_HOST,
                     version=self._AUTH_VERSION,
@@ -48,18 +284,456 @@ class BaseDomainClient(object):
         return uri(end_point, **kwds)
 
 
-    def _api_request(self, end_point, token, **kwargs):
+    @property
+    def quota_usage(self):
+        r"""
+        The quota usage of each set of credentials, keyed by client identifier.
+        """
+        return self._scheduler.usage(self._credentials)
+
+
+    def batch(self, calls, ordered=True, max_pending=None):
+        r"""
+        Execute many API calls concurrently on the client's worker threads,
+        and yield their results.
+
+        The calls share the client's rate limiters and credential scheduler.
+        If a call raises an exception, the exception is yielded in place of the
+        result, and the remaining calls continue.
+
+        :param calls:
+            An iterable of `(method, args, kwargs)` tuples, where `method` is
+            an API method (or the name of one), `args` is a tuple of positional
+            arguments, and `kwargs` is a dictionary of keyword arguments. It is
+            consumed lazily, so it can be a generator.
+
+        :param ordered: [optional]
+            Yield results in the same order as the calls. Otherwise, yield
+            `(index, result)` tuples as the calls complete.
+
+        :param max_pending: [optional]
+            The maximum number of calls that are submitted but not yet yielded.
+            Defaults to twice the number of worker threads.
+        """
+        return self._batch(self._bind(calls), ordered,
+                           max_pending or 2 * self._max_workers)
+
+
+    def map_endpoint(self, method, iterable, ordered=True, max_pending=None,
+                     **kwargs):
+        r"""
+        Call an API method concurrently for every item in an iterable, and yield
+        the results (see :meth:`batch`).
+
+        :param method:
+            An API method, or the name of one (e.g., `properties`).
+
+        :param iterable:
+            The arguments for each call. Each item can be a tuple of positional
+            arguments, a dictionary of keyword arguments, or a single argument.
+
+        :param ordered: [optional]
+            Yield results in the same order as the iterable. Otherwise, yield
+            `(index, result)` tuples as the calls complete.
+
+        :param max_pending: [optional]
+            The maximum number of calls that are submitted but not yet yielded.
+
+        Any other keyword arguments are given to every call.
+        """
+
+        def calls():
+            for item in iterable:
+                if isinstance(item, tuple):
+                    yield (method, item, kwargs)
+                elif isinstance(item, dict):
+                    yield (method, (), dict(kwargs, **item))
+                else:
+                    yield (method, (item, ), kwargs)
+
+        return self.batch(calls(), ordered=ordered, max_pending=max_pending)
+
+
+    def _bind(self, calls):
+        for method, args, kwargs in calls:
+            if isinstance(method, str):
+                method = getattr(self, method)
+            yield (method, args, kwargs)
+
+
+    def _batch(self, calls, ordered, max_pending):
+        return batching.execute(self._executor, calls, ordered, max_pending)
+
+
+    def _paginate(self, method, items_per_page, *args, **kwargs):
+        r"""
+        Return a generator of every item from a paginated API method.
+
+        :param method:
+            The API method to call for each page.
+
+        :param items_per_page:
+            The number of items in a full page.
+        """
+        return pagination.paginate(self._executor, method, items_per_page,
+                                   *args, **kwargs)
+
+
+    def _token(self, credentials):
+        r"""
+        Return the token to use for an API request with the given credentials.
+
+        :param credentials:
+            The authorisation grant selected for the request.
+        """
+        return credentials.token
+
+
+    def _api_request(self, end_point, token, models=None, decoder=None,
+                     stream=False, **kwargs):
         r"""
         Execute an API request to the Domain API.
 
         :param end_point:
             The relative URL of the API end point.
+
+        :param token:
+            The authorisation token to use for the request.
+
+        :param models: [optional]
+            Return the response as a model. If `None` is given, the client's
+            default is used.
+
+        :param decoder: [optional]
+            How to decode the response (see :func:`domain.decoders.get_decoder`).
+            If `None` is given, the client's default is used.
+
+        :param stream: [optional]
+            Return a generator that yields the items of a JSON array response
+            as the response body arrives, instead of the whole response.
+            Streamed responses are not cached.
         """
+        with self._span(end_point):
+            decode = self._decoder_for(decoder, kwargs)
+            if stream:
+                kwargs.pop("cache", None)
+                self._throttle(end_point, token)
+                r = self._api_get(end_point, token, stream=True, **kwargs)
+                return streaming.iter_items(
+                    r, self._item_decoder(end_point, decode, models))
 
-        session = requests.session()
-        session.headers.update(token.headers)
+            key, ttl, value = self._cache_lookup(end_point, token, kwargs)
+            if value is None:
+                def fetch():
+                    self._throttle(end_point, token)
+                    return self._api_fetch(end_point, token, key, ttl, decode,
+                                           **kwargs)
+
+                flight = self._flight_key(end_point, token, decode, kwargs)
+                value = fetch() if flight is None \
+                        else self._flights.do(flight, fetch)
+            return self._model(end_point, value, models)
+
+
+    def _span(self, end_point):
+        r"""
+        Return a context manager that records a span for an API call, if the
+        client is instrumented with a tracer.
+        """
+        if self.instruments is None:
+            return _no_span
+        return self.instruments.span(end_point)
+
+
+    def _throttle(self, end_point, token):
+        r"""
+        Wait until an API call can be made with a token, and record the wait.
+
+        :param end_point:
+            The relative URL of the API end point.
+
+        :param token:
+            The authorisation token to use for the request.
+        """
+        seconds = token.throttle()
+        if self.instruments is not None:
+            self.instruments.throttled(end_point, seconds or 0)
+
+
+    def _flight_key(self, end_point, token, decode, kwargs):
+        r"""
+        Return the key that identical in-flight requests are coalesced by, or
+        `None` if the request should not be coalesced.
+
+        :param end_point:
+            The relative URL of the API end point.
+
+        :param token:
+            The authorisation token to use for the request.
+
+        :param decode:
+            The function to decode the response with.
+
+        :param kwargs:
+            The keyword arguments for the request.
+        """
+        # Only requests that differ by nothing but their parameters are
+        # coalesced (e.g., not requests with their own headers).
+        if self._flights is None or any(k != "params" for k in kwargs):
+            return None
+        key = caching.cache_key(end_point, kwargs.get("params", None),
+                                getattr(token, "scope", None))
+        return (key, decode)
+
+
+    def _item_decoder(self, end_point, decode, models=None):
+        r"""
+        Return a function that decodes an item of a streamed response, and
+        wraps it in its model if models are enabled.
+
+        :param end_point:
+            The relative URL of the API end point.
+
+        :param decode:
+            The function to decode the item with.
+
+        :param models: [optional]
+            Whether to use models. If `None` is given, the client's default is
+            used.
+        """
+        if models is None:
+            models = self.models
+        if not models:
+            return decode
+        return lambda item: modelling.wrap(end_point, decode(item))
+
+
+    def _decoder_for(self, decoder, kwargs):
+        r"""
+        Return the function to decode the response of a request with.
+
+        Responses that are not decoded (e.g., returned as bytes) bypass the
+        cache, so the `cache` keyword argument is set to `False` for them.
+
+        :param decoder:
+            The decoder given for the request, or `None` for the client's
+            default.
+
+        :param kwargs:
+            The keyword arguments for the request.
+        """
+        decode = self._decoder if decoder is None \
+                 else decoding.get_decoder(decoder)
+        if decoding.is_raw(decode):
+            kwargs["cache"] = False
+        return decode
+
+
+    def _model(self, end_point, value, models=None):
+        r"""
+        Wrap a response in its model, if models are enabled.
+
+        :param end_point:
+            The relative URL of the API end point.
+
+        :param value:
+            The decoded response.
+
+        :param models: [optional]
+            Whether to use models. If `None` is given, the client's default is
+            used.
+        """
+        if models is None:
+            models = self.models
+        return modelling.wrap(end_point, value) if models else value
+
+
+    def _cache_lookup(self, end_point, token, kwargs):
+        r"""
+        Look up the cached response for a request.
+
+        Returns a three-length tuple of the cache key, the time-to-live for the
+        response, and the cached response (or `None`). The key is `None` if the
+        response should not be cached.
+
+        :param end_point:
+            The relative URL of the API end point.
+
+        :param token:
+            The authorisation token to use for the request.
+
+        :param kwargs:
+            The keyword arguments for the request. The `cache` keyword (to
+            bypass the cache for one request) is removed.
+        """
+        use_cache = kwargs.pop("cache", True)
+        if self.cache is None or not use_cache:
+            return (None, None, None)
+
+        ttl = caching.cache_ttl(end_point, self._cache_ttls)
+        if ttl is not None and ttl <= 0:
+            return (None, None, None)
+
+        key = caching.cache_key(end_point, kwargs.get("params", None),
+                                getattr(token, "scope", None))
+        value = self.cache.get(key)
+        if self.instruments is not None:
+            self.instruments.cached(end_point, value is not None)
+        return (key, ttl, value)
+
+
+    def _api_fetch(self, end_point, token, key=None, ttl=None, decode=None,
+                   **kwargs):
+        r"""
+        Fetch a response from the Domain API (without throttling), and store it
+        in the cache.
+
+        If there is a stale cached response with validators, the request is
+        made conditional on the response having changed. A `304 Not Modified`
+        response then returns the cached response. If there is no cached
+        response to return (e.g., the request had its own conditional
+        headers), the request is made again without conditional headers.
+
+        :param end_point:
+            The relative URL of the API end point.
+
+        :param token:
+            The authorisation token to use for the request.
+
+        :param key: [optional]
+            The cache key for the response, or `None` if it is not cached.
+
+        :param ttl: [optional]
+            The time-to-live of the cached response.
+
+        :param decode: [optional]
+            The function to decode the response body with. If `None` is given,
+            the client's default is used.
+        """
+
+        stale = None if key is None else self.cache.stale(key)
+        if stale is not None:
+            headers = dict(kwargs.pop("headers", None) or dict())
+            headers.update(_conditional_headers(stale[1]))
+            kwargs["headers"] = headers
+
+        r = self._api_get(end_point, token, **kwargs)
+
+        validators = _validators(r.headers)
+        if r.status_code == 304:
+            if stale is not None:
+                value, previous = stale
+                self.cache.revalidated(key, value, ttl, validators or previous)
+                return value
+
+            # There is nothing cached to give for a `304 Not Modified`.
+            headers = kwargs.pop("headers", None) or dict()
+            headers = dict((k, v) for k, v in headers.items() if k.lower()
+                           not in ("if-none-match", "if-modified-since"))
+            r = self._api_get(end_point, token, headers=headers, **kwargs)
+            if r.status_code == 304:
+                raise requests.HTTPError(
+                    f"304 Not Modified for {end_point} without a cached response",
+                    response=r)
+            validators = _validators(r.headers)
+
+        content, started = (r.content, perf_counter())
+        value = (decode or self._decoder)(content)
+        if self.instruments is not None:
+            self.instruments.decoded(end_point, perf_counter() - started)
+
+        if key is not None:
+            self._cache_store(end_point, key, ttl, value, validators)
+        if self.store is not None:
+            self.store.capture(end_point, value)
+        return value
+
+
+    def _cache_store(self, end_point, key, ttl, value, validators=None):
+        r"""
+        Store a response in the cache.
+
+        Cached sales results are invalidated when the sales results metadata
+        changes.
+        """
+        if end_point == "salesResults/_head":
+            version_key = caching.cache_key("version:salesResults")
+            if self.cache.peek(version_key) != value:
+                self.cache.invalidate("salesResults/")
+                self.cache.set(version_key, value)
+
+        self.cache.set(key, value, ttl, validators)
+        return None
+
+
+    def _api_get(self, end_point, token, **kwargs):
+        r"""
+        Execute an API request to the Domain API, and return the response.
+
+        The request is not throttled, but retries of failed requests are.
+
+        :param end_point:
+            The relative URL of the API end point.
+
+        :param token:
+            The authorisation token to use for the request.
+        """
+
+        # Headers are given per request (not on the session) because the
+        # session is shared between threads and tokens.
+        headers = token.headers
+        headers.update(kwargs.pop("headers", None) or dict())
+
+        url = self._api_url(end_point)
+
+        def send():
+            r = self._api_session.get(url, headers=headers, **kwargs)
+            token.rate_limiter.update(r.headers)
+            return r
+
+        before_retry = lambda: self._throttle(end_point, token)
+        if self.instruments is None:
+            r = self._send(self._API_HOST, send, before_retry)
+
+        else:
+            self.instruments.request(end_point, kwargs.get("params", None))
+            started = perf_counter()
+            try:
+                r = self._send(self._API_HOST, send, before_retry)
+            except Exception:
+                self.instruments.response(end_point, "error",
+                                          perf_counter() - started)
+                raise
+            self.instruments.response(end_point, r.status_code,
+                                      perf_counter() - started,
+                                      _size(r, kwargs.get("stream", False)))
 
-        r = session.get(self._api_url(end_point), **kwargs)
         if not r.ok:
             r.raise_for_status()
-        return r.json()
+        return r
+
+
+
+def _size(response, stream=False):
+    r"""
+    Return the size of a response body, without reading a streamed body.
+    """
+    if not stream:
+        return len(response.content or b"")
+    length = response.headers.get("Content-Length", None)
+    return int(length) if length and length.isdigit() else None
+
+
+def _validators(headers):
+    r""" Return the cache validators from the headers of a response. """
+    return dict((k, headers[k]) for k in ("ETag", "Last-Modified") if k in headers)
+
+
+def _conditional_headers(validators):
+    r""" Return the headers for a request conditional on the validators given. """
+    headers = dict()
+    if "ETag" in validators:
+        headers["If-None-Match"] = validators["ETag"]
+    if "Last-Modified" in validators:
+        headers["If-Modified-Since"] = validators["Last-Modified"]
+    return headers
@@ -0,0 +1,124 @@
+
+""" Execute many API calls concurrently. """
+
+import asyncio
+from collections import deque
+from concurrent.futures import (wait, FIRST_COMPLETED)
+from itertools import islice
+
+__all__ = ["execute", "aexecute"]
+
+
+def execute(executor, calls, ordered=True, max_pending=32):
+    r"""
+    Execute API calls concurrently, and yield their results.
+
+    If a call raises an exception, the exception is yielded in place of the
+    result, and the remaining calls continue.
+
+    :param executor:
+        A :class:`concurrent.futures.Executor` to make the calls with.
+
+    :param calls:
+        An iterable of `(method, args, kwargs)` tuples. It is consumed lazily.
+
+    :param ordered: [optional]
+        Yield results in the same order as the calls. Otherwise, yield
+        `(index, result)` tuples as the calls complete.
+
+    :param max_pending: [optional]
+        The maximum number of calls that are submitted but not yet yielded.
+    """
+
+    calls, indices = (enumerate(calls), dict())
+
+    def submit(index, call):
+        method, args, kwargs = call
+        future = executor.submit(method, *args, **kwargs)
+        indices[future] = index
+        return future
+
+    pending = deque(submit(*each) for each in islice(calls, max_pending))
+    try:
+        if ordered:
+            while pending:
+                future = pending.popleft()
+                del indices[future]
+                result = _outcome(future)
+                pending.extend(submit(*each) for each in islice(calls, 1))
+                yield result
+
+        else:
+            pending = set(pending)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                pending.update(
+                    submit(*each) for each in islice(calls, len(done)))
+                for future in done:
+                    yield (indices.pop(future), _outcome(future))
+
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+
+async def aexecute(calls, ordered=True, max_pending=100):
+    r"""
+    Asynchronously execute API calls concurrently, and yield their results.
+
+    If a call raises an exception, the exception is yielded in place of the
+    result, and the remaining calls continue.
+
+    :param calls:
+        An iterable of `(method, args, kwargs)` tuples, where each method
+        returns an awaitable. It is consumed lazily.
+
+    :param ordered: [optional]
+        Yield results in the same order as the calls. Otherwise, yield
+        `(index, result)` tuples as the calls complete.
+
+    :param max_pending: [optional]
+        The maximum number of calls that are in flight but not yet yielded.
+    """
+
+    calls, indices = (enumerate(calls), dict())
+
+    def submit(index, call):
+        method, args, kwargs = call
+        future = asyncio.ensure_future(method(*args, **kwargs))
+        indices[future] = index
+        return future
+
+    pending = deque(submit(*each) for each in islice(calls, max_pending))
+    try:
+        if ordered:
+            while pending:
+                future = pending.popleft()
+                del indices[future]
+                await asyncio.wait([future])
+                pending.extend(submit(*each) for each in islice(calls, 1))
+                yield _outcome(future)
+
+        else:
+            pending = set(pending)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.update(
+                    submit(*each) for each in islice(calls, len(done)))
+                for future in done:
+                    yield (indices.pop(future), _outcome(future))
+
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+
+def _outcome(future):
+    r""" Return the result of a completed future, or the exception it raised. """
+    try:
+        return future.result()
+    except Exception as exception:
+        return exception
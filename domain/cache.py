@@ -0,0 +1,371 @@
+
+""" Response caches for the Domain API. """
+
+import json
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from time import time
+
+__all__ = ["MemoryCache", "SQLiteCache", "cache_key", "cache_ttl",
+           "default_ttls"]
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# Time-to-live (in seconds) for responses from each end point. The first
+# matching pattern applies. A time-to-live of `None` means that responses do
+# not expire (they are only invalidated or evicted), and zero means that
+# responses are not cached. Expired responses with an `ETag` or `Last-Modified`
+# header are kept, so that they can be revalidated with a conditional request.
+default_ttls = OrderedDict([
+    ("demographics", 7 * DAY),
+    ("salesResults/_head", 5 * 60),
+    ("salesResults/*", DAY), # Or until the sales results metadata changes.
+    ("properties/_suggest", DAY),
+    ("properties/*/priceEstimate", DAY),
+    ("properties/*", DAY),
+    ("agencies/*/listings", 0),
+    ("agencies/*", HOUR),
+    ("agents/*/listings", 0),
+    ("agents/*", HOUR),
+    ("listings/*/enquiries", 0),
+    ("listings/*", 15 * 60),
+    ("addressLocators", 7 * DAY),
+    ("locations/schools*", 7 * DAY),
+    ("*", 0),
+])
+
+
+def cache_ttl(end_point, ttls=None):
+    r"""
+    Return the time-to-live for responses from the given end point.
+
+    :param end_point:
+        The relative URL of the API end point.
+
+    :param ttls: [optional]
+        A dictionary of end point patterns and times-to-live, which take
+        precedence over :data:`default_ttls`.
+    """
+    for patterns in (ttls or dict(), default_ttls):
+        for pattern, ttl in patterns.items():
+            if fnmatchcase(end_point, pattern):
+                return ttl
+    return 0
+
+
+def cache_key(end_point, params=None, scope=None):
+    r"""
+    Return a cache key for a request.
+
+    :param end_point:
+        The relative URL of the API end point.
+
+    :param params: [optional]
+        The query parameters of the request. Parameters that are `None` are
+        ignored, as they are not sent.
+
+    :param scope: [optional]
+        The scopes of the token used for the request.
+    """
+    params = dict((k, v) for k, v in (params or dict()).items() if v is not None)
+    return json.dumps([end_point, params, sorted(scope or ())],
+                      sort_keys=True, separators=(",", ":"), default=str)
+
+
+
+class BaseCache(object):
+
+    r"""
+    A base class for response caches, which counts hits and misses.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        return None
+
+
+    @property
+    def stats(self):
+        r""" Return the number of cache hits and misses. """
+        return dict(hits=self.hits, misses=self.misses)
+
+
+    def _lookup(self, key):
+        r"""
+        Return a three-length tuple of the cached value for the given key,
+        whether it is fresh, and its validators; or `None` if there is no value.
+
+        Expired values are removed, unless they have validators that can be
+        used to revalidate them with the server.
+        """
+        entry = self._get(key)
+        if entry is None:
+            return None
+
+        value, expires, validators = entry
+        if expires is not None and time() >= expires:
+            if not validators:
+                self._delete(key)
+                return None
+            return (value, False, validators)
+
+        return (value, True, validators)
+
+
+    def get(self, key):
+        r"""
+        Return the cached value for the given key, or `None` if there is no
+        value or it has expired.
+
+        :param key:
+            The cache key.
+        """
+        entry = self._lookup(key)
+        value = entry[0] if entry is not None and entry[1] else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+
+    def peek(self, key):
+        r"""
+        Return the cached value for the given key (like :meth:`get`), without
+        counting a hit or miss.
+
+        :param key:
+            The cache key.
+        """
+        entry = self._lookup(key)
+        return entry[0] if entry is not None and entry[1] else None
+
+
+    def stale(self, key):
+        r"""
+        Return the cached value for the given key and its validators, even if
+        the value has expired. Returns `None` if there is no value, or if it
+        has no validators.
+
+        :param key:
+            The cache key.
+        """
+        entry = self._lookup(key)
+        if entry is None or not entry[2]:
+            return None
+        return (entry[0], entry[2])
+
+
+    def set(self, key, value, ttl=None, validators=None):
+        r"""
+        Store a value in the cache.
+
+        :param key:
+            The cache key.
+
+        :param value:
+            The value to store.
+
+        :param ttl: [optional]
+            The time-to-live of the value in seconds. If `None` is given then
+            the value does not expire.
+
+        :param validators: [optional]
+            A dictionary of validators (`ETag` and `Last-Modified` headers)
+            that can be used to revalidate the value once it has expired.
+        """
+        expires = None if ttl is None else time() + ttl
+        self._set(key, value, expires, validators or None)
+
+
+    def revalidated(self, key, value, ttl=None, validators=None):
+        r"""
+        Store a stale value that the server has confirmed is still current
+        (i.e., with a `304 Not Modified` response). This counts as a cache hit
+        instead of the miss counted when the stale value was looked up.
+
+        The parameters are the same as :meth:`set`.
+        """
+        with self._lock:
+            self.hits += 1
+            self.misses -= 1
+        self.set(key, value, ttl, validators)
+
+
+    def invalidate(self, end_point=None):
+        r"""
+        Remove cached values.
+
+        :param end_point: [optional]
+            Only remove values for end points that start with this string. If
+            `None` is given, all values are removed.
+        """
+        self._invalidate(json.dumps([end_point or ""])[:-2])
+
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value, expires, validators):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+    def _invalidate(self, prefix):
+        raise NotImplementedError
+
+
+
+class MemoryCache(BaseCache):
+
+    r"""
+    An in-memory, least-recently-used response cache.
+
+    Values are held pickled, so each lookup returns a new copy of the value,
+    which can be modified without changing the cached value.
+
+    :param maxsize: [optional]
+        The maximum number of responses to hold.
+    """
+
+    def __init__(self, maxsize=1024):
+        super(MemoryCache, self).__init__()
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        return None
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def _get(self, key):
+        with self._lock:
+            try:
+                entry = self._entries[key]
+            except KeyError:
+                return None
+
+            self._entries.move_to_end(key)
+
+        value, expires, validators = entry
+        return (pickle.loads(value), expires, validators)
+
+
+    def _set(self, key, value, expires, validators):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._entries[key] = (value, expires, validators)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+    def _delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+    def _invalidate(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+
+
+class SQLiteCache(BaseCache):
+
+    r"""
+    An on-disk, least-recently-used response cache backed by SQLite, which
+    persists between sessions and can be shared between processes.
+
+    :param path:
+        The path of the SQLite database.
+
+    :param maxsize: [optional]
+        The maximum number of responses to hold. Least-recently-used responses
+        are evicted in batches, so the cache can briefly hold up to 1% more.
+    """
+
+    def __init__(self, path, maxsize=100000):
+        super(SQLiteCache, self).__init__()
+        self.path = path
+        self.maxsize = maxsize
+        self._writes = 0
+        self._connection = sqlite3.connect(path, timeout=30,
+                                           check_same_thread=False)
+        with self._lock, self._connection as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires REAL,
+                    validators TEXT,
+                    accessed REAL NOT NULL)""")
+            connection.execute(
+                """CREATE INDEX IF NOT EXISTS responses_accessed
+                    ON responses (accessed)""")
+        return None
+
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+    def close(self):
+        self._connection.close()
+
+
+    def _get(self, key):
+        with self._lock, self._connection as connection:
+            row = connection.execute(
+                "SELECT value, expires, validators FROM responses WHERE key = ?",
+                (key, )).fetchone()
+            if row is None:
+                return None
+
+            connection.execute("UPDATE responses SET accessed = ? WHERE key = ?",
+                               (time(), key))
+
+        value, expires, validators = row
+        return (json.loads(value), expires,
+                None if validators is None else json.loads(validators))
+
+
+    def _set(self, key, value, expires, validators):
+        with self._lock, self._connection as connection:
+            connection.execute(
+                "REPLACE INTO responses (key, value, expires, validators, "
+                "accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), expires,
+                 None if validators is None else json.dumps(validators), time()))
+
+            self._writes += 1
+            if self._writes % max(1, self.maxsize // 100) == 0:
+                connection.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY accessed DESC
+                        LIMIT -1 OFFSET ?)""", (self.maxsize, ))
+
+
+    def _delete(self, key):
+        with self._lock, self._connection as connection:
+            connection.execute("DELETE FROM responses WHERE key = ?", (key, ))
+
+
+    def _invalidate(self, prefix):
+        with self._lock, self._connection as connection:
+            connection.execute(
+                "DELETE FROM responses WHERE substr(key, 1, ?) = ?",
+                (len(prefix), prefix))
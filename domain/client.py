@@ -1,7 +1,13 @@
 
-from . import (authorisation, base, validate)
+import asyncio
+import contextvars
+from functools import partial
 
-__all__ = ["DomainClient"]
+from . import (authorisation, base, batch as batching, pagination, streaming,
+               validate)
+from .authorisation.grant import AuthorisationGrant
+
+__all__ = ["DomainClient", "AsyncDomainClient"]
 
 class DomainClient(base.BaseDomainClient):
 
@@ -99,6 +105,10 @@ class DomainClient(base.BaseDomainClient):
         
         :param page_size: [optional]
             Page size for paginated results.
+
+        :param stream: [optional]
+            Yield the listings as the response arrives, instead of returning
+            them all at once.
         """
 
         # TODO: Revisit listingStatusFilter, which is also referred to elsewhere
@@ -116,6 +126,23 @@ class DomainClient(base.BaseDomainClient):
                                  **kwargs)
     
 
+    def iter_agencies_listings(self, id, listingStatusFilter=None,
+                               date_updated_since=None, prefetch=1, **kwargs):
+        r"""
+        Iterate over all listings for a specific agency, across all pages.
+
+        See :meth:`agencies_listings` for a description of the parameters.
+
+        :param prefetch: [optional]
+            The number of pages to request ahead of the page being consumed.
+        """
+        page_size = kwargs.pop("page_size", 200)
+        return self._paginate(self.agencies_listings, page_size, id,
+                              listingStatusFilter=listingStatusFilter,
+                              date_updated_since=date_updated_since,
+                              page_size=page_size, prefetch=prefetch, **kwargs)
+    
+
     @authorisation.requires_scope("api_agencies_read")
     def agencies_statistics(self, id, **kwargs):
         r"""
@@ -178,6 +205,21 @@ class DomainClient(base.BaseDomainClient):
         return self._api_request(f"agencies", params=params, **kwargs)
     
 
+    def iter_agencies_search(self, query, prefetch=1, **kwargs):
+        r"""
+        Iterate over all agencies matching the specified criteria, across all
+        pages.
+
+        See :meth:`agencies_search` for a description of the parameters.
+
+        :param prefetch: [optional]
+            The number of pages to request ahead of the page being consumed.
+        """
+        page_size = kwargs.pop("page_size", 200)
+        return self._paginate(self.agencies_search, page_size, query,
+                              page_size=page_size, prefetch=prefetch, **kwargs)
+    
+
     @authorisation.requires_scope("api_agencies_read")
     def agents_search(self, query, page_number=None, page_size=None, **kwargs):
         r"""
@@ -203,6 +245,20 @@ class DomainClient(base.BaseDomainClient):
         return self._api_request(f"agents/search", params=params, **kwargs)
     
 
+    def iter_agents_search(self, query, prefetch=1, **kwargs):
+        r"""
+        Iterate over all agents matching the given name, across all pages.
+
+        See :meth:`agents_search` for a description of the parameters.
+
+        :param prefetch: [optional]
+            The number of pages to request ahead of the page being consumed.
+        """
+        page_size = kwargs.pop("page_size", 20)
+        return self._paginate(self.agents_search, page_size, query,
+                              page_size=page_size, prefetch=prefetch, **kwargs)
+    
+
     @authorisation.requires_scope("api_agencies_read")
     def agents(self, id, **kwargs):
         r"""
@@ -244,6 +300,24 @@ class DomainClient(base.BaseDomainClient):
         return self._api_request(f"agents/{id}/listings", params=params, **kwargs)
     
 
+    def iter_agents_listings(self, id, date_updated_since=None,
+                             includedArchivedListings=None, prefetch=1,
+                             **kwargs):
+        r"""
+        Iterate over all listings of an agent, across all pages.
+
+        See :meth:`agents_listings` for a description of the parameters.
+
+        :param prefetch: [optional]
+            The number of pages to request ahead of the page being consumed.
+        """
+        page_size = kwargs.pop("page_size", 200)
+        return self._paginate(self.agents_listings, page_size, id,
+                              date_updated_since=date_updated_since,
+                              includedArchivedListings=includedArchivedListings,
+                              page_size=page_size, prefetch=prefetch, **kwargs)
+    
+
     @authorisation.requires_scope("api_demographics_read")
     def demographics(self, level, id, types=None, year=None, **kwargs):
         r"""
@@ -280,21 +354,7 @@ class DomainClient(base.BaseDomainClient):
 
         level = validate.case_insensitive_string(level, ("Postcode", "Suburb"))
 
-        if types is not None:
-            available = [
-                "AgeGroupOfPopulation", 
-                "CountryOfBirth",
-                "NatureOfOccupancy",
-                "GeographicalPopulation",
-                "DwellingStructure",
-                "HousingLoanRepayment",
-                "MaritalStatus",
-                "Religion",
-                "Occupation",
-                "EducationAttendance",
-                "TransportToWork"
-            ]
-            types = [validate.case_insensitive_string(_, available) for _ in types]
+        types = validate.demographics_types(types)
 
         params = dict(level=level, id=id, types=types, year=year)
         return self._api_request(f"demographics", params=params, **kwargs)
@@ -397,6 +457,19 @@ class DomainClient(base.BaseDomainClient):
                                  **kwargs)
     
 
+    def iter_listings_enquiries(self, id, prefetch=1, **kwargs):
+        r"""
+        Iterate over all enquiries for a given listing, across all pages.
+
+        See :meth:`listings_enquiries` for a description of the parameters.
+
+        :param prefetch: [optional]
+            The number of pages to request ahead of the page being consumed.
+        """
+        return self._paginate(self.listings_enquiries, 25, id,
+                              prefetch=prefetch, **kwargs)
+    
+
     @authorisation.requires_scope("api_listings_read")
     def listings_statistics(self, id, time_period=None, **kwargs):
         r"""
@@ -496,6 +569,10 @@ class DomainClient(base.BaseDomainClient):
 
         :param terms: [optional]
             Suburb / area / region prefix, or postcode.
+
+        :param stream: [optional]
+            Yield the locations as the response arrives, instead of returning
+            them all at once.
         """
         # TODO: the docstring and documentation for this method is not clear.
         data = dict(terms=terms)
@@ -560,6 +637,20 @@ class DomainClient(base.BaseDomainClient):
         return self._api_request(f"projects", params=data, **kwargs)
     
 
+    def iter_projects(self, agency_id=None, prefetch=1, **kwargs):
+        r"""
+        Iterate over all projects, across all pages.
+
+        See :meth:`projects` for a description of the parameters.
+
+        :param prefetch: [optional]
+            The number of pages to request ahead of the page being consumed.
+        """
+        page_size = kwargs.pop("page_size", 100)
+        return self._paginate(self.projects, page_size, agency_id=agency_id,
+                              page_size=page_size, prefetch=prefetch, **kwargs)
+    
+
     @authorisation.requires_scope("api_properties_read")
     def properties(self, id, **kwargs):
         r"""
@@ -718,7 +809,10 @@ class DomainClient(base.BaseDomainClient):
         :param city: 
             City. Supported cities are: `Sydney`, `Melbourne`, `Brisbane`, 
             `Adelaide`, `Canberra`.
-    
+
+        :param stream: [optional]
+            Yield the sales results as the response arrives, instead of
+            returning them all at once.
         """
         city = validate.city(city)
         return self._api_request(f"salesResults/{city}/listings", **kwargs)
@@ -852,4 +946,140 @@ class DomainClient(base.BaseDomainClient):
         # TODO: Swagger has no docs for page_number or page_size.
         data = dict(page_number=page_number, page_size=page_size)
         return self._api_request(f"webhooks/{id}/subscriptions", params=data, **kwargs)
-    
\ No newline at end of file
+    
+
+    def iter_webhooks_subscriptions(self, id, prefetch=1, **kwargs):
+        r"""
+        Iterate over all webhook subscriptions, across all pages.
+
+        See :meth:`webhooks_subscriptions` for a description of the parameters.
+
+        :param prefetch: [optional]
+            The number of pages to request ahead of the page being consumed.
+        """
+        page_size = kwargs.pop("page_size", 200)
+        return self._paginate(self.webhooks_subscriptions, page_size, id,
+                              page_size=page_size, prefetch=prefetch, **kwargs)
+    
+
+
+class AsyncDomainClient(DomainClient):
+
+    r"""
+    An asyncio client for the Domain API.
+
+    Every API method of :class:`DomainClient` is available with the same
+    signature, but returns an awaitable (and the `iter_*`, :meth:`batch`, and
+    :meth:`map_endpoint` methods return asynchronous generators). Tokens are created and requests are
+    throttled without blocking the event loop, and the HTTP requests themselves
+    are executed on a pool of worker threads that share the client's
+    connection pools.
+    """
+
+    def __init__(self, credentials_path, max_workers=100, **kwargs):
+        r"""
+        Initialize an asyncio client with the Domain API.
+
+        :param credentials_path:
+            The path to a YAML file that lists the client credentials.
+
+        :param max_workers: [optional]
+            The maximum number of requests that can be in flight at once.
+        """
+        kwargs.setdefault("api_pool_size", max_workers)
+        super(AsyncDomainClient, self).__init__(credentials_path,
+                                                max_workers=max_workers,
+                                                **kwargs)
+        return None
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+    def _batch(self, calls, ordered, max_pending):
+        return batching.aexecute(calls, ordered, max_pending)
+
+
+    def _paginate(self, method, items_per_page, *args, **kwargs):
+        return pagination.apaginate(method, items_per_page, *args, **kwargs)
+
+
+    def _token(self, credentials):
+        # Defer token creation to `_api_request`, where it can be awaited.
+        return credentials
+
+
+    async def _run(self, function, *args, **kwargs):
+        r"""
+        Run a blocking function on the worker threads and await the result.
+        """
+        # The context (e.g., the span of the API call) is copied to the thread.
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, partial(context.run, function, *args, **kwargs))
+
+
+    async def _api_request(self, end_point, token, models=None, decoder=None,
+                           stream=False, **kwargs):
+        r"""
+        Execute an API request to the Domain API.
+
+        :param end_point:
+            The relative URL of the API end point.
+
+        :param token:
+            The authorisation token, or the authorisation grant to create a
+            token from, to use for the request.
+
+        :param models: [optional]
+            Return the response as a model. If `None` is given, the client's
+            default is used.
+
+        :param decoder: [optional]
+            How to decode the response (see :func:`domain.decoders.get_decoder`).
+            If `None` is given, the client's default is used.
+
+        :param stream: [optional]
+            Return an asynchronous generator that yields the items of a JSON
+            array response as the response body arrives.
+        """
+        if isinstance(token, AuthorisationGrant):
+            token = await token.atoken()
+
+        with self._span(end_point):
+            decode = self._decoder_for(decoder, kwargs)
+            if stream:
+                kwargs.pop("cache", None)
+                await self._athrottle(end_point, token)
+                r = await self._run(self._api_get, end_point, token,
+                                    stream=True, **kwargs)
+                return streaming.aiter_items(
+                    self._run, r, self._item_decoder(end_point, decode, models))
+
+            key, ttl, value = self._cache_lookup(end_point, token, kwargs)
+            if value is None:
+                async def fetch():
+                    await self._athrottle(end_point, token)
+                    return await self._run(self._api_fetch, end_point, token,
+                                           key, ttl, decode, **kwargs)
+
+                flight = self._flight_key(end_point, token, decode, kwargs)
+                value = await (fetch() if flight is None \
+                               else self._flights.ado(flight, fetch))
+            return self._model(end_point, value, models)
+
+
+    async def _athrottle(self, end_point, token):
+        r"""
+        Wait (without blocking the event loop) until an API call can be made
+        with a token, and record the wait.
+        """
+        seconds = await token.athrottle()
+        if self.instruments is not None:
+            self.instruments.throttled(end_point, seconds or 0)
@@ -0,0 +1,127 @@
+
+""" Coalesce identical API requests that are in flight at the same time. """
+
+import asyncio
+import threading
+from concurrent.futures import Future
+
+__all__ = ["SingleFlight"]
+
+
+class SingleFlight(object):
+
+    r"""
+    Make sure that only one call for each key is in flight at a time.
+
+    Callers that ask for a key while a call for it is in flight wait for that
+    call and share its result (or exception), instead of making their own.
+    Threads and coroutines can share the same instance.
+
+    :param copy: [optional]
+        A function that copies a result, so that each caller who waited for it
+        is given their own copy. If `None` is given, the result is shared.
+    """
+
+    def __init__(self, copy=None):
+        self.copy = copy
+        self._calls = dict()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        return None
+
+
+    def __len__(self):
+        return len(self._calls)
+
+
+    @property
+    def stats(self):
+        r""" Return the number of calls made, and the number that were coalesced. """
+        return dict(calls=self.calls, coalesced=self.coalesced)
+
+
+    def _join(self, key):
+        r"""
+        Return a two-length tuple of the future for the given key, and whether
+        the caller is the leader (who must make the call).
+        """
+        with self._lock:
+            future = self._calls.get(key, None)
+            if future is not None:
+                self.coalesced += 1
+                return (future, False)
+
+            future = self._calls[key] = Future()
+            self.calls += 1
+            return (future, True)
+
+
+    def _copy(self, result):
+        return result if self.copy is None else self.copy(result)
+
+
+    def _leave(self, key, future):
+        with self._lock:
+            if self._calls.get(key, None) is future:
+                del self._calls[key]
+
+
+    def do(self, key, function):
+        r"""
+        Call a function, unless a call with the same key is in flight, and
+        return the result.
+
+        :param key:
+            A hashable key that identifies the call.
+
+        :param function:
+            The function to call.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return self._copy(future.result())
+
+        try:
+            result = function()
+
+        except BaseException as exception:
+            future.set_exception(exception)
+            raise
+
+        else:
+            future.set_result(result)
+            return result
+
+        finally:
+            self._leave(key, future)
+
+
+    async def ado(self, key, function):
+        r"""
+        Await a coroutine function, unless a call with the same key is in
+        flight, and return the result.
+
+        :param key:
+            A hashable key that identifies the call.
+
+        :param function:
+            The coroutine function to call.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return self._copy(await asyncio.wrap_future(future))
+
+        try:
+            result = await function()
+
+        except BaseException as exception:
+            future.set_exception(exception)
+            raise
+
+        else:
+            future.set_result(result)
+            return result
+
+        finally:
+            self._leave(key, future)
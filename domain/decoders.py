@@ -0,0 +1,88 @@
+
+""" Decoders for the JSON responses of the Domain API. """
+
+import json
+from collections import OrderedDict
+
+__all__ = ["decoders", "raw_decoders", "available_decoders", "get_decoder",
+           "is_raw"]
+
+# Decoders for response bodies, from most to least preferred. Each takes the
+# body as bytes. Third-party decoders are only included if they are installed.
+decoders = OrderedDict()
+
+try:
+    import orjson
+except ImportError:
+    pass
+else:
+    decoders["orjson"] = orjson.loads
+
+try:
+    import simdjson # pysimdjson
+except ImportError:
+    pass
+else:
+    decoders["simdjson"] = simdjson.loads
+
+try:
+    import ujson
+except ImportError:
+    pass
+else:
+    decoders["ujson"] = ujson.loads
+
+decoders["json"] = json.loads
+
+# Decoders that return the body without decoding it (e.g., to forward or
+# archive it). Responses decoded with these are not cached.
+raw_decoders = OrderedDict([
+    ("bytes", bytes),
+    ("memoryview", memoryview),
+])
+
+
+def available_decoders():
+    r""" Return the names of the installed JSON decoders, in order of preference. """
+    return list(decoders.keys())
+
+
+def get_decoder(decoder=None):
+    r"""
+    Return a function that decodes a response body (given as bytes).
+
+    :param decoder: [optional]
+        The name of a JSON decoder (`orjson`, `simdjson`, `ujson`, or `json`),
+        `bytes` or `memoryview` to return the body without decoding it, or a
+        function. If `None` or `auto` is given, the fastest installed JSON
+        decoder is used.
+
+    :raises ValueError:
+        If the named decoder is unknown or not installed.
+    """
+    if callable(decoder):
+        return decoder
+
+    if decoder is None or decoder == "auto":
+        return next(iter(decoders.values()))
+
+    try:
+        return decoders[decoder]
+    except KeyError:
+        try:
+            return raw_decoders[decoder]
+        except KeyError:
+            known = ", ".join(list(decoders) + list(raw_decoders))
+            raise ValueError(f"unknown or uninstalled decoder '{decoder}' "
+                             f"(available: {known})") from None
+
+
+def is_raw(decoder):
+    r"""
+    Return whether the given decoder function returns the response body
+    without decoding it.
+
+    :param decoder:
+        A decoder function from :func:`get_decoder`.
+    """
+    return any(decoder is each for each in raw_decoders.values())
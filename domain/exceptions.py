@@ -0,0 +1,11 @@
+
+class QuotaExceededException(Exception):
+    pass
+
+
+class CircuitOpenException(Exception):
+    pass
+
+
+class CassetteException(Exception):
+    pass
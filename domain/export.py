@@ -0,0 +1,595 @@
+
+""" Export results from the Domain API to columnar formats. """
+
+import re
+import warnings
+from collections import OrderedDict
+from datetime import (datetime, timezone)
+from itertools import islice
+
+from .models import parse_datetime
+from .utils import require
+
+__all__ = ["Column", "Schema", "schemas", "get_schema", "records",
+           "iter_columns", "to_numpy", "to_pandas", "to_arrow",
+           "write_parquet"]
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _str(value):
+    return None if value is None else str(value)
+
+
+def _bool(value):
+    return None if value is None else bool(value)
+
+
+def _datetime(value):
+    value = parse_datetime(value)
+    if isinstance(value, str):
+        # Dates without times (or with fewer parts of the time).
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# The conversion of values of each kind, and their NumPy, pandas, and Arrow
+# types.
+_kinds = dict(
+    int=(_int, "i8", "Int64", "int64"),
+    float=(_float, "f8", "float64", "float64"),
+    str=(_str, "O", "string", "string"),
+    bool=(_bool, "?", "boolean", "bool_"),
+    datetime=(_datetime, "datetime64[us]", "datetime64[us]", "timestamp"),
+)
+
+
+class Column(object):
+
+    r"""
+    A column of exported results.
+
+    :param name:
+        The name of the column.
+
+    :param key: [optional]
+        The key of the value in each record, or a tuple of keys for a nested
+        value (e.g., `("geoLocation", "latitude")`, or `("propertyTypes", 0)`
+        for the first item of a list). Defaults to the name.
+
+    :param kind: [optional]
+        The kind of values: `int`, `float`, `str`, `bool`, or `datetime`.
+        Values that cannot be converted are missing.
+    """
+
+    def __init__(self, name, key=None, kind="str"):
+        if kind not in _kinds:
+            raise ValueError(f"unknown kind '{kind}' (available: "
+                             f"{', '.join(_kinds)})")
+        self.name = name
+        self.key = tuple(key) if isinstance(key, (tuple, list)) else (key or name, )
+        self.kind = kind
+        return None
+
+
+    def __repr__(self):
+        return f"<Column {self.name} ({self.kind})>"
+
+
+    def convert(self, value):
+        r""" Return a value converted to the kind of this column. """
+        return _kinds[self.kind][0](value)
+
+
+    def raw(self, records):
+        r"""
+        Return a list of the values of this column as they are in the records.
+
+        :param records:
+            A list of records (dictionaries).
+        """
+        # Each key is looked up for every record at once, not record by record.
+        key, *keys = self.key
+        values = [record.get(key, None) for record in records]
+        for key in keys:
+            if isinstance(key, int):
+                values = [value[key] if isinstance(value, list)
+                          and -len(value) <= key < len(value) else None
+                          for value in values]
+            else:
+                values = [value.get(key, None) if isinstance(value, dict)
+                          else None for value in values]
+        return values
+
+
+    def values(self, records):
+        r"""
+        Return a list of the (converted) values of this column.
+
+        :param records:
+            A list of records (dictionaries).
+        """
+        convert = _kinds[self.kind][0]
+        return [convert(value) for value in self.raw(records)]
+
+
+    def array(self, records, numpy):
+        r"""
+        Return a NumPy array of the (converted) values of this column, and a
+        boolean array of the values that are missing.
+
+        Values are converted by NumPy all at once where they can be (i.e., if
+        numbers are all numbers, dates are all strings, and so on), and
+        otherwise one at a time.
+
+        :param records:
+            A list of records (dictionaries).
+
+        :param numpy:
+            The NumPy module.
+        """
+        values = self.raw(records)
+        dtype = _kinds[self.kind][1]
+        types = set(map(type, values))
+        types.discard(type(None))
+
+        if (self.kind in ("int", "float") and types <= {int, float}) \
+        or (self.kind == "datetime" and types <= {str}):
+            try:
+                with warnings.catch_warnings():
+                    # Dates with time zones are converted to UTC (as they are
+                    # one at a time), which NumPy warns about.
+                    warnings.simplefilter("ignore")
+                    data = numpy.array(values, dtype="f8" if self.kind == "int"
+                                                    else dtype)
+            except (TypeError, ValueError, OverflowError):
+                pass
+            else:
+                if self.kind == "datetime":
+                    return (data, numpy.isnat(data))
+                mask = numpy.isnan(data)
+                if self.kind == "float":
+                    return (data, mask)
+                # Integers beyond the precision of floats are converted one
+                # at a time.
+                if not numpy.any(numpy.abs(data[~mask]) > 2**53):
+                    data[mask] = 0
+                    return (numpy.trunc(data).astype(dtype), mask)
+
+        elif self.kind in ("str", "bool") \
+        and types <= ({str} if self.kind == "str" else {bool}):
+            data = numpy.array(values, dtype=object)
+            mask = numpy.equal(data, None)
+            if self.kind == "bool":
+                data[mask] = False
+                data = data.astype(dtype)
+            return (data, mask)
+
+        convert = _kinds[self.kind][0]
+        values = [convert(value) for value in values]
+        mask = numpy.fromiter((value is None for value in values), dtype=bool,
+                              count=len(values))
+        if self.kind in ("int", "float", "bool") and mask.any():
+            # Missing dates are `NaT` and missing floats are `NaN`, as they are
+            # when they are converted all at once.
+            fill = float("nan") if self.kind == "float" \
+                   else numpy.zeros(1, dtype=dtype)[0].item()
+            values = [fill if value is None else value for value in values]
+        return (numpy.array(values, dtype=dtype), mask)
+
+
+
+class Schema(object):
+
+    r"""
+    The columns of exported results from an API end point.
+
+    :param columns:
+        A list of :class:`Column` objects.
+
+    :param flatten: [optional]
+        A function that takes one response and yields its records. If `None` is
+        given, the results are taken to be records (or lists of records).
+    """
+
+    def __init__(self, columns, flatten=None):
+        self.columns = list(columns)
+        self.flatten = flatten
+        return None
+
+
+    @property
+    def names(self):
+        return [column.name for column in self.columns]
+
+
+
+def _suburb_performance_statistics(response):
+    header = response.get("header", None) or dict()
+    series = (response.get("series", None) or dict()).get("seriesInfo", None)
+    for period in series or []:
+        record = dict(header)
+        record.update(year=period.get("year", None),
+                      month=period.get("month", None))
+        record.update(period.get("values", None) or dict())
+        yield record
+
+
+def _demographics(response):
+    for each in response.get("demographics", None) or []:
+        for item in each.get("items", None) or []:
+            yield dict(type=each.get("type", None),
+                       year=each.get("year", None),
+                       total=each.get("total", None),
+                       label=item.get("label", None),
+                       value=item.get("value", None),
+                       composition=item.get("composition", None))
+
+
+_listing_columns = [
+    Column("id", kind="int"),
+    Column("objective"),
+    Column("sale_mode", "saleMode"),
+    Column("channel"),
+    Column("status"),
+    Column("display_address", ("addressParts", "displayAddress")),
+    Column("suburb", ("addressParts", "suburb")),
+    Column("suburb_id", ("addressParts", "suburbId"), "int"),
+    Column("postcode", ("addressParts", "postcode")),
+    Column("state", ("addressParts", "stateAbbreviation")),
+    Column("bedrooms", kind="float"),
+    Column("bathrooms", kind="float"),
+    Column("carspaces", kind="int"),
+    Column("land_area_sqm", "landAreaSqm", "float"),
+    Column("display_price", ("priceDetails", "displayPrice")),
+    Column("price", ("priceDetails", "price"), "float"),
+    Column("price_from", ("priceDetails", "priceFrom"), "float"),
+    Column("price_to", ("priceDetails", "priceTo"), "float"),
+    Column("latitude", ("geoLocation", "latitude"), "float"),
+    Column("longitude", ("geoLocation", "longitude"), "float"),
+    Column("is_new_development", "isNewDevelopment", "bool"),
+    Column("date_listed", "dateListed", "datetime"),
+    Column("date_updated", "dateUpdated", "datetime"),
+    Column("headline"),
+    Column("property_id", "propertyId"),
+    Column("seo_url", "seoUrl"),
+]
+
+_statistics = [
+    ("MedianSoldPrice", "float"),
+    ("NumberSold", "int"),
+    ("HighestSoldPrice", "float"),
+    ("LowestSoldPrice", "float"),
+    ("5thPercentileSoldPrice", "float"),
+    ("25thPercentileSoldPrice", "float"),
+    ("75thPercentileSoldPrice", "float"),
+    ("95thPercentileSoldPrice", "float"),
+    ("MedianSaleListingPrice", "float"),
+    ("NumberSaleListing", "int"),
+    ("HighestSaleListingPrice", "float"),
+    ("LowestSaleListingPrice", "float"),
+    ("AuctionNumberAuctioned", "int"),
+    ("AuctionNumberSold", "int"),
+    ("AuctionNumberWithdrawn", "int"),
+    ("DaysOnMarket", "float"),
+    ("DiscountPercentage", "float"),
+    ("MedianRentListingPrice", "float"),
+    ("NumberRentListing", "int"),
+    ("HighestRentListingPrice", "float"),
+    ("LowestRentListingPrice", "float"),
+]
+
+# The schema of the results from each API method.
+schemas = dict(
+    sales_results_listings=Schema([
+        Column("id", kind="int"),
+        Column("unit_number", "unitNumber"),
+        Column("street_number", "streetNumber"),
+        Column("street_name", "streetName"),
+        Column("street_type", "streetType"),
+        Column("suburb"),
+        Column("postcode"),
+        Column("property_type", "propertyType"),
+        Column("bedrooms", kind="int"),
+        Column("bathrooms", kind="int"),
+        Column("carspaces", kind="int"),
+        Column("price", kind="float"),
+        Column("result"),
+        Column("agency_name", "agencyName"),
+        Column("agent_name", "agentName"),
+        Column("latitude", ("geoLocation", "latitude"), "float"),
+        Column("longitude", ("geoLocation", "longitude"), "float"),
+        Column("property_details_url", "propertyDetailsUrl"),
+    ]),
+    agencies_listings=Schema(_listing_columns),
+    agents_listings=Schema(_listing_columns),
+    projects_listings=Schema(_listing_columns),
+    suburb_performance_statistics=Schema(
+        [Column("state"),
+         Column("suburb"),
+         Column("property_category", "propertyCategory"),
+         Column("year", kind="int"),
+         Column("month", kind="int")] \
+        + [Column(re.sub(r"(?<=[a-z])(?=[A-Z])", "_", name).lower(),
+                  name[0].lower() + name[1:], kind)
+           for name, kind in _statistics],
+        flatten=_suburb_performance_statistics),
+    demographics=Schema(
+        [Column("type"),
+         Column("year", kind="int"),
+         Column("total", kind="int"),
+         Column("label"),
+         Column("value", kind="int"),
+         Column("composition")],
+        flatten=_demographics),
+)
+
+
+def get_schema(schema):
+    r"""
+    Return the schema for the given API method.
+
+    :param schema:
+        The name of an API method (e.g., `sales_results_listings`), or a
+        :class:`Schema`.
+
+    :raises ValueError:
+        If there is no schema for the API method.
+    """
+    if isinstance(schema, Schema):
+        return schema
+    try:
+        return schemas[schema]
+    except KeyError:
+        raise ValueError(f"no schema for '{schema}' (available: "
+                         f"{', '.join(sorted(schemas))})") from None
+
+
+def records(results, schema):
+    r"""
+    Yield the records of the given results.
+
+    :param results:
+        A response, or an iterable of responses, items, or pages of items
+        (e.g., from an `iter_*` method, :meth:`map_endpoint`, or a streamed
+        response). Response models are accepted too, and so are the
+        `(index, result)` tuples of unordered calls to :meth:`map_endpoint`.
+
+    :param schema:
+        The name of an API method, or a :class:`Schema`.
+    """
+    schema = get_schema(schema)
+    if isinstance(results, dict) or hasattr(results, "to_dict"):
+        results = [results]
+
+    for result in results:
+        if isinstance(result, tuple) and len(result) == 2 \
+        and isinstance(result[0], int):
+            # From an unordered `map_endpoint`.
+            result = result[1]
+        if isinstance(result, Exception):
+            raise result
+        if hasattr(result, "to_dict"):
+            result = result.to_dict()
+
+        if isinstance(result, list):
+            for item in result:
+                yield item.to_dict() if hasattr(item, "to_dict") else item
+        elif schema.flatten is not None:
+            yield from schema.flatten(result)
+        else:
+            yield result
+
+
+def iter_columns(results, schema, chunk_size=10000):
+    r"""
+    Yield the results in chunks of columns.
+
+    Each chunk is an ordered dictionary of column names and lists of values,
+    with at most `chunk_size` rows. Missing values are `None`.
+
+    :param results:
+        The results (see :func:`records`).
+
+    :param schema:
+        The name of an API method, or a :class:`Schema`.
+
+    :param chunk_size: [optional]
+        The maximum number of rows in each chunk.
+    """
+    schema = get_schema(schema)
+    for chunk in _chunks(results, schema, chunk_size):
+        yield OrderedDict([(column.name, column.values(chunk))
+                           for column in schema.columns])
+
+
+def _chunks(results, schema, chunk_size):
+    rows = records(results, schema)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        yield chunk
+        if len(chunk) < chunk_size:
+            break
+
+
+def _iter_arrays(numpy, results, schema, chunk_size):
+    r"""
+    Yield the results in chunks of columns, as ordered dictionaries of column
+    names and `(values, missing)` NumPy arrays (see :meth:`Column.array`).
+    """
+    for chunk in _chunks(results, schema, chunk_size):
+        yield OrderedDict([(column.name, column.array(chunk, numpy))
+                           for column in schema.columns])
+
+
+def to_numpy(results, schema, chunk_size=10000):
+    r"""
+    Return the results as a NumPy structured (masked) array, where missing
+    values are masked.
+
+    :param results:
+        The results (see :func:`records`).
+
+    :param schema:
+        The name of an API method, or a :class:`Schema`.
+
+    :param chunk_size: [optional]
+        The number of rows to convert at a time.
+    """
+    numpy = require("numpy", "export", "this export")
+    schema = get_schema(schema)
+    dtype = [(column.name, _kinds[column.kind][1]) for column in schema.columns]
+    mask_dtype = [(column.name, "?") for column in schema.columns]
+
+    chunks = []
+    for columns in _iter_arrays(numpy, results, schema, chunk_size):
+        size = len(next(iter(columns.values()))[0])
+        data = numpy.zeros(size, dtype=dtype)
+        mask = numpy.zeros(size, dtype=mask_dtype)
+        for name, (values, missing) in columns.items():
+            data[name] = values
+            mask[name] = missing
+        chunks.append(numpy.ma.array(data, mask=mask))
+
+    if not chunks:
+        return numpy.ma.array(numpy.zeros(0, dtype=dtype),
+                              mask=numpy.zeros(0, dtype=mask_dtype))
+    return numpy.ma.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def to_pandas(results, schema, chunk_size=10000):
+    r"""
+    Return the results as a :class:`pandas.DataFrame`, with nullable column
+    types.
+
+    :param results:
+        The results (see :func:`records`).
+
+    :param schema:
+        The name of an API method, or a :class:`Schema`.
+
+    :param chunk_size: [optional]
+        The number of rows to convert at a time.
+    """
+    pandas = require("pandas", "export", "this export")
+    numpy = require("numpy", "export", "this export")
+    schema = get_schema(schema)
+    dtypes = dict((column.name, _kinds[column.kind][2])
+                  for column in schema.columns)
+
+    def array(name, values, missing):
+        dtype = dtypes[name]
+        if dtype == "Int64":
+            return pandas.arrays.IntegerArray(values, missing)
+        if dtype == "boolean":
+            return pandas.arrays.BooleanArray(values, missing)
+        if dtype == "string":
+            return pandas.array(values, dtype=dtype)
+        # Missing floats and dates are already `NaN` and `NaT`.
+        return values
+
+    frames = [pandas.DataFrame(dict(
+                (name, array(name, *arrays)) for name, arrays in columns.items()))
+              for columns in _iter_arrays(numpy, results, schema, chunk_size)]
+
+    if not frames:
+        return pandas.DataFrame(dict(
+            (name, pandas.array([], dtype=dtype)) for name, dtype in dtypes.items()))
+    return pandas.concat(frames, ignore_index=True) if len(frames) > 1 \
+           else frames[0]
+
+
+def _arrow_schema(pyarrow, schema):
+    fields = []
+    for column in schema.columns:
+        kind = _kinds[column.kind][3]
+        type_ = pyarrow.timestamp("us") if kind == "timestamp" \
+                else getattr(pyarrow, kind)()
+        fields.append(pyarrow.field(column.name, type_))
+    return pyarrow.schema(fields)
+
+
+def _iter_batches(pyarrow, results, schema, chunk_size):
+    numpy = require("numpy", "export", "this export")
+    arrow_schema = _arrow_schema(pyarrow, schema)
+    for columns in _iter_arrays(numpy, results, schema, chunk_size):
+        yield pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(values, mask=missing, type=field.type)
+             for (values, missing), field in zip(columns.values(), arrow_schema)],
+            schema=arrow_schema)
+
+
+def to_arrow(results, schema, chunk_size=10000):
+    r"""
+    Return the results as a :class:`pyarrow.Table`, with one record batch per
+    chunk.
+
+    :param results:
+        The results (see :func:`records`).
+
+    :param schema:
+        The name of an API method, or a :class:`Schema`.
+
+    :param chunk_size: [optional]
+        The maximum number of rows in each record batch.
+    """
+    pyarrow = require("pyarrow", "export", "this export")
+    schema = get_schema(schema)
+    return pyarrow.Table.from_batches(
+        list(_iter_batches(pyarrow, results, schema, chunk_size)),
+        schema=_arrow_schema(pyarrow, schema))
+
+
+def write_parquet(results, path, schema, chunk_size=10000, **kwargs):
+    r"""
+    Write the results to a Parquet file, one row group per chunk, so that the
+    results do not all need to be held in memory. Returns the number of rows
+    written.
+
+    :param results:
+        The results (see :func:`records`).
+
+    :param path:
+        The path of the Parquet file.
+
+    :param schema:
+        The name of an API method, or a :class:`Schema`.
+
+    :param chunk_size: [optional]
+        The maximum number of rows in each row group.
+
+    Any other keyword arguments are given to :class:`pyarrow.parquet.ParquetWriter`
+    (e.g., `compression`).
+    """
+    pyarrow = require("pyarrow", "export", "this export")
+    parquet = require("pyarrow.parquet", "export", "this export")
+    schema = get_schema(schema)
+
+    rows = 0
+    with parquet.ParquetWriter(path, _arrow_schema(pyarrow, schema),
+                               **kwargs) as writer:
+        for batch in _iter_batches(pyarrow, results, schema, chunk_size):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
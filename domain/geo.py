@@ -0,0 +1,488 @@
+
+""" A spatial index of listings, properties, and schools, and a cache of schools. """
+
+import math
+import threading
+from collections import OrderedDict
+
+from .utils import require
+
+__all__ = ["coordinates", "haversine", "GridIndex", "SchoolCache"]
+
+# The mean radius of the Earth, in metres.
+EARTH_RADIUS = 6371008.8
+
+# The keys of the latitude and longitude in each kind of record.
+_coordinate_keys = (
+    ("geoLocation", "latitude", "longitude"),
+    ("addressCoordinate", "lat", "lon"),
+    ("location", "latitude", "longitude"),
+    (None, "latitude", "longitude"),
+    (None, "lat", "lon"),
+)
+
+
+def coordinates(record):
+    r"""
+    Return the latitude and longitude of a listing, property, school, or sales
+    result, or `None` if it has no coordinates.
+
+    :param record:
+        The record (a dictionary or model).
+    """
+    to_dict = getattr(record, "to_dict", None)
+    if to_dict is not None:
+        record = to_dict()
+
+    for key, latitude, longitude in _coordinate_keys:
+        location = record.get(key, None) if key is not None else record
+        if isinstance(location, dict):
+            try:
+                return (float(location[latitude]), float(location[longitude]))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return None
+
+
+def haversine(latitude, longitude, latitudes, longitudes):
+    r"""
+    Return the great-circle distances (in metres) between a point and many
+    points.
+
+    :param latitude:
+        The latitude of the point, in degrees.
+
+    :param longitude:
+        The longitude of the point, in degrees.
+
+    :param latitudes:
+        An array of latitudes, in degrees.
+
+    :param longitudes:
+        An array of longitudes, in degrees.
+    """
+    np = require("numpy", "geo", "spatial indexes")
+    phi, lam = (np.radians(latitude), np.radians(longitude))
+    phis, lams = (np.radians(latitudes), np.radians(longitudes))
+    a = np.sin((phis - phi) / 2)**2 \
+      + np.cos(phi) * np.cos(phis) * np.sin((lams - lam) / 2)**2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+
+class GridIndex(object):
+
+    r"""
+    A spatial index of points on a regular latitude and longitude grid, backed
+    by NumPy arrays, for nearest neighbour, radius, and bounding box queries.
+
+    Points are sorted by the cell of the grid that they are in, so the points
+    of a row of cells are contiguous, and a query only computes the distances
+    to the points in the cells near it.
+
+    :param cell_size: [optional]
+        The size of each cell of the grid, in degrees. The default (0.01
+        degrees) is about one kilometre.
+    """
+
+    def __init__(self, cell_size=0.01):
+        self.cell_size = cell_size
+        self._columns = int(math.ceil(360 / cell_size))
+        self._latitudes = []
+        self._longitudes = []
+        self.items = []
+        self._built = None
+        self._lock = threading.Lock()
+        return None
+
+
+    def __len__(self):
+        return len(self.items)
+
+
+    @classmethod
+    def from_records(cls, records, cell_size=0.01):
+        r"""
+        Create an index of records (e.g., listings, properties, or schools)
+        that have coordinates (see :func:`coordinates`).
+
+        :param records:
+            An iterable of records.
+
+        :param cell_size: [optional]
+            The size of each cell of the grid, in degrees.
+        """
+        index = cls(cell_size)
+        index.add_records(records)
+        return index
+
+
+    def add(self, latitude, longitude, item=None):
+        r"""
+        Add a point to the index.
+
+        :param latitude:
+            The latitude of the point, in degrees.
+
+        :param longitude:
+            The longitude of the point, in degrees.
+
+        :param item: [optional]
+            The item to return for the point in queries.
+        """
+        with self._lock:
+            self._latitudes.append(float(latitude))
+            self._longitudes.append(float(longitude))
+            self.items.append(item)
+            self._built = None
+
+
+    def add_records(self, records):
+        r"""
+        Add records that have coordinates (see :func:`coordinates`) to the
+        index, and return the number added. Records without coordinates are
+        skipped.
+
+        :param records:
+            An iterable of records.
+        """
+        added = 0
+        for record in records:
+            point = coordinates(record)
+            if point is not None:
+                self.add(*point, record)
+                added += 1
+        return added
+
+
+    def _cell(self, np, latitudes, longitudes):
+        rows = np.floor((np.asarray(latitudes) + 90) / self.cell_size).astype(np.int64)
+        columns = np.floor((np.asarray(longitudes) + 180) / self.cell_size).astype(np.int64)
+        return (rows, np.clip(columns, 0, self._columns - 1))
+
+
+    def _build(self):
+        r"""
+        Return the arrays of the index (sorted by cell), building them if
+        points have been added since they were last built.
+        """
+        built = self._built
+        if built is not None:
+            return built
+
+        np = require("numpy", "geo", "spatial indexes")
+        with self._lock:
+            latitudes = np.array(self._latitudes, dtype=float)
+            longitudes = np.array(self._longitudes, dtype=float)
+            rows, columns = self._cell(np, latitudes, longitudes)
+            keys = rows * self._columns + columns
+            order = np.argsort(keys, kind="stable")
+            self._built = built = (keys[order], latitudes[order],
+                                   longitudes[order], order)
+        return built
+
+
+    def _candidates(self, south, west, north, east):
+        r"""
+        Return the (sorted) positions of the points in the cells that overlap
+        a bounding box.
+        """
+        np = require("numpy", "geo", "spatial indexes")
+        keys, *_ = self._build()
+        (row_south, row_north), (column_west, column_east) = \
+            self._cell(np, [south, north], [west, east])
+
+        rows = np.arange(row_south, row_north + 1, dtype=np.int64)
+        starts = np.searchsorted(keys, rows * self._columns + column_west, "left")
+        ends = np.searchsorted(keys, rows * self._columns + column_east, "right")
+        if len(rows) == 1:
+            return np.arange(starts[0], ends[0])
+        return np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+
+
+    def _box(self, latitude, longitude, radius):
+        r""" Return a bounding box that contains a circle. """
+        dlat = math.degrees(radius / EARTH_RADIUS)
+        cos = math.cos(math.radians(min(89.9, abs(latitude) + dlat)))
+        dlon = min(180, dlat / max(cos, 1e-6))
+        return (max(-90, latitude - dlat), longitude - dlon,
+                min(90, latitude + dlat), longitude + dlon)
+
+
+    def _result(self, positions, distances=None):
+        _, _, _, order = self._build()
+        indices = order[positions]
+        if distances is None:
+            return [self.items[i] for i in indices]
+        return [(self.items[i], float(d)) for i, d in zip(indices, distances)]
+
+
+    def bbox(self, south, west, north, east):
+        r"""
+        Return the items of the points in a bounding box.
+
+        :param south:
+            The southern latitude, in degrees.
+
+        :param west:
+            The western longitude, in degrees.
+
+        :param north:
+            The northern latitude, in degrees.
+
+        :param east:
+            The eastern longitude, in degrees.
+        """
+        if not self.items:
+            return []
+        _, latitudes, longitudes, _ = self._build()
+        positions = self._candidates(south, west, north, east)
+        inside = (latitudes[positions] >= south) & (latitudes[positions] <= north) \
+               & (longitudes[positions] >= west) & (longitudes[positions] <= east)
+        return self._result(positions[inside])
+
+
+    def radius(self, latitude, longitude, radius):
+        r"""
+        Return a list of `(item, distance)` tuples of the points within a
+        distance of a point, nearest first.
+
+        :param latitude:
+            The latitude of the point, in degrees.
+
+        :param longitude:
+            The longitude of the point, in degrees.
+
+        :param radius:
+            The distance, in metres.
+        """
+        if not self.items:
+            return []
+        np = require("numpy", "geo", "spatial indexes")
+        _, latitudes, longitudes, _ = self._build()
+        positions = self._candidates(*self._box(latitude, longitude, radius))
+        distances = haversine(latitude, longitude, latitudes[positions],
+                              longitudes[positions])
+        within = distances <= radius
+        positions, distances = (positions[within], distances[within])
+        nearest = np.argsort(distances, kind="stable")
+        return self._result(positions[nearest], distances[nearest])
+
+
+    def nearest(self, latitude, longitude, k=1, max_distance=None):
+        r"""
+        Return a list of `(item, distance)` tuples of the `k` points nearest to
+        a point, nearest first.
+
+        :param latitude:
+            The latitude of the point, in degrees.
+
+        :param longitude:
+            The longitude of the point, in degrees.
+
+        :param k: [optional]
+            The number of points to return.
+
+        :param max_distance: [optional]
+            The maximum distance of the points, in metres.
+        """
+        if not self.items or k < 1:
+            return []
+        np = require("numpy", "geo", "spatial indexes")
+        _, latitudes, longitudes, _ = self._build()
+
+        # Search ever larger circles until they contain k points, or every point.
+        radius = EARTH_RADIUS * math.radians(self.cell_size)
+        limit = math.pi * EARTH_RADIUS if max_distance is None \
+                else max_distance
+        while True:
+            radius = min(radius, limit)
+            positions = self._candidates(*self._box(latitude, longitude, radius))
+            distances = haversine(latitude, longitude, latitudes[positions],
+                                  longitudes[positions])
+            within = distances <= radius
+            if within.sum() >= k or radius >= limit:
+                break
+            radius *= 2
+
+        positions, distances = (positions[within], distances[within])
+        nearest = np.argsort(distances, kind="stable")[:k]
+        return self._result(positions[nearest], distances[nearest])
+
+
+    def nearest_many(self, latitudes, longitudes, k=1, max_distance=None):
+        r"""
+        Return a list of the `k` nearest points to each of many points (see
+        :meth:`nearest`).
+
+        :param latitudes:
+            The latitudes of the points, in degrees.
+
+        :param longitudes:
+            The longitudes of the points, in degrees.
+        """
+        self._build()
+        return [self.nearest(latitude, longitude, k, max_distance)
+                for latitude, longitude in zip(latitudes, longitudes)]
+
+
+    def radius_many(self, latitudes, longitudes, radius):
+        r"""
+        Return a list of the points within a distance of each of many points
+        (see :meth:`radius`).
+
+        :param latitudes:
+            The latitudes of the points, in degrees.
+
+        :param longitudes:
+            The longitudes of the points, in degrees.
+
+        :param radius:
+            The distance, in metres.
+        """
+        self._build()
+        return [self.radius(latitude, longitude, radius)
+                for latitude, longitude in zip(latitudes, longitudes)]
+
+
+
+class SchoolCache(object):
+
+    r"""
+    A cache of the schools whose catchment areas include a coordinate, where
+    coordinates are snapped to the centre of a cell of a grid so that nearby
+    coordinates share one API call.
+
+    The schools that are fetched are also added to a :class:`GridIndex` (the
+    `index` attribute), so that they can be queried by distance.
+
+    Schools are fetched with `locations_schools`, which needs credentials with
+    the `api_locations_read` scope (e.g., `scopes: [api_locations_read]` in the
+    credentials file).
+
+    :param client:
+        A :class:`domain.client.DomainClient`.
+
+    :param cell_size: [optional]
+        The size of each cell, in degrees. The default (0.001 degrees) is about
+        one hundred metres. Larger cells save more API calls, but points near
+        the edge of a catchment area are more likely to be given the schools
+        of their neighbours.
+
+    :param maxsize: [optional]
+        The maximum number of cells to hold.
+    """
+
+    def __init__(self, client, cell_size=0.001, maxsize=100000):
+        self.client = client
+        self.cell_size = cell_size
+        self.maxsize = maxsize
+        self.index = GridIndex()
+        self.hits = 0
+        self.misses = 0
+        self._cells = OrderedDict()
+        self._indexed = set()
+        self._lock = threading.Lock()
+        return None
+
+
+    def __len__(self):
+        return len(self._cells)
+
+
+    def cell(self, latitude, longitude):
+        r"""
+        Return the cell of a coordinate, as the coordinate of its centre.
+
+        :param latitude:
+            The latitude, in degrees.
+
+        :param longitude:
+            The longitude, in degrees.
+        """
+        size = self.cell_size
+        return (round((math.floor(latitude / size) + 0.5) * size, 7),
+                round((math.floor(longitude / size) + 0.5) * size, 7))
+
+
+    def _get(self, cell):
+        with self._lock:
+            try:
+                schools = self._cells[cell]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._cells.move_to_end(cell)
+            self.hits += 1
+            return schools
+
+
+    def _set(self, cell, schools):
+        schools = list(schools or [])
+        with self._lock:
+            self._cells[cell] = schools
+            while len(self._cells) > self.maxsize:
+                self._cells.popitem(last=False)
+
+            for school in schools:
+                identifier = school.get("id", None) if hasattr(school, "get") else None
+                if identifier is None or identifier not in self._indexed:
+                    self._indexed.add(identifier)
+                    point = coordinates(school)
+                    if point is not None:
+                        self.index.add(*point, school)
+        return schools
+
+
+    @staticmethod
+    def _coordinate(cell):
+        return f"{cell[0]},{cell[1]}"
+
+
+    def schools(self, latitude, longitude, **kwargs):
+        r"""
+        Return the schools whose catchment areas include a coordinate (see
+        :meth:`domain.client.DomainClient.locations_schools`).
+
+        :param latitude:
+            The latitude, in degrees.
+
+        :param longitude:
+            The longitude, in degrees.
+        """
+        cell = self.cell(latitude, longitude)
+        schools = self._get(cell)
+        if schools is None:
+            schools = self._set(cell, self.client.locations_schools(
+                coordinate=self._coordinate(cell), **kwargs))
+        return schools
+
+
+    def schools_many(self, latitudes, longitudes, **kwargs):
+        r"""
+        Return a list of the schools for each of many coordinates, fetching the
+        schools of each distinct cell once (and concurrently).
+
+        :param latitudes:
+            The latitudes, in degrees.
+
+        :param longitudes:
+            The longitudes, in degrees.
+        """
+        cells = [self.cell(*point) for point in zip(latitudes, longitudes)]
+        found, missing = (dict(), [])
+        for cell in OrderedDict.fromkeys(cells):
+            found[cell] = self._get(cell)
+            if found[cell] is None:
+                missing.append(cell)
+
+        results = self.client.map_endpoint(
+            "locations_schools",
+            [dict(coordinate=self._coordinate(cell)) for cell in missing],
+            **kwargs)
+        for cell, schools in zip(missing, results):
+            if isinstance(schools, Exception):
+                raise schools
+            found[cell] = self._set(cell, schools)
+
+        return [found[cell] for cell in cells]
@@ -0,0 +1,567 @@
+
+""" Event hooks, metrics, and spans to see where the time of API calls goes. """
+
+import logging
+import re
+import socket
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import nullcontext
+from contextvars import ContextVar
+from functools import lru_cache
+from time import (perf_counter, time)
+
+__all__ = ["events", "default_buckets", "end_point_label", "Histogram", "Span",
+           "Instruments", "StatsDExporter"]
+
+# The events that hooks can be added for, and the keyword arguments each hook
+# is called with:
+#   before_request:  end_point, params
+#   after_response:  end_point, status, seconds, bytes
+#   throttled:       end_point, seconds
+#   token_refreshed: client_id, seconds, expires_in
+#   retry:           host, attempt, status, delay
+events = ("before_request", "after_response", "throttled", "token_refreshed",
+          "retry")
+
+_latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+default_buckets = dict(
+    latency_seconds=_latency_buckets,
+    decode_seconds=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                    0.025, 0.05, 0.1),
+    throttle_seconds=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    response_bytes=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+    token_seconds=_latency_buckets,
+)
+
+_descriptions = dict(
+    latency_seconds="Time to send a request and receive the response, including retries.",
+    decode_seconds="Time to decode a response body.",
+    throttle_seconds="Time spent waiting for the rate limiter.",
+    response_bytes="Size of response bodies.",
+    token_seconds="Time to create (or fetch from a token store) a new token.",
+    responses_total="Responses received, by status code.",
+    cache_total="Cache look ups, by result.",
+    throttled_total="Requests that waited for the rate limiter.",
+    retries_total="Requests that were retried, by the status that caused it.",
+)
+
+_current_span = ContextVar("domain_span", default=None)
+_no_span = nullcontext()
+
+
+@lru_cache(maxsize=1024)
+def end_point_label(end_point):
+    r"""
+    Return the label that metrics of an end point are grouped by, where the
+    identifiers in the path are replaced by `{id}` (e.g., `agencies/{id}/listings`).
+
+    :param end_point:
+        The relative URL of the API end point.
+    """
+    return "/".join("{id}" if any(c.isdigit() for c in segment) else segment
+                    for segment in end_point.split("/"))
+
+
+
+class Histogram(object):
+
+    r"""
+    A histogram of observations in fixed buckets, with their count and sum.
+
+    :param buckets:
+        The (sorted) upper bounds of the buckets. Observations larger than the
+        last bound are counted in an overflow bucket.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        return None
+
+
+    def observe(self, value):
+        r""" Add an observation to the histogram. """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+
+    def quantile(self, q):
+        r"""
+        Estimate a quantile of the observations, by interpolating within the
+        bucket that contains it.
+
+        :param q:
+            The quantile, between 0 and 1.
+        """
+        if not self.count:
+            return None
+
+        rank, cumulative = (q * self.count, 0)
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+    def cumulative(self):
+        r"""
+        Return a list of `(upper bound, cumulative count)` tuples, ending with
+        an infinite upper bound.
+        """
+        bounds = self.buckets + (float("inf"), )
+        totals, total = ([], 0)
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            totals.append((bound, total))
+        return totals
+
+
+    def summary(self):
+        r""" Return a dictionary of the count, sum, mean, and percentiles. """
+        return dict(count=self.count, sum=self.sum, mean=self.mean,
+                    p50=self.quantile(0.5), p95=self.quantile(0.95),
+                    p99=self.quantile(0.99))
+
+
+
+class Span(object):
+
+    r"""
+    A timed span for one API call, in the style of an OpenTelemetry span.
+
+    Spans are created by :meth:`Instruments.span`. If the tracer is an
+    OpenTelemetry tracer, the span is also recorded with it; otherwise the
+    tracer is called with the finished span.
+
+    :param name:
+        The name of the span.
+
+    :param tracer:
+        An OpenTelemetry tracer, or a function to call with finished spans.
+
+    :param attributes: [optional]
+        A dictionary of attributes of the span.
+    """
+
+    def __init__(self, name, tracer, attributes=None):
+        self.name = name
+        self.tracer = tracer
+        self.attributes = dict(attributes or dict())
+        self.start = None
+        self._started = None
+        self.duration = None
+        self.error = None
+        self._span = None
+        self._context = None
+        self._token = None
+        return None
+
+
+    def __repr__(self):
+        return f"<Span {self.name} {self.attributes}>"
+
+
+    def set_attribute(self, key, value):
+        r""" Set an attribute of the span. """
+        self.attributes[key] = value
+        if self._span is not None:
+            self._span.set_attribute(key, value)
+
+
+    def __enter__(self):
+        self.start = time()
+        self._started = perf_counter()
+        if hasattr(self.tracer, "start_as_current_span"):
+            self._context = self.tracer.start_as_current_span(
+                self.name, attributes=dict(self.attributes))
+            self._span = self._context.__enter__()
+        self._token = _current_span.set(self)
+        return self
+
+
+    def __exit__(self, *exc_info):
+        _current_span.reset(self._token)
+        self.duration = perf_counter() - self._started
+        if exc_info[1] is not None:
+            self.error = exc_info[1]
+            self.attributes["error"] = True
+
+        if self._context is not None:
+            self._context.__exit__(*exc_info)
+        elif callable(self.tracer):
+            try:
+                self.tracer(self)
+            except Exception:
+                logging.exception(f"Failed to export span {self.name}")
+        return False
+
+
+
+class Instruments(object):
+
+    r"""
+    Event hooks, histograms, and counters for the API calls of a client.
+
+    Hooks are added with :meth:`on`. Histograms are kept for each end point
+    (see :func:`end_point_label`) of the request latency, decoding time, rate
+    limiter waits, and response sizes, along with counters of status codes,
+    cache hits, and retries. They can be exported with :meth:`prometheus`, or
+    sent as they happen with a :class:`StatsDExporter`.
+
+    :param buckets: [optional]
+        A dictionary of metric names and histogram buckets, which take
+        precedence over :data:`default_buckets`.
+
+    :param tracer: [optional]
+        Record a span for every API call: either an OpenTelemetry tracer
+        (e.g., `opentelemetry.trace.get_tracer("domain")`) or a function that
+        is called with each finished :class:`Span`.
+    """
+
+    def __init__(self, buckets=None, tracer=None):
+        self.buckets = {**default_buckets, **(buckets or dict())}
+        self.tracer = tracer
+        self._hooks = dict((event, []) for event in events)
+        self._histograms = dict()
+        self._counters = Counter()
+        self._lock = threading.Lock()
+        return None
+
+
+    def on(self, event, function=None):
+        r"""
+        Add a hook that is called with keyword arguments whenever an event
+        happens (see :data:`events`). Hooks should accept any other keyword
+        arguments, so that fields can be added to events.
+
+        This can also be used as a decorator:
+
+            @instruments.on("retry")
+            def log_retry(host, attempt, status, **kwargs):
+                ...
+
+        :param event:
+            The name of the event.
+
+        :param function: [optional]
+            The hook.
+        """
+        if event not in self._hooks:
+            raise ValueError(f"unknown event '{event}' - must be one of: "
+                             f"{', '.join(events)}")
+        if function is None:
+            return lambda function: self.on(event, function)
+        with self._lock:
+            self._hooks[event] = self._hooks[event] + [function]
+        return function
+
+
+    def off(self, event, function):
+        r""" Remove a hook that was added with :meth:`on`. """
+        with self._lock:
+            self._hooks[event] = [f for f in self._hooks[event] if f is not function]
+
+
+    def emit(self, event, **fields):
+        r"""
+        Call the hooks of an event. Exceptions raised by hooks are logged, and
+        do not interrupt the request.
+
+        :param event:
+            The name of the event.
+        """
+        for function in self._hooks[event]:
+            try:
+                function(**fields)
+            except Exception:
+                logging.exception(f"Hook {function} failed for event {event}")
+
+
+    def span(self, end_point, **attributes):
+        r"""
+        Return a context manager that records a span for an API call, if a
+        tracer is set.
+
+        :param end_point:
+            The relative URL of the API end point.
+        """
+        if self.tracer is None:
+            return _no_span
+        label = end_point_label(end_point)
+        return Span(f"domain {label}", self.tracer,
+                    {"domain.end_point": end_point, "domain.route": label,
+                     **attributes})
+
+
+    def annotate(self, **attributes):
+        r""" Set attributes on the span of the current API call, if any. """
+        span = _current_span.get()
+        if span is not None:
+            for key, value in attributes.items():
+                span.set_attribute(key, value)
+
+
+    def observe(self, metric, value, **labels):
+        r"""
+        Add an observation to a histogram.
+
+        :param metric:
+            The name of the metric (e.g., `latency_seconds`).
+
+        :param value:
+            The value to observe.
+        """
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            try:
+                histogram = self._histograms[key]
+            except KeyError:
+                histogram = self._histograms[key] = Histogram(self.buckets[metric])
+            histogram.observe(value)
+
+
+    def increment(self, metric, value=1, **labels):
+        r"""
+        Increment a counter.
+
+        :param metric:
+            The name of the metric (e.g., `responses_total`).
+        """
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+
+    def histogram(self, metric, **labels):
+        r"""
+        Return the histogram of a metric with the given labels, or `None`.
+
+        :param metric:
+            The name of the metric (e.g., `latency_seconds`).
+        """
+        return self._histograms.get((metric, tuple(sorted(labels.items()))), None)
+
+
+    def counter(self, metric, **labels):
+        r""" Return the value of a counter with the given labels. """
+        return self._counters.get((metric, tuple(sorted(labels.items()))), 0)
+
+
+    def reset(self):
+        r""" Discard all histograms and counters (but not hooks). """
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+    def snapshot(self):
+        r"""
+        Return a dictionary of every metric, keyed by metric name and then by
+        labels, with a summary of each histogram and the value of each counter.
+        """
+        metrics = dict()
+        with self._lock:
+            for (metric, labels), histogram in self._histograms.items():
+                metrics.setdefault(metric, dict())[labels] = histogram.summary()
+            for (metric, labels), value in self._counters.items():
+                metrics.setdefault(metric, dict())[labels] = value
+        return metrics
+
+
+    def prometheus(self, namespace="domain"):
+        r"""
+        Return the metrics in the Prometheus text exposition format.
+
+        :param namespace: [optional]
+            The prefix of every metric name.
+        """
+        with self._lock:
+            histograms = sorted((k, (h.cumulative(), h.sum, h.count))
+                                for k, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        lines, described = ([], set())
+
+        def describe(metric, kind):
+            if metric not in described:
+                described.add(metric)
+                lines.append(f"# HELP {namespace}_{metric} "
+                             f"{_descriptions.get(metric, metric)}")
+                lines.append(f"# TYPE {namespace}_{metric} {kind}")
+
+        for (metric, labels), (cumulative, total, count) in histograms:
+            describe(metric, "histogram")
+            name = f"{namespace}_{metric}"
+            for bound, value in cumulative:
+                le = "+Inf" if bound == float("inf") else f"{bound}"
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le), ))} {value}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for (metric, labels), value in counters:
+            describe(metric, "counter")
+            lines.append(f"{namespace}_{metric}{_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+    # The methods below are called by the client as requests are made.
+
+    def request(self, end_point, params=None):
+        self.emit("before_request", end_point=end_point, params=params)
+
+
+    def response(self, end_point, status, seconds, size=None):
+        label = end_point_label(end_point)
+        self.observe("latency_seconds", seconds, end_point=label)
+        if size is not None:
+            self.observe("response_bytes", size, end_point=label)
+        self.increment("responses_total", end_point=label, status=f"{status}")
+        self.annotate(**{"http.status_code": status, "domain.bytes": size})
+        self.emit("after_response", end_point=end_point, status=status,
+                  seconds=seconds, bytes=size)
+
+
+    def throttled(self, end_point, seconds):
+        label = end_point_label(end_point)
+        self.observe("throttle_seconds", seconds, end_point=label)
+        if seconds > 0:
+            self.increment("throttled_total", end_point=label)
+            self.annotate(**{"domain.throttle_seconds": seconds})
+            self.emit("throttled", end_point=end_point, seconds=seconds)
+
+
+    def decoded(self, end_point, seconds):
+        self.observe("decode_seconds", seconds, end_point=end_point_label(end_point))
+
+
+    def cached(self, end_point, hit):
+        self.increment("cache_total", end_point=end_point_label(end_point),
+                       result="hit" if hit else "miss")
+        self.annotate(**{"domain.cache_hit": hit})
+
+
+    def retried(self, host, attempt, response, delay):
+        status = None if response is None else response.status_code
+        self.increment("retries_total", host=host, status=f"{status or 'error'}")
+        self.emit("retry", host=host, attempt=attempt, status=status, delay=delay)
+
+
+    def token_refreshed(self, client_id, seconds, expires_in):
+        self.observe("token_seconds", seconds, client_id=client_id)
+        self.emit("token_refreshed", client_id=client_id, seconds=seconds,
+                  expires_in=expires_in)
+
+
+
+def _escape(value):
+    return f"{value}".replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f"{k}=\"{_escape(v)}\"" for k, v in labels) + "}"
+
+
+
+class StatsDExporter(object):
+
+    r"""
+    Send the metrics of API calls to a StatsD server (over UDP) as they happen.
+
+    Latencies and waits are sent as timers (in milliseconds), and status codes,
+    response sizes, and retries as counters, named by the end point (e.g.,
+    `domain.agencies.id.listings.latency`).
+
+    :param host: [optional]
+        The host of the StatsD server.
+
+    :param port: [optional]
+        The port of the StatsD server.
+
+    :param prefix: [optional]
+        The prefix of every metric name.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8125, prefix="domain"):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._hooks = dict(after_response=self._after_response,
+                           throttled=self._throttled,
+                           token_refreshed=self._token_refreshed,
+                           retry=self._retry)
+        return None
+
+
+    def attach(self, instruments):
+        r"""
+        Send the metrics of the given :class:`Instruments` (e.g., the
+        `instruments` of a client), and return this exporter.
+        """
+        for event, hook in self._hooks.items():
+            instruments.on(event, hook)
+        return self
+
+
+    def detach(self, instruments):
+        r""" Stop sending the metrics of the given :class:`Instruments`. """
+        for event, hook in self._hooks.items():
+            instruments.off(event, hook)
+
+
+    def close(self):
+        self._socket.close()
+
+
+    def _name(self, *parts):
+        name = ".".join((self.prefix, ) + parts)
+        return re.sub(r"[^A-Za-z0-9_.\-]", "", name.replace("/", "."))
+
+
+    def send(self, *lines):
+        r""" Send lines in the StatsD format (e.g., `name:1|c`). """
+        try:
+            self._socket.sendto("\n".join(lines).encode("utf-8"), self.address)
+        except OSError:
+            # Metrics are best effort, and never interrupt requests.
+            pass
+
+
+    def _after_response(self, end_point, status, seconds, bytes=None, **kwargs):
+        name = self._name(end_point_label(end_point).replace("{id}", "id"))
+        lines = [f"{name}.latency:{1000 * seconds:.3f}|ms",
+                 f"{name}.status.{status}:1|c"]
+        if bytes is not None:
+            lines.append(f"{name}.bytes:{bytes}|c")
+        self.send(*lines)
+
+
+    def _throttled(self, end_point, seconds, **kwargs):
+        name = self._name(end_point_label(end_point).replace("{id}", "id"))
+        self.send(f"{name}.throttle:{1000 * seconds:.3f}|ms")
+
+
+    def _token_refreshed(self, client_id, seconds, **kwargs):
+        self.send(f"{self._name('token')}:{1000 * seconds:.3f}|ms")
+
+
+    def _retry(self, host, status, **kwargs):
+        self.send(f"{self._name('retry', str(status or 'error'))}:1|c")
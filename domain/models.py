@@ -0,0 +1,625 @@
+
+""" Lightweight models of responses from the Domain API. """
+
+import re
+import sys
+from collections import OrderedDict
+from datetime import datetime
+from fnmatch import fnmatchcase
+
+__all__ = ["Field", "Model", "Address", "GeoLocation", "PriceDetails", "Media",
+           "AdvertiserIdentifiers", "Listing", "Coordinate", "Photo",
+           "Property", "Agent", "Agency", "SalesResult", "AddressComponents",
+           "Suggestion", "end_point_models", "model_for", "wrap"]
+
+
+def parse_datetime(value):
+    r"""
+    Return a date and time from the Domain API (e.g., `2019-05-20T04:28:43.51Z`)
+    as a :class:`datetime.datetime`, or the value unchanged if it is not one.
+
+    :param value:
+        The date and time string.
+    """
+    if not isinstance(value, str):
+        return value
+
+    # Domain gives between zero and seven decimal places for seconds, but
+    # `fromisoformat` only accepts three or six.
+    match = re.match(r"^(.+T\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:?\d\d)?$",
+                     value)
+    if match is None:
+        return value
+
+    timestamp, fraction, zone = match.groups()
+    if fraction:
+        timestamp += "." + f"{fraction:0<6}"[:6]
+    if zone:
+        timestamp += "+00:00" if zone == "Z" else zone
+    try:
+        return datetime.fromisoformat(timestamp)
+    except ValueError:
+        return value
+
+
+
+class _Parsed(object):
+
+    r""" A parsed value of a field, held in its slot with the raw value. """
+
+    __slots__ = ("raw", "value")
+
+    def __init__(self, raw, value):
+        self.raw = raw
+        self.value = value
+        return None
+
+
+
+class Field(object):
+
+    r"""
+    A field of a response model, which is held in a slot of the model.
+
+    The value is kept as it is in the response until it is first accessed,
+    when it is built (or parsed) and the result is kept in the slot.
+
+    :param key:
+        The key of the field in the response.
+
+    :param kind: [optional]
+        A model class to build the value with, or a function to parse the
+        value with. If `None` is given, the value is returned as is.
+
+    :param many: [optional]
+        The value is a list, and each item is built with `kind`.
+
+    :param intern: [optional]
+        The value is one of few strings (e.g., a status or a suburb), so it is
+        interned to share one copy between models.
+    """
+
+    __slots__ = ("key", "kind", "many", "intern", "name", "slot", "parse")
+
+    def __init__(self, key, kind=None, many=False, intern=False):
+        self.key = key
+        self.kind = kind
+        self.many = many
+        self.intern = intern
+        self.name = key
+        self.slot = None
+        self.parse = None if isinstance(kind, _ModelType) else kind
+        return None
+
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        try:
+            value = self.slot.__get__(instance, owner)
+        except AttributeError:
+            # The key was not in the response.
+            return None
+
+        if self.kind is None or value is None:
+            return value
+        if type(value) is _Parsed:
+            return value.value
+
+        if self.parse is not None:
+            parsed = self.parse(value)
+            if parsed is not value:
+                # Parsed values are kept with the raw value, so that the
+                # response can be given as it was (see `Model.to_dict`).
+                self.slot.__set__(instance, _Parsed(value, parsed))
+            return parsed
+
+        built = self.build(value)
+        if built is not value:
+            self.slot.__set__(instance, built)
+        return built
+
+
+    def build(self, value):
+        r"""
+        Return a value from the response built with the model of this field.
+        Values that are already built are returned as they are.
+
+        :param value:
+            The value in the response.
+        """
+        kind = self.kind
+        if self.many:
+            # Lists are built all at once, so only the first item is checked.
+            if isinstance(value, list) and value and isinstance(value[0], dict):
+                return [kind(item) if isinstance(item, dict) else item
+                        for item in value]
+            return value
+        return kind(value) if isinstance(value, dict) else value
+
+
+    def set(self, instance, value):
+        r"""
+        Set the value of this field from the response.
+
+        :param instance:
+            The model instance.
+
+        :param value:
+            The value in the response.
+        """
+        if self.intern and isinstance(value, str):
+            value = sys.intern(value)
+        self.slot.__set__(instance, value)
+
+
+    def raw(self, instance):
+        r"""
+        Return the value of this field as it was in the response (or as built
+        models), or raise an `AttributeError` if it was not in the response.
+
+        :param instance:
+            The model instance.
+        """
+        value = self.slot.__get__(instance)
+        return value.raw if type(value) is _Parsed else value
+
+
+
+class _ModelType(type):
+
+    r"""
+    The type of response models, which gives each model a slot for every one
+    of its fields, so that models do not keep the response dictionary.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        fields = [(key, value) for key, value in namespace.items()
+                  if isinstance(value, Field)]
+        namespace["__slots__"] = tuple(namespace.get("__slots__", ())) \
+                               + tuple(f"_{key}" for key, _ in fields)
+        cls = super(_ModelType, mcs).__new__(mcs, name, bases, namespace)
+
+        # The fields of the model, keyed by their keys in the response.
+        cls._fields = OrderedDict()
+        for base in reversed(cls.__mro__[1:]):
+            cls._fields.update(getattr(base, "_fields", None) or dict())
+        for key, field in fields:
+            field.slot = cls.__dict__[f"_{key}"]
+            cls._fields[field.key] = field
+
+        # Values that are not interned are set directly in their slots.
+        cls._setters = dict(
+            (key, field.set if field.intern else field.slot.__set__)
+            for key, field in cls._fields.items())
+        return cls
+
+
+
+class Model(object, metaclass=_ModelType):
+
+    r"""
+    A read-only view of a response from the Domain API.
+
+    Fields are available as (snake case) attributes. Each field is held in a
+    slot, and nested models are built (and dates parsed) when they are first
+    accessed. Keys of the response that are not fields are kept in a
+    (small) dictionary. Any key of the response is available as an attribute
+    (e.g., `listing.virtual_tour_url` for `virtualTourUrl`), or by item (e.g.,
+    `listing["virtualTourUrl"]`), so models can be used wherever the response
+    dictionaries were used.
+
+    :param data:
+        The response dictionary.
+    """
+
+    __slots__ = ("_extra", )
+
+    def __init__(self, data):
+        setters = self._setters
+        extra = None
+        for key, value in data.items():
+            setter = setters.get(key, None)
+            if setter is not None:
+                setter(self, value)
+            elif extra is None:
+                extra = {key: value}
+            else:
+                extra[key] = value
+        self._extra = extra
+        return None
+
+
+    def __getattr__(self, name):
+        # Only called for names that are not fields or other attributes.
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        key = re.sub(r"_([a-z0-9])", lambda match: match.group(1).upper(), name)
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'") from None
+
+
+    def __getitem__(self, key):
+        field = self._fields.get(key, None)
+        if field is None:
+            if self._extra is None:
+                raise KeyError(key)
+            return self._extra[key]
+
+        try:
+            value = field.raw(self)
+        except AttributeError:
+            raise KeyError(key) from None
+        if field.parse is None and field.kind is not None:
+            # Nested models are given as models.
+            return field.__get__(self)
+        return value
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for key, field in self._fields.items():
+            try:
+                field.slot.__get__(self)
+            except AttributeError:
+                continue
+            yield key
+        yield from self._extra or ()
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, data):
+        self.__init__(data)
+
+    def __repr__(self):
+        identifier = self.get("id", None)
+        if identifier is None:
+            return f"<{type(self).__name__}>"
+        return f"<{type(self).__name__} {identifier}>"
+
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+    def keys(self):
+        return list(self)
+
+
+    def to_dict(self):
+        r""" Return the response as a dictionary. """
+        data = dict()
+        for key, field in self._fields.items():
+            try:
+                value = field.raw(self)
+            except AttributeError:
+                continue
+            if isinstance(value, Model):
+                value = value.to_dict()
+            elif isinstance(value, list):
+                value = [item.to_dict() if isinstance(item, Model) else item
+                         for item in value]
+            data[key] = value
+        data.update(self._extra or ())
+        return data
+
+
+
+class Address(Model):
+
+    __slots__ = ()
+
+    display_address = Field("displayAddress")
+    unit_number = Field("unitNumber")
+    street_number = Field("streetNumber")
+    street = Field("street")
+    suburb = Field("suburb", intern=True)
+    suburb_id = Field("suburbId")
+    postcode = Field("postcode", intern=True)
+    state = Field("stateAbbreviation", intern=True)
+
+
+
+class GeoLocation(Model):
+
+    __slots__ = ()
+
+    latitude = Field("latitude")
+    longitude = Field("longitude")
+
+
+
+class PriceDetails(Model):
+
+    __slots__ = ()
+
+    price = Field("price")
+    price_from = Field("priceFrom")
+    price_to = Field("priceTo")
+    display_price = Field("displayPrice")
+    can_display_price = Field("canDisplayPrice")
+
+
+
+class Media(Model):
+
+    __slots__ = ()
+
+    category = Field("category", intern=True)
+    type = Field("type", intern=True)
+    url = Field("url")
+
+
+
+class AdvertiserIdentifiers(Model):
+
+    __slots__ = ()
+
+    advertiser_type = Field("advertiserType")
+    advertiser_id = Field("advertiserId")
+    contact_ids = Field("contactIds")
+
+
+
+class Listing(Model):
+
+    r""" A listing (e.g., from `listings` or `agencies_listings`). """
+
+    __slots__ = ()
+
+    id = Field("id")
+    objective = Field("objective", intern=True)
+    sale_mode = Field("saleMode", intern=True)
+    channel = Field("channel", intern=True)
+    status = Field("status", intern=True)
+    address = Field("addressParts", Address)
+    advertiser = Field("advertiserIdentifiers", AdvertiserIdentifiers)
+    bathrooms = Field("bathrooms")
+    bedrooms = Field("bedrooms")
+    carspaces = Field("carspaces")
+    date_available = Field("dateAvailable", parse_datetime)
+    date_listed = Field("dateListed", parse_datetime)
+    date_updated = Field("dateUpdated", parse_datetime)
+    description = Field("description")
+    features = Field("features")
+    geo_location = Field("geoLocation", GeoLocation)
+    headline = Field("headline")
+    is_new_development = Field("isNewDevelopment")
+    land_area_sqm = Field("landAreaSqm")
+    media = Field("media", Media, many=True)
+    price_details = Field("priceDetails", PriceDetails)
+    property_id = Field("propertyId")
+    property_types = Field("propertyTypes")
+    seo_url = Field("seoUrl")
+
+
+
+class Coordinate(Model):
+
+    __slots__ = ()
+
+    lat = Field("lat")
+    lon = Field("lon")
+
+
+
+class Photo(Model):
+
+    __slots__ = ()
+
+    advert_type = Field("advertType", intern=True)
+    date = Field("date", parse_datetime)
+    full_url = Field("fullUrl")
+    rank = Field("rank")
+
+
+
+class Property(Model):
+
+    r""" A property (e.g., from `properties`). """
+
+    __slots__ = ()
+
+    id = Field("id")
+    address = Field("address")
+    address_coordinate = Field("addressCoordinate", Coordinate)
+    address_id = Field("addressId")
+    area_size = Field("areaSize")
+    bathrooms = Field("bathrooms")
+    bedrooms = Field("bedrooms")
+    car_spaces = Field("carSpaces")
+    created = Field("created", parse_datetime)
+    updated = Field("updated", parse_datetime)
+    features = Field("features")
+    flat_number = Field("flatNumber")
+    history = Field("history")
+    is_residential = Field("isResidential")
+    lot_number = Field("lotNumber")
+    photos = Field("photos", Photo, many=True)
+    plan_number = Field("planNumber")
+    postcode = Field("postcode", intern=True)
+    property_category = Field("propertyCategory", intern=True)
+    property_type = Field("propertyType", intern=True)
+    state = Field("state", intern=True)
+    street_address = Field("streetAddress")
+    street_name = Field("streetName")
+    street_number = Field("streetNumber")
+    street_type = Field("streetType", intern=True)
+    suburb = Field("suburb", intern=True)
+    suburb_id = Field("suburbId")
+    url_slug = Field("urlSlug")
+    zone = Field("zone")
+
+
+
+class Agent(Model):
+
+    r""" An agent (e.g., from `agents` or `agents_search`). """
+
+    __slots__ = ()
+
+    id = Field("agentId")
+    agency_id = Field("agencyId")
+    first_name = Field("firstName")
+    last_name = Field("lastName")
+    email = Field("email")
+    mobile = Field("mobile")
+    phone = Field("phone")
+    photo = Field("photo")
+    profile_text = Field("profileText")
+
+    def __repr__(self):
+        return f"<Agent {self.id}>"
+
+
+
+class Agency(Model):
+
+    r""" An agency (e.g., from `agencies` or `agencies_search`). """
+
+    __slots__ = ()
+
+    id = Field("id")
+    name = Field("name")
+    account_type = Field("accountType")
+    agents = Field("agents", Agent, many=True)
+    contact_details = Field("contactDetails")
+    date_updated = Field("dateUpdated", parse_datetime)
+    details = Field("details")
+    profile = Field("profile")
+
+
+
+class SalesResult(Model):
+
+    r""" A sales result (from `sales_results_listings`). """
+
+    __slots__ = ()
+
+    id = Field("id")
+    agency_name = Field("agencyName")
+    agent_name = Field("agentName")
+    bathrooms = Field("bathrooms")
+    bedrooms = Field("bedrooms")
+    carspaces = Field("carspaces")
+    geo_location = Field("geoLocation", GeoLocation)
+    postcode = Field("postcode", intern=True)
+    price = Field("price")
+    property_type = Field("propertyType", intern=True)
+    result = Field("result", intern=True)
+    street_name = Field("streetName")
+    street_number = Field("streetNumber")
+    street_type = Field("streetType", intern=True)
+    suburb = Field("suburb", intern=True)
+    unit_number = Field("unitNumber")
+
+
+
+class AddressComponents(Model):
+
+    __slots__ = ()
+
+    unit_number = Field("unitNumber")
+    street_number = Field("streetNumber")
+    street_name = Field("streetName")
+    street_type = Field("streetType", intern=True)
+    suburb = Field("suburb", intern=True)
+    postcode = Field("postCode", intern=True)
+    state = Field("state", intern=True)
+
+
+
+class Suggestion(Model):
+
+    r""" A suggested property (from `properties_suggest`). """
+
+    __slots__ = ()
+
+    id = Field("id")
+    address = Field("address")
+    address_components = Field("addressComponents", AddressComponents)
+    relative_score = Field("relativeScore")
+
+
+
+# The model for responses from each end point. The first matching pattern
+# applies, and responses from end points with a model of `None` are not wrapped.
+end_point_models = OrderedDict([
+    ("agencies/*/listings", Listing),
+    ("agencies/*/*", None),
+    ("agencies/*", Agency),
+    ("agencies", Agency),
+    ("agents/search", Agent),
+    ("agents/*/listings", Listing),
+    ("agents/*/*", None),
+    ("agents/*", Agent),
+    ("listings/locations", None),
+    ("listings/statistics", None),
+    ("listings/processingReports*", None),
+    ("listings/*/*", None),
+    ("listings/*", Listing),
+    ("projects/*/listings", Listing),
+    ("properties/_suggest", Suggestion),
+    ("properties/*/*", None),
+    ("properties/*", Property),
+    ("salesResults/*/listings", SalesResult),
+    ("*", None),
+])
+
+
+def model_for(end_point):
+    r"""
+    Return the model for responses from the given end point, or `None`.
+
+    :param end_point:
+        The relative URL of the API end point.
+    """
+    for pattern, model in end_point_models.items():
+        if fnmatchcase(end_point, pattern):
+            return model
+    return None
+
+
+def wrap(end_point, value):
+    r"""
+    Wrap a response (or each item of a list response) from the given end point
+    in its model. Responses from end points without a model are returned as is.
+
+    :param end_point:
+        The relative URL of the API end point.
+
+    :param value:
+        The decoded response.
+    """
+    model = model_for(end_point)
+    if model is None:
+        return value
+    if isinstance(value, dict):
+        return model(value)
+    if isinstance(value, list):
+        return [model(item) if isinstance(item, dict) else item for item in value]
+    return value
@@ -0,0 +1,101 @@
+
+""" Iterate over every item of paginated API end points. """
+
+import asyncio
+from collections import deque
+
+__all__ = ["paginate", "apaginate"]
+
+
+def paginate(executor, method, items_per_page, *args, prefetch=1, **kwargs):
+    r"""
+    Yield every item from a paginated API method, requesting the next pages
+    in the background while the current page is consumed.
+
+    :param executor:
+        A :class:`concurrent.futures.Executor` to request pages with.
+
+    :param method:
+        The API method to call for each page. It is called with the given
+        arguments and a `page_number` keyword argument.
+
+    :param items_per_page:
+        The number of items in a full page. A page with fewer items than this
+        is taken to be the last page.
+
+    :param prefetch: [optional]
+        The number of pages to request ahead of the page being consumed.
+    """
+
+    pending = deque()
+    page_numbers = iter(range(1, 2**31))
+
+    def submit():
+        pending.append(executor.submit(method, *args,
+                                       page_number=next(page_numbers), **kwargs))
+
+    try:
+        for _ in range(1 + max(0, prefetch)):
+            submit()
+
+        while pending:
+            items = pending.popleft().result() or []
+            if len(items) < items_per_page:
+                yield from items
+                break
+
+            submit()
+            yield from items
+
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+
+async def apaginate(method, items_per_page, *args, prefetch=1, **kwargs):
+    r"""
+    Asynchronously yield every item from a paginated API method, requesting
+    the next pages while the current page is consumed.
+
+    :param method:
+        The asynchronous API method to call for each page. It is called with
+        the given arguments and a `page_number` keyword argument.
+
+    :param items_per_page:
+        The number of items in a full page. A page with fewer items than this
+        is taken to be the last page.
+
+    :param prefetch: [optional]
+        The number of pages to request ahead of the page being consumed.
+    """
+
+    pending = deque()
+    page_numbers = iter(range(1, 2**31))
+
+    async def fetch(page_number):
+        # The request is only made once the task starts, so that a page that
+        # is cancelled before then does not leave a request unawaited.
+        return await method(*args, page_number=page_number, **kwargs)
+
+    def submit():
+        pending.append(asyncio.ensure_future(fetch(next(page_numbers))))
+
+    try:
+        for _ in range(1 + max(0, prefetch)):
+            submit()
+
+        while pending:
+            items = await pending.popleft() or []
+            if len(items) < items_per_page:
+                for item in items:
+                    yield item
+                break
+
+            submit()
+            for item in items:
+                yield item
+
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,332 @@
+
+""" Client-side rate limiting for the Domain API. """
+
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager
+from time import (sleep, time)
+
+from .exceptions import QuotaExceededException
+from .utils import (number, retry_after_seconds)
+
+__all__ = ["SlidingWindow", "TokenBucket", "Quota", "RateLimiter"]
+
+
+class SlidingWindow(object):
+
+    r"""
+    Allow at most `limit` calls in any window of `period` seconds.
+
+    :param limit:
+        The maximum number of calls in any one window.
+
+    :param period: [optional]
+        The length of the window in seconds.
+    """
+
+    def __init__(self, limit, period=1.0):
+        self.limit = int(limit)
+        self.period = float(period)
+        self._starts = deque(maxlen=max(self.limit, 1))
+        return None
+
+
+    def earliest(self, now):
+        if len(self._starts) < self.limit:
+            return now
+        return max(now, self._starts[0] + self.period)
+
+
+    def commit(self, start):
+        self._starts.append(start)
+
+
+    def state(self):
+        return list(self._starts)
+
+
+    def load(self, state):
+        self._starts.clear()
+        self._starts.extend(state)
+
+
+
+class TokenBucket(object):
+
+    r"""
+    A token bucket that refills at `rate` tokens per second, up to `capacity`.
+
+    :param rate:
+        The rate at which tokens are added to the bucket, per second.
+
+    :param capacity: [optional]
+        The maximum number of tokens in the bucket (the largest burst). This
+        defaults to `rate`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time()
+        return None
+
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+
+    def earliest(self, now):
+        self._refill(now)
+        if self._tokens >= 1:
+            return now
+        return max(now, self._updated) + (1 - self._tokens) / self.rate
+
+
+    def commit(self, start):
+        # Reservations in the future leave a deficit that is refilled later.
+        self._refill(start)
+        self._tokens -= 1
+
+
+    def state(self):
+        return [self._tokens, self._updated]
+
+
+    def load(self, state):
+        self._tokens, self._updated = state
+
+
+
+class Quota(object):
+
+    r"""
+    A fixed number of calls per period (e.g., a daily quota for a plan).
+
+    :param limit:
+        The number of calls available per period.
+
+    :param period: [optional]
+        The length of the period in seconds. Defaults to one day.
+    """
+
+    def __init__(self, limit, period=86400):
+        self.limit = int(limit)
+        self.period = float(period)
+        self.used = 0
+        self.resets = time() + self.period
+        return None
+
+
+    def _roll(self, now):
+        if now >= self.resets:
+            self.used = 0
+            self.resets = now + self.period
+
+
+    def remaining(self, now=None):
+        self._roll(now or time())
+        return max(0, self.limit - self.used)
+
+
+    def earliest(self, now):
+        if self.remaining(now) > 0:
+            return now
+
+        raise QuotaExceededException(f"quota of {self.limit} calls exhausted "
+                                     f"until {self.resets:.0f}")
+
+
+    def commit(self, start):
+        self.used += 1
+
+
+    def update(self, remaining=None, limit=None, resets=None):
+        r"""
+        Synchronise the quota with information reported by the server.
+        """
+        if limit is not None:
+            self.limit = int(limit)
+        if remaining is not None:
+            self.used = max(0, self.limit - int(remaining))
+        if resets is not None:
+            self.resets = resets
+
+
+    def state(self):
+        return [self.limit, self.used, self.resets]
+
+
+    def load(self, state):
+        self.limit, self.used, self.resets = state
+
+
+
+class RateLimiter(object):
+
+    r"""
+    A thread-safe and asyncio-safe rate limiter that combines any number of
+    limits (e.g., a per-second limit and a daily quota).
+
+    Each call reserves the earliest time at which it satisfies every limit,
+    and then waits until that time. Waiting happens outside of the lock, so
+    callers are served in the order they arrive without blocking each other.
+
+    :param limits:
+        The limits to enforce (e.g., :class:`SlidingWindow`,
+        :class:`TokenBucket`).
+
+    :param quota: [optional]
+        A :class:`Quota` for the total number of calls per period.
+    """
+
+    def __init__(self, *limits, quota=None):
+        self.limits = list(limits)
+        self.quota = quota
+        self._paused_until = 0
+        self._lock = threading.Lock()
+        return None
+
+
+    @classmethod
+    def from_plan(cls, rate_limit=None, daily_quota=None):
+        r"""
+        Create a rate limiter for a package and plan.
+
+        :param rate_limit: [optional]
+            The maximum number of calls per second.
+
+        :param daily_quota: [optional]
+            The maximum number of calls per day.
+        """
+        limits = [SlidingWindow(rate_limit)] if rate_limit else []
+        quota = Quota(daily_quota) if daily_quota else None
+        return cls(*limits, quota=quota)
+
+
+    @contextmanager
+    def _synchronised(self):
+        r"""
+        A context for reading or changing the state of the limits.
+        """
+        with self._lock:
+            yield
+
+
+    def state(self):
+        r""" Return the state of the limiter, as a JSON-serialisable list. """
+        limits = self.limits + ([self.quota] if self.quota else [])
+        return [self._paused_until] + [limit.state() for limit in limits]
+
+
+    def load(self, state):
+        r""" Restore the state of the limiter (see :meth:`state`). """
+        limits = self.limits + ([self.quota] if self.quota else [])
+        self._paused_until = state[0]
+        for limit, limit_state in zip(limits, state[1:]):
+            limit.load(limit_state)
+
+
+    @property
+    def remaining(self):
+        r""" The number of calls remaining in the quota, or `None` if unlimited. """
+        if self.quota is None:
+            return None
+        with self._synchronised():
+            return self.quota.remaining()
+
+
+    @property
+    def exhausted(self):
+        return self.remaining == 0
+
+
+    def reserve(self):
+        r"""
+        Reserve a call and return the number of seconds to wait before making
+        it.
+
+        :raises QuotaExceededException:
+            If the quota has been exhausted.
+        """
+        now = time()
+        with self._synchronised():
+            limits = self.limits + ([self.quota] if self.quota else [])
+
+            # Push the start time back until every limit allows it.
+            start = max(now, self._paused_until)
+            while True:
+                earliest = max([start] + [l.earliest(start) for l in limits])
+                if earliest == start:
+                    break
+                start = earliest
+
+            for limit in limits:
+                limit.commit(start)
+
+        return start - now
+
+
+    def acquire(self):
+        r"""
+        Block until a call can be made, and return the number of seconds waited.
+        """
+        delay = self.reserve()
+        if delay > 0:
+            sleep(delay)
+        return max(delay, 0)
+
+
+    async def aacquire(self):
+        r"""
+        Wait (without blocking the event loop) until a call can be made, and
+        return the number of seconds waited.
+        """
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return max(delay, 0)
+
+
+    def pause(self, seconds):
+        r"""
+        Prevent any calls from starting in the next `seconds` seconds.
+        """
+        with self._synchronised():
+            self._paused_until = max(self._paused_until, time() + seconds)
+
+
+    def update(self, headers):
+        r"""
+        Update the limiter from the rate limit headers of a response.
+
+        `Retry-After` pauses all calls for the given time. The
+        `X-RateLimit-Remaining` and `X-RateLimit-Reset` headers pause calls
+        until the reset time once no calls remain, and the
+        `X-Quota-PerDay-Limit` and `X-Quota-PerDay-Remaining` headers
+        synchronise the quota.
+
+        :param headers:
+            The (case-insensitive) response headers.
+        """
+
+        retry_after = retry_after_seconds(headers.get("Retry-After"))
+        if retry_after is not None:
+            self.pause(retry_after)
+
+        remaining = number(headers.get("X-RateLimit-Remaining"))
+        reset = number(headers.get("X-RateLimit-Reset"))
+        if remaining is not None and remaining <= 0 and reset is not None:
+            # The reset time is either an epoch time or a number of seconds.
+            self.pause(reset - time() if reset > 1e9 else reset)
+
+        if self.quota is not None:
+            remaining = number(headers.get("X-Quota-PerDay-Remaining"))
+            limit = number(headers.get("X-Quota-PerDay-Limit"))
+            if remaining is not None or limit is not None:
+                with self._synchronised():
+                    self.quota.update(remaining, limit)
@@ -0,0 +1,330 @@
+
+""" Retry transient failures of requests to the Domain API. """
+
+import random
+import threading
+from time import (sleep, time)
+
+import requests
+
+from .exceptions import CircuitOpenException
+from .utils import retry_after_seconds
+
+__all__ = ["RetryPolicy", "RetryBudget", "CircuitBreaker", "Retry"]
+
+
+class RetryPolicy(object):
+
+    r"""
+    When, and how long to wait before, a failed request is retried.
+
+    :param total: [optional]
+        The maximum number of retries for any one request.
+
+    :param statuses: [optional]
+        A dictionary of the HTTP status codes that are retried, and the maximum
+        number of retries for each.
+
+    :param connection_errors: [optional]
+        The maximum number of retries after a connection error or time out.
+
+    :param backoff_factor: [optional]
+        The base delay (in seconds). The delay before the `n`-th retry is drawn
+        uniformly between zero and `backoff_factor * 2**n` (full jitter).
+
+    :param max_backoff: [optional]
+        The maximum delay (in seconds) between retries.
+
+    :param jitter: [optional]
+        Randomise the delays (recommended, to spread out retries from many
+        clients). Otherwise the maximum delay is always used.
+
+    :param respect_retry_after: [optional]
+        Wait at least as long as the `Retry-After` header of a response.
+    """
+
+    def __init__(self, total=5, statuses=None, connection_errors=3,
+                 backoff_factor=0.5, max_backoff=60, jitter=True,
+                 respect_retry_after=True):
+        self.total = total
+        self.statuses = dict({429: 8, 500: 2, 502: 5, 503: 5, 504: 5}
+                             if statuses is None else statuses)
+        self.connection_errors = connection_errors
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+        return None
+
+
+    def retries(self, response=None):
+        r"""
+        Return the maximum number of retries for the given response, or for a
+        connection error if no response is given.
+        """
+        if response is None:
+            limit = self.connection_errors
+        else:
+            limit = self.statuses.get(response.status_code, 0)
+        return min(limit, self.total)
+
+
+    def delay(self, attempt, response=None):
+        r"""
+        Return the number of seconds to wait before the given retry.
+
+        :param attempt:
+            The number of the retry (starting from zero).
+
+        :param response: [optional]
+            The failed response, if there was one.
+        """
+        delay = min(self.max_backoff, self.backoff_factor * 2**attempt)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        if self.respect_retry_after and response is not None:
+            retry_after = retry_after_seconds(
+                response.headers.get("Retry-After"))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+        return delay
+
+
+
+class RetryBudget(object):
+
+    r"""
+    Limit retries to a fraction of all requests, so that retries cannot
+    overwhelm a struggling server.
+
+    Every request deposits `ratio` into the budget, and every retry withdraws
+    one. The budget also refills at `min_per_second` so that a few retries are
+    always possible.
+
+    :param ratio: [optional]
+        The number of retries allowed per request.
+
+    :param min_per_second: [optional]
+        The number of retries per second that are always allowed.
+
+    :param capacity: [optional]
+        The maximum number of retries that can be saved up.
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=1.0, capacity=10):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self._balance = float(capacity)
+        self._updated = time()
+        self._lock = threading.Lock()
+        return None
+
+
+    def _refill(self, amount=0):
+        now = time()
+        self._balance = min(self.capacity, self._balance + amount
+                            + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+
+    def deposit(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+
+    def withdraw(self):
+        r""" Withdraw a retry from the budget, and return whether it was allowed. """
+        with self._lock:
+            self._refill()
+            if self._balance >= 1:
+                self._balance -= 1
+                return True
+            return False
+
+
+
+class CircuitBreaker(object):
+
+    r"""
+    Stop sending requests to a host after consecutive failures.
+
+    After `threshold` consecutive failures the circuit opens, and requests fail
+    immediately for `reset_timeout` seconds. Then one trial request is allowed:
+    if it succeeds the circuit closes, otherwise it opens again. Responses
+    that are neither (e.g., rate limiting) do not change the count of
+    failures.
+
+    :param threshold: [optional]
+        The number of consecutive failures that opens the circuit.
+
+    :param reset_timeout: [optional]
+        The number of seconds to wait before allowing a trial request.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened = None
+        self._trial = False
+        self._lock = threading.Lock()
+        return None
+
+
+    @property
+    def state(self):
+        if self._opened is None:
+            return "closed"
+        return "half-open" if self._trial else "open"
+
+
+    def allow(self):
+        r""" Return whether a request may be sent now. """
+        with self._lock:
+            if self._opened is None:
+                return True
+            if not self._trial and time() >= self._opened + self.reset_timeout:
+                self._trial = True
+                return True
+            return False
+
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened = None
+            self._trial = False
+
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self._opened = time()
+                self._trial = False
+
+
+    def neutral(self):
+        with self._lock:
+            # A trial request that was neither is tried again later.
+            if self._trial:
+                self._opened = time()
+                self._trial = False
+
+
+
+class Retry(object):
+
+    r"""
+    Retry transient failures of requests, with a retry budget shared by all
+    requests and a circuit breaker for each host.
+
+    :param policy: [optional]
+        A :class:`RetryPolicy`.
+
+    :param budget: [optional]
+        A :class:`RetryBudget`. If `False` is given, retries are limited only by
+        the policy.
+
+    :param breaker_threshold: [optional]
+        The number of consecutive failures that opens the circuit to a host. If
+        `None` is given, there are no circuit breakers.
+
+    :param breaker_timeout: [optional]
+        The number of seconds before an open circuit allows a trial request.
+    """
+
+    def __init__(self, policy=None, budget=None, breaker_threshold=5,
+                 breaker_timeout=30):
+        self.policy = policy or RetryPolicy()
+        self.budget = RetryBudget() if budget is None else (budget or None)
+        self.breaker_threshold = breaker_threshold
+        self.breaker_timeout = breaker_timeout
+        self.breakers = dict()
+        self._lock = threading.Lock()
+        return None
+
+
+    def breaker(self, host):
+        r""" Return the circuit breaker for the given host. """
+        with self._lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(self.breaker_threshold,
+                                                     self.breaker_timeout)
+            return self.breakers[host]
+
+
+    def call(self, host, send, before_retry=None, on_retry=None):
+        r"""
+        Send a request, retrying transient failures, and return the final
+        response.
+
+        :param host:
+            The host the request is sent to.
+
+        :param send:
+            A function that sends the request and returns the response.
+
+        :param before_retry: [optional]
+            A function to call before each retry (e.g., to wait for the rate
+            limiter).
+
+        :param on_retry: [optional]
+            A function to call with the attempt number, the response (or `None`
+            for a connection error), and the delay before each retry.
+
+        :raises CircuitOpenException:
+            If the circuit to the host is open.
+        """
+        breaker = None if self.breaker_threshold is None else self.breaker(host)
+        if self.budget is not None:
+            self.budget.deposit()
+
+        attempt = 0
+        while True:
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenException(f"too many failed requests to {host}")
+
+            response = None
+            try:
+                response = send()
+
+            except (requests.ConnectionError, requests.Timeout):
+                if breaker is not None:
+                    breaker.failure()
+                if not self._retry(attempt, None):
+                    raise
+
+            else:
+                status = response.status_code
+                if breaker is not None:
+                    # Rate limiting (429) is not a failure of the host, but
+                    # it is not a success either.
+                    if status >= 500:
+                        breaker.failure()
+                    elif status == 429:
+                        breaker.neutral()
+                    else:
+                        breaker.success()
+
+                if not self._retry(attempt, response):
+                    return response
+
+            delay = self.policy.delay(attempt, response)
+            if on_retry is not None:
+                on_retry(attempt, response, delay)
+            if response is not None:
+                # Release the connection to the pool while waiting.
+                response.close()
+            sleep(delay)
+            if before_retry is not None:
+                before_retry()
+            attempt += 1
+
+
+    def _retry(self, attempt, response):
+        return attempt < self.policy.retries(response) \
+           and (self.budget is None or self.budget.withdraw())
@@ -0,0 +1,126 @@
+
+""" Helpers for the SQLite databases that the client keeps. """
+
+import sqlite3
+import threading
+from contextlib import (contextmanager, nullcontext)
+
+__all__ = ["Database", "where_clause"]
+
+
+class Database(object):
+
+    r"""
+    A base class for objects backed by a SQLite database, which gives each
+    thread its own connection (in write-ahead logging mode, so that readers do
+    not block writers) and exclusive transactions.
+
+    :param path:
+        The path of the SQLite database. If `:memory:` is given, the database
+        is held in memory (and shared by all threads).
+
+    :param timeout: [optional]
+        The number of seconds to wait for the database to be unlocked.
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = nullcontext()
+        self._shared = None
+        if path == ":memory:":
+            # An in-memory database is private to its connection, so all
+            # threads share one connection (one at a time).
+            self._lock = threading.RLock()
+            self._shared = sqlite3.connect(path, isolation_level=None,
+                                           check_same_thread=False)
+        return None
+
+
+    @property
+    def _connection(self):
+        if self._shared is not None:
+            return self._shared
+
+        # SQLite connections cannot be shared between threads.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+
+    @contextmanager
+    def _transaction(self):
+        r"""
+        A context for an exclusive (write-locked) transaction.
+        """
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except:
+                connection.execute("ROLLBACK")
+                raise
+            else:
+                connection.execute("COMMIT")
+
+
+    def _rows(self, sql, parameters=()):
+        r""" Return all rows of a query. """
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+
+
+def where_clause(filters, convert=None):
+    r"""
+    Return the WHERE clause (with a leading space, or an empty string if
+    there are no filters) and its parameters for some filters.
+
+    :param filters:
+        A dictionary of column names and the values to filter by. Filters that
+        are `None` are ignored. A two-length tuple gives an (inclusive) range,
+        where either end can be `None`, and a list (or set) gives the values
+        to match any of.
+
+    :param convert: [optional]
+        A function that is called with a column name and a value, and returns
+        the parameter to compare the column with.
+    """
+    convert = convert or (lambda name, value: value)
+    clauses, args = ([], [])
+    for name, value in filters.items():
+        if value is None:
+            continue
+
+        if isinstance(value, tuple):
+            if len(value) != 2:
+                raise ValueError(f"a range of {name} must be a two-length tuple")
+            lower, upper = value
+            if lower is not None:
+                clauses.append(f"{name} >= ?")
+                args.append(convert(name, lower))
+            if upper is not None:
+                clauses.append(f"{name} <= ?")
+                args.append(convert(name, upper))
+
+        elif isinstance(value, (list, set, frozenset)):
+            value = list(value)
+            if not value:
+                clauses.append("0")
+                continue
+            clauses.append(f"{name} IN ({', '.join('?' * len(value))})")
+            args.extend(convert(name, each) for each in value)
+
+        else:
+            clauses.append(f"{name} = ?")
+            args.append(convert(name, value))
+
+    if not clauses:
+        return ("", ())
+    return (" WHERE " + " AND ".join(clauses), tuple(args))
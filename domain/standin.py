@@ -0,0 +1,593 @@
+
+""" A local stand-in for the Domain API, to use the client offline. """
+
+import base64
+import hashlib
+import json
+import random
+import secrets
+import threading
+from collections import (Counter, OrderedDict, deque)
+from datetime import (datetime, timezone)
+from fnmatch import fnmatchcase
+from http.server import (BaseHTTPRequestHandler, ThreadingHTTPServer)
+from math import ceil
+from time import (sleep, time)
+from urllib.parse import (parse_qsl, urlsplit)
+
+from requests.adapters import BaseAdapter
+
+from .transport import (build_response, LocalAdapter)
+
+__all__ = ["StandIn", "StandInAdapter", "StandInServer"]
+
+_suburbs = [
+    ("Kew", 3101, "VIC"), ("Fitzroy", 3065, "VIC"), ("Newtown", 2042, "NSW"),
+    ("Paddington", 2021, "NSW"), ("New Farm", 4005, "QLD"),
+    ("Norwood", 5067, "SA"), ("Braddon", 2612, "ACT"),
+]
+_streets = ["Smith", "High", "Church", "Station", "Victoria", "Park", "King"]
+_property_types = ["House", "ApartmentUnitFlat", "Townhouse", "Villa"]
+
+
+def _listing(i):
+    r = random.Random(i)
+    suburb, postcode, state = r.choice(_suburbs)
+    street = f"{r.randint(1, 300)} {r.choice(_streets)} Street"
+    price = r.randrange(400000, 3000000, 5000)
+    return {
+        "id": i,
+        "objective": "sale",
+        "saleMode": "buy",
+        "channel": "residential",
+        "status": "live",
+        "addressParts": {
+            "displayAddress": f"{street}, {suburb} {state} {postcode}",
+            "suburb": suburb,
+            "suburbId": 10000 + _suburbs.index((suburb, postcode, state)),
+            "postcode": f"{postcode}",
+            "stateAbbreviation": state.lower(),
+        },
+        "bedrooms": r.randint(1, 5),
+        "bathrooms": r.randint(1, 3),
+        "carspaces": r.randint(0, 3),
+        "propertyTypes": [r.choice(_property_types)],
+        "priceDetails": {"displayPrice": f"${price:,}", "price": price},
+        "geoLocation": {"latitude": -37.8 + r.uniform(-0.5, 0.5),
+                        "longitude": 145.0 + r.uniform(-0.5, 0.5)},
+        "dateListed": "2019-05-01T09:00:00",
+        "dateUpdated": "2019-05-20T04:28:43.51Z",
+        "headline": f"Lovely {r.choice(_property_types).lower()} in {suburb}",
+        "media": [{"category": "image", "type": "photo",
+                   "url": f"https://example.com/{i}/{n}.jpg"} for n in range(3)],
+    }
+
+
+def _sales_result(i):
+    r = random.Random(i)
+    suburb, postcode, state = r.choice(_suburbs)
+    return {
+        "id": i,
+        "streetNumber": f"{r.randint(1, 300)}",
+        "streetName": r.choice(_streets),
+        "streetType": "St",
+        "suburb": suburb,
+        "postcode": f"{postcode}",
+        "propertyType": r.choice(_property_types),
+        "bedrooms": r.randint(1, 5),
+        "bathrooms": r.randint(1, 3),
+        "carspaces": r.randint(0, 3),
+        "price": r.randrange(400000, 3000000, 5000),
+        "result": r.choice(["AU", "SA", "PI", "PN", "SB"]),
+        "agencyName": "Stand-In Realty",
+        "agentName": "Alex Agent",
+        "geoLocation": {"latitude": -37.8 + r.uniform(-0.5, 0.5),
+                        "longitude": 145.0 + r.uniform(-0.5, 0.5)},
+    }
+
+
+def _agent(i):
+    return {"agentId": i, "agencyId": i // 10, "firstName": "Alex",
+            "lastName": f"Agent {i}", "email": f"agent{i}@example.com"}
+
+
+def _agency(i):
+    return {"id": i, "name": f"Stand-In Realty {i}",
+            "agents": [_agent(10 * i + n) for n in range(3)]}
+
+
+def _property(i):
+    r = random.Random(i)
+    suburb, postcode, state = r.choice(_suburbs)
+    return {"id": f"{i}", "address": f"{r.randint(1, 300)} "
+            f"{r.choice(_streets)} St, {suburb} {state} {postcode}",
+            "bedrooms": r.randint(1, 5), "bathrooms": r.randint(1, 3),
+            "carSpaces": r.randint(0, 3), "suburb": suburb,
+            "postcode": f"{postcode}", "state": state,
+            "propertyCategory": r.choice(_property_types),
+            "addressCoordinate": {"lat": -37.8, "lon": 145.0}}
+
+
+def _school(i, latitude, longitude):
+    return {"id": i, "name": f"Stand-In {('Primary', 'High')[i % 2]} School {i}",
+            "postcode": "3101", "educationLevel": ("primary", "secondary")[i % 2],
+            "geoLocation": {"latitude": latitude, "longitude": longitude}}
+
+
+def _schools(standin, end_point, params):
+    r"""
+    Return the schools whose (stand-in) catchment areas include a coordinate:
+    a primary and a high school for every 0.01 and 0.05 degree cell.
+    """
+    try:
+        latitude, longitude = map(float, params.get("coordinate", "").split(","))
+    except ValueError:
+        latitude, longitude = (-37.8, 145.0)
+
+    schools = []
+    for level, size in enumerate((0.01, 0.05)):
+        row, column = (int(latitude // size), int(longitude // size))
+        schools.append(_school(2 * abs(row * 100000 + column) + level,
+                               (row + 0.5) * size, (column + 0.5) * size))
+    return schools
+
+
+def _identifier(end_point, index=1):
+    part = end_point.split("/")[index]
+    try:
+        return int(part)
+    except ValueError:
+        return int(hashlib.md5(part.encode()).hexdigest()[:8], 16)
+
+
+def _page(items, params, default_size=20):
+    number = int(params.get("pageNumber", params.get("page_number", 1)) or 1)
+    size = int(params.get("pageSize", params.get("page_size", default_size))
+               or default_size)
+    start = (number - 1) * size
+    return [items(i) for i in range(start, min(start + size, items.total))]
+
+
+class _Items(object):
+
+    def __init__(self, make, total, offset=0):
+        self.make = make
+        self.total = total
+        self.offset = offset
+        return None
+
+
+    def __call__(self, index):
+        return self.make(self.offset + index)
+
+
+
+def _suburb_performance_statistics(standin, end_point, params):
+    # Periods are counted back from the current one (1), in spans of months.
+    span = int(params.get("chronological_span", None) or 3)
+    first = int(params.get("tPlusFrom", None) or 1)
+    last = int(params.get("tPlusTo", None) or first + 7)
+    today = datetime.now(timezone.utc)
+    current = (12 * today.year + today.month - 1) // span
+
+    r = random.Random(f"{params.get('suburb_id', None)} "
+                      f"{params.get('property_category', None)} "
+                      f"{params.get('bedrooms', None)}")
+    median = r.randint(500, 2000) * 1000
+    series = []
+    for t in range(first, last + 1):
+        period = current - t + 1
+        year, month = divmod(period * span + span - 1, 12)
+        series.append({"year": year, "month": month + 1, "values": {
+            "medianSoldPrice": median + 1000 * (period % 1000),
+            "numberSold": 10 * span, "highestSoldPrice": 2 * median,
+            "lowestSoldPrice": median // 2, "daysOnMarket": 30,
+            "discountPercentage": 3.5}})
+    return {
+        "header": {"suburb": "Kew", "state": params.get("state", "VIC"),
+                   "propertyCategory": params.get("property_category", "house")},
+        "series": {"seriesInfo": series},
+    }
+
+
+def _demographics(standin, end_point, params):
+    return {"demographics": [
+        {"type": "AgeGroupOfPopulation", "total": 15000, "year": 2016,
+         "items": [{"label": label, "value": value, "composition": ""}
+                   for label, value in [("0 to 4", 900), ("5 to 19", 2800),
+                                        ("20 to 39", 4500), ("40 to 59", 4200),
+                                        ("60+", 2600)]]}]}
+
+
+# The response for each end point. The first matching pattern applies.
+default_routes = OrderedDict([
+    ("agencies/*/listings", lambda standin, end_point, params: _page(
+        _Items(_listing, standin.listings, 1000 * _identifier(end_point)),
+        params, 20)),
+    ("agents/*/listings", lambda standin, end_point, params: _page(
+        _Items(_listing, standin.listings, 1000 * _identifier(end_point)),
+        params, 20)),
+    ("projects/*/listings", lambda standin, end_point, params: _page(
+        _Items(_listing, 20, 1000 * _identifier(end_point)), params, 20)),
+    ("agencies", lambda standin, end_point, params: _page(
+        _Items(_agency, 50), params, 20)),
+    ("agencies/*", lambda standin, end_point, params: _agency(
+        _identifier(end_point))),
+    ("agents/search", lambda standin, end_point, params: _page(
+        _Items(_agent, 50), params, 20)),
+    ("agents/*", lambda standin, end_point, params: _agent(
+        _identifier(end_point))),
+    ("listings/locations", lambda standin, end_point, params: [
+        {"type": "suburb", "name": name, "state": state, "postcode": f"{postcode}"}
+        for name, postcode, state in _suburbs]),
+    ("listings/*/*", lambda standin, end_point, params: []),
+    ("listings/*", lambda standin, end_point, params: _listing(
+        _identifier(end_point))),
+    ("properties/_suggest", lambda standin, end_point, params: [
+        {"id": f"{i}", "address": _property(i)["address"], "relativeScore": 100 - i,
+         "addressComponents": {"suburb": _property(i)["suburb"],
+                               "postCode": _property(i)["postcode"],
+                               "state": _property(i)["state"]}}
+        for i in range(int(params.get("pageSize", params.get("page_size", 20)) or 20))]),
+    ("properties/*/priceEstimate", lambda standin, end_point, params: {
+        "lowerPrice": 900000, "midPrice": 1000000, "upperPrice": 1100000,
+        "priceConfidence": "medium"}),
+    ("properties/*", lambda standin, end_point, params: _property(
+        _identifier(end_point))),
+    ("salesResults/_head", lambda standin, end_point, params: {
+        "auctionedDate": "2019-05-18", "lastModifiedDateTime": "2019-05-20T04:28:43Z"}),
+    ("salesResults/*/listings", lambda standin, end_point, params: [
+        _sales_result(i) for i in range(standin.sales_results)]),
+    ("salesResults/*", lambda standin, end_point, params: {
+        "numberAuctioned": 500, "numberSold": 400, "numberWithdrawn": 20,
+        "auctionedDate": "2019-05-18", "adjClearanceRate": 0.75}),
+    ("demographics", _demographics),
+    ("suburbPerformanceStatistics", _suburb_performance_statistics),
+    ("addressLocators", lambda standin, end_point, params: [
+        {"ids": [{"level": "Suburb", "id": 10000}],
+         "addressComponents": {"suburb": "Kew", "state": "VIC", "postCode": "3101"}}]),
+    ("locations/schools", _schools),
+    ("locations/schools/*", lambda standin, end_point, params: _school(
+        _identifier(end_point, 2), -37.8, 145.0)),
+    ("*", lambda standin, end_point, params: {}),
+])
+
+
+class StandIn(object):
+
+    r"""
+    An emulation of the Domain API (`connect/token` and the API end points),
+    with configurable latency, rate limits, and failures.
+
+    Responses are plausible (and deterministic) data, not real listings.
+
+    :param latency: [optional]
+        The number of seconds that each response takes, or a two-length tuple
+        of the minimum and maximum number of seconds.
+
+    :param rate_limit: [optional]
+        The maximum number of calls per second for each client. Calls beyond
+        this get a `429` response with a `Retry-After` header.
+
+    :param daily_quota: [optional]
+        The maximum number of calls per day for each client.
+
+    :param failures: [optional]
+        A dictionary of HTTP status codes and the fraction of API calls that
+        fail with them (e.g., `{429: 0.01, 503: 0.01}`).
+
+    :param expires_in: [optional]
+        The number of seconds that tokens are valid for.
+
+    :param listings: [optional]
+        The number of listings of each agency and agent.
+
+    :param sales_results: [optional]
+        The number of sales results for each city.
+
+    :param routes: [optional]
+        A dictionary of end point patterns and functions, which take
+        precedence over :data:`default_routes`. Each function is called with
+        the stand-in, the end point, and the query parameters, and returns the
+        JSON response (or a tuple of the status code and response).
+
+    :param seed: [optional]
+        The seed for randomised latency and failures.
+    """
+
+    def __init__(self, latency=0, rate_limit=None, daily_quota=None,
+                 failures=None, expires_in=3600, listings=450,
+                 sales_results=1000, routes=None, seed=None):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.daily_quota = daily_quota
+        self.failures = dict(failures or dict())
+        self.expires_in = expires_in
+        self.listings = listings
+        self.sales_results = sales_results
+        self.routes = OrderedDict(routes or dict())
+        for pattern, route in default_routes.items():
+            self.routes.setdefault(pattern, route)
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._tokens = dict()
+        self._calls = dict()
+        self._lock = threading.Lock()
+        return None
+
+
+    def handle(self, method, url, headers=None, body=None):
+        r"""
+        Handle a request, and return a three-length tuple of the status code,
+        the response headers, and the response body (as bytes).
+
+        :param method:
+            The HTTP method.
+
+        :param url:
+            The URL of the request.
+
+        :param headers: [optional]
+            The (case-insensitive) request headers.
+
+        :param body: [optional]
+            The request body.
+        """
+        headers = headers or dict()
+        parts = urlsplit(url)
+        end_point = parts.path.strip("/").split("/", 1)[-1]
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+
+        self._wait()
+
+        if method == "POST" and end_point == "connect/token":
+            return self._token(headers, body)
+
+        if method != "GET":
+            return self._json(405, dict(message="Method not allowed"))
+
+        client_id = self._authenticate(headers)
+        if client_id is None:
+            return self._json(401, dict(message="Authorization has been "
+                                                "denied for this request."))
+
+        status, limit_headers = self._limit(client_id)
+        if status is not None:
+            self.stats["throttled"] += 1
+            return self._json(status, dict(message="Rate limit exceeded"),
+                              limit_headers)
+
+        with self._lock:
+            self.stats["requests"] += 1
+            for failure, fraction in self.failures.items():
+                if self._random.random() < fraction:
+                    self.stats[f"failed {failure}"] += 1
+                    if failure == 429:
+                        limit_headers["Retry-After"] = "1"
+                    return self._json(failure, dict(message="Failure"),
+                                      limit_headers)
+
+        for pattern, route in self.routes.items():
+            if fnmatchcase(end_point, pattern):
+                content = route(self, end_point, params)
+                break
+
+        status = 200
+        if isinstance(content, tuple):
+            status, content = content
+
+        response_body = json.dumps(content).encode("utf-8")
+        etag = '"' + hashlib.md5(response_body).hexdigest() + '"'
+        if status == 200 and headers.get("If-None-Match", None) == etag:
+            return (304, dict(limit_headers, ETag=etag), b"")
+
+        limit_headers.update(ETag=etag)
+        return self._json(status, response_body, limit_headers)
+
+
+    def _wait(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            with self._lock:
+                latency = self._random.uniform(*latency)
+        if latency:
+            sleep(latency)
+
+
+    def _json(self, status, content, headers=None):
+        body = content if isinstance(content, bytes) \
+               else json.dumps(content).encode("utf-8")
+        headers = dict(headers or dict())
+        headers.update({"Content-Type": "application/json; charset=utf-8",
+                        "Content-Length": f"{len(body)}"})
+        return (status, headers, body)
+
+
+    def _token(self, headers, body):
+        authorization = headers.get("Authorization", None) or ""
+        try:
+            client_id = base64.b64decode(authorization.split(" ", 1)[1])\
+                              .decode().split(":", 1)[0]
+        except (IndexError, ValueError):
+            return self._json(401, dict(error="invalid_client"))
+
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        scope = dict(parse_qsl(body or "")).get("scope", "")
+
+        access_token = secrets.token_hex(16)
+        with self._lock:
+            self._tokens[access_token] = (client_id, time() + self.expires_in)
+            self.stats["tokens"] += 1
+
+        return self._json(200, dict(access_token=access_token,
+                                    expires_in=self.expires_in,
+                                    token_type="Bearer", scope=scope))
+
+
+    def _authenticate(self, headers):
+        authorization = headers.get("Authorization", None) or ""
+        if not authorization.startswith("Bearer "):
+            return None
+        with self._lock:
+            client_id, expires = self._tokens.get(authorization[7:], (None, 0))
+        return client_id if expires > time() else None
+
+
+    def _limit(self, client_id):
+        r"""
+        Count a call by the given client, and return a two-length tuple of the
+        status code if the call is refused (or `None`), and rate limit headers.
+        """
+        now, headers = (time(), dict())
+        with self._lock:
+            window, day = self._calls.setdefault(client_id, (deque(), [now, 0]))
+            if now - day[0] >= 86400:
+                day[:] = [now, 0]
+
+            if self.daily_quota is not None:
+                remaining = self.daily_quota - day[1]
+                headers.update({"X-Quota-PerDay-Limit": f"{self.daily_quota}",
+                                "X-Quota-PerDay-Remaining": f"{max(0, remaining - 1)}"})
+                if remaining <= 0:
+                    headers["Retry-After"] = f"{ceil(day[0] + 86400 - now)}"
+                    return (429, headers)
+
+            if self.rate_limit is not None:
+                while window and now - window[0] >= 1:
+                    window.popleft()
+                if len(window) >= self.rate_limit:
+                    headers["Retry-After"] = f"{ceil(window[0] + 1 - now)}"
+                    return (429, headers)
+                window.append(now)
+
+            day[1] += 1
+        return (None, headers)
+
+
+
+class StandInAdapter(BaseAdapter):
+
+    r"""
+    A transport that sends requests to a :class:`StandIn` in this process,
+    without any network access.
+
+    :param standin: [optional]
+        The :class:`StandIn` to send requests to. A default one is created if
+        `None` is given.
+    """
+
+    def __init__(self, standin=None):
+        super(StandInAdapter, self).__init__()
+        self.standin = standin or StandIn()
+        return None
+
+
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        status, headers, body = self.standin.handle(
+            request.method, request.url, request.headers, request.body)
+        return build_response(request, status, headers, body, connection=self)
+
+
+    def close(self):
+        pass
+
+
+
+class StandInServer(object):
+
+    r"""
+    A local HTTP server for a :class:`StandIn`, running in a background thread.
+
+    Use :meth:`adapter` as the client's transport to send the client's requests
+    to this server::
+
+        with StandInServer(StandIn(latency=0.05, rate_limit=5)) as server:
+            dc = DomainClient("client_credentials.yaml",
+                              transport=server.adapter())
+
+    :param standin: [optional]
+        The :class:`StandIn` to serve. A default one is created if `None` is
+        given.
+
+    :param host: [optional]
+        The host to listen on.
+
+    :param port: [optional]
+        The port to listen on. If zero is given, a free port is chosen.
+    """
+
+    def __init__(self, standin=None, host="127.0.0.1", port=0):
+        self.standin = standin or StandIn()
+        self._server = ThreadingHTTPServer((host, port), _handler(self.standin))
+        self._server.daemon_threads = True
+        self._thread = None
+        return None
+
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever,
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+    def adapter(self, **kwargs):
+        r"""
+        Return a transport that sends every request to this server.
+
+        Keyword arguments are given to :class:`domain.transport.LocalAdapter`
+        (e.g., `pool_maxsize`).
+        """
+        return LocalAdapter(self.url, **kwargs)
+
+
+
+def _handler(standin):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _handle(self):
+            length = int(self.headers.get("Content-Length", 0) or 0)
+            body = self.rfile.read(length) if length else None
+            status, headers, content = standin.handle(
+                self.command, self.path, self.headers, body)
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            if "Content-Length" not in headers:
+                self.send_header("Content-Length", f"{len(content)}")
+            self.end_headers()
+            self.wfile.write(content)
+
+        do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    return Handler
@@ -0,0 +1,496 @@
+
+""" A local store of listings, properties, agencies, and agents. """
+
+import itertools
+import json
+import re
+from collections import OrderedDict
+from time import time
+
+from . import models as modelling
+from .export import Column
+from .sqlite import (Database, where_clause)
+
+__all__ = ["Table", "tables", "end_point_tables", "Store"]
+
+
+class Table(object):
+
+    r"""
+    A table of the store, with a column for each value that can be queried.
+
+    :param name:
+        The name of the table.
+
+    :param key:
+        The column that identifies each record.
+
+    :param columns:
+        A list of :class:`domain.export.Column` objects.
+
+    :param indexes: [optional]
+        A list of the columns (or tuples of columns) to index.
+
+    :param model: [optional]
+        The model (see :mod:`domain.models`) of the records.
+
+    :param nocase: [optional]
+        The columns that are compared case-insensitively.
+    """
+
+    def __init__(self, name, key, columns, indexes=None, model=None,
+                 nocase=()):
+        self.name = name
+        self.key = key
+        self.columns = OrderedDict((column.name, column) for column in columns)
+        self.indexes = [(index, ) if isinstance(index, str) else tuple(index)
+                        for index in (indexes or [])]
+        self.model = model
+        self.nocase = tuple(nocase)
+        return None
+
+
+    def __repr__(self):
+        return f"<Table {self.name} ({', '.join(self.columns)})>"
+
+
+    def schema(self):
+        r""" Return the statements that create the table and its indexes. """
+        types = dict(int="INTEGER", float="REAL", bool="INTEGER")
+        definitions = []
+        for name, column in self.columns.items():
+            definition = f"{name} {types.get(column.kind, 'TEXT')}"
+            if name == self.key:
+                definition += " PRIMARY KEY"
+            if name in self.nocase:
+                definition += " COLLATE NOCASE"
+            definitions.append(definition)
+        definitions.extend(["fetched REAL NOT NULL", "data TEXT NOT NULL"])
+
+        statements = [f"CREATE TABLE IF NOT EXISTS {self.name} "
+                      f"({', '.join(definitions)})"]
+        for index in self.indexes:
+            statements.append(f"CREATE INDEX IF NOT EXISTS "
+                              f"{self.name}_{'_'.join(index)} "
+                              f"ON {self.name} ({', '.join(index)})")
+        return statements
+
+
+    def rows(self, records, **values):
+        r"""
+        Return a list of the rows to store for the given records.
+
+        :param records:
+            A list of records (dictionaries).
+
+        Keyword arguments give values for columns that are missing from the
+        records (e.g., `agency_id`).
+        """
+        columns = []
+        for name, column in self.columns.items():
+            column_values = column.values(records)
+            if values.get(name, None) is not None:
+                column_values = [values[name] if value is None else value
+                                 for value in column_values]
+            columns.append(column_values)
+
+        now = time()
+        data = [json.dumps(record) for record in records]
+        return [tuple(map(_parameter, row)) + (now, each)
+                for row, each in zip(zip(*columns), data)]
+
+
+
+# The tables of the store.
+tables = OrderedDict([
+    ("listings", Table("listings", "id", [
+        Column("id", kind="int"),
+        Column("agency_id", ("advertiserIdentifiers", "advertiserId"), "int"),
+        Column("property_id", "propertyId"),
+        Column("status"),
+        Column("objective"),
+        Column("channel"),
+        Column("suburb", ("addressParts", "suburb")),
+        Column("postcode", ("addressParts", "postcode")),
+        Column("state", ("addressParts", "stateAbbreviation")),
+        Column("property_type", ("propertyTypes", 0)),
+        Column("bedrooms", kind="float"),
+        Column("bathrooms", kind="float"),
+        Column("carspaces", kind="float"),
+        Column("price", ("priceDetails", "price"), "int"),
+        Column("latitude", ("geoLocation", "latitude"), "float"),
+        Column("longitude", ("geoLocation", "longitude"), "float"),
+        Column("date_listed", "dateListed", "datetime"),
+        Column("date_updated", "dateUpdated", "datetime"),
+    ], indexes=[("suburb", "bedrooms"), "postcode", "property_type", "price",
+                "agency_id", "date_updated", "property_id"],
+       model=modelling.Listing, nocase=("suburb", "state", "property_type"))),
+    ("properties", Table("properties", "id", [
+        Column("id"),
+        Column("address"),
+        Column("suburb"),
+        Column("postcode"),
+        Column("state"),
+        Column("property_type", "propertyType"),
+        Column("property_category", "propertyCategory"),
+        Column("bedrooms", kind="float"),
+        Column("bathrooms", kind="float"),
+        Column("car_spaces", "carSpaces", "float"),
+        Column("latitude", ("addressCoordinate", "lat"), "float"),
+        Column("longitude", ("addressCoordinate", "lon"), "float"),
+        Column("updated", kind="datetime"),
+    ], indexes=[("suburb", "bedrooms"), "postcode", "property_type",
+                "property_category"],
+       model=modelling.Property,
+       nocase=("suburb", "state", "property_type", "property_category"))),
+    ("agencies", Table("agencies", "id", [
+        Column("id", kind="int"),
+        Column("name"),
+        Column("date_updated", "dateUpdated", "datetime"),
+    ], indexes=["name"], model=modelling.Agency, nocase=("name", ))),
+    ("agents", Table("agents", "id", [
+        Column("id", "agentId", "int"),
+        Column("agency_id", "agencyId", "int"),
+        Column("first_name", "firstName"),
+        Column("last_name", "lastName"),
+        Column("email"),
+    ], indexes=["agency_id", "last_name"], model=modelling.Agent,
+       nocase=("first_name", "last_name", "email"))),
+])
+
+
+# The table that the responses of each end point are stored in, and the
+# groups of the end point that give values of missing columns.
+end_point_tables = OrderedDict([
+    (r"agencies/(?P<agency_id>\d+)/listings", "listings"),
+    (r"(agents|projects)/\d+/listings", "listings"),
+    (r"listings/\d+", "listings"),
+    (r"properties/(?!_)[^/]+", "properties"),
+    (r"agencies/\d+", "agencies"),
+    (r"agencies", "agencies"),
+    (r"agents/\d+", "agents"),
+    (r"agents/search", "agents"),
+])
+
+_end_point_tables = [(re.compile(f"^{pattern}$"), table)
+                     for pattern, table in end_point_tables.items()]
+
+
+class Store(Database):
+
+    r"""
+    A local store of listings, properties, agencies, and agents, backed by
+    SQLite, with indexes on the columns that they are most often queried by
+    (e.g., suburb, postcode, property type, price, agency, and the date
+    updated).
+
+    Records can be added directly, or a client can add every listing,
+    property, agency, and agent that it fetches (with its `store` argument).
+    Queries are then served locally, without using any API quota.
+
+    :param path: [optional]
+        The path of the SQLite database. If `:memory:` is given, the store is
+        held in memory (and shared by all threads).
+
+    :param timeout: [optional]
+        The number of seconds to wait for the database to be unlocked.
+    """
+
+    def __init__(self, path=":memory:", timeout=30):
+        super(Store, self).__init__(path, timeout)
+        with self._transaction() as connection:
+            for table in tables.values():
+                for statement in table.schema():
+                    connection.execute(statement)
+        return None
+
+
+    def add(self, table, records, **values):
+        r"""
+        Add (or replace) records in a table, and return the number added.
+
+        :param table:
+            The name of the table (e.g., `listings`).
+
+        :param records:
+            A list of records (dictionaries or models).
+
+        Keyword arguments give values for columns that are missing from the
+        records (e.g., `agency_id` for the listings of an agency).
+        """
+        table = _table(table)
+        records = [_record(record) for record in records]
+        records = [record for record in records
+                   if isinstance(record, dict) and record]
+        if not records:
+            return 0
+
+        rows = table.rows(records, **values)
+        columns = list(table.columns) + ["fetched", "data"]
+        with self._transaction() as connection:
+            connection.executemany(
+                f"REPLACE INTO {table.name} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})", rows)
+            if table.name == "agencies":
+                # Agencies include their agents.
+                agents = list(itertools.chain.from_iterable(
+                    record.get("agents", None) or [] for record in records))
+                if agents:
+                    connection.executemany(
+                        f"REPLACE INTO agents ({', '.join(tables['agents'].columns)}, "
+                        f"fetched, data) VALUES "
+                        f"({', '.join('?' * (len(tables['agents'].columns) + 2))})",
+                        tables["agents"].rows(agents))
+        return len(rows)
+
+
+    def add_listings(self, listings, agency_id=None):
+        r"""
+        Add listings to the store.
+
+        :param listings:
+            A list of listings.
+
+        :param agency_id: [optional]
+            The agency of listings that do not give their advertiser.
+        """
+        return self.add("listings", listings, agency_id=agency_id)
+
+
+    def add_properties(self, properties):
+        r""" Add properties to the store. """
+        return self.add("properties", properties)
+
+
+    def add_agencies(self, agencies):
+        r""" Add agencies (and their agents) to the store. """
+        return self.add("agencies", agencies)
+
+
+    def add_agents(self, agents):
+        r""" Add agents to the store. """
+        return self.add("agents", agents)
+
+
+    def capture(self, end_point, value):
+        r"""
+        Add the response of an API end point to the store, if it contains
+        listings, properties, agencies, or agents. Other responses are ignored.
+
+        :param end_point:
+            The relative URL of the API end point.
+
+        :param value:
+            The decoded response.
+        """
+        for pattern, table in _end_point_tables:
+            match = pattern.match(end_point)
+            if match is not None:
+                records = value if isinstance(value, list) else [value]
+                values = dict((k, int(v)) for k, v in match.groupdict().items())
+                return self.add(table, records, **values)
+        return 0
+
+
+    def _select(self, table, columns, order_by=None, limit=None, offset=None,
+                **filters):
+        table = _table(table)
+        where, args = _where(table, filters)
+        sql = f"SELECT {columns} FROM {table.name}{where}"
+
+        if order_by is not None:
+            orders = []
+            for name in ([order_by] if isinstance(order_by, str) else order_by):
+                descending = name.startswith("-")
+                name = name.lstrip("-")
+                _column(table, name)
+                orders.append(f"{name} DESC" if descending else name)
+            sql += f" ORDER BY {', '.join(orders)}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+            if offset is not None:
+                sql += f" OFFSET {int(offset)}"
+        return (table, self._rows(sql, args))
+
+
+    def query(self, table, order_by=None, limit=None, offset=None, models=False,
+              **filters):
+        r"""
+        Return a list of the records in a table that match the given filters.
+
+        :param table:
+            The name of the table (e.g., `listings`).
+
+        :param order_by: [optional]
+            The column (or list of columns) to order the records by. Prefix a
+            column with `-` to order by descending values (e.g., `-price`).
+
+        :param limit: [optional]
+            The maximum number of records to return.
+
+        :param offset: [optional]
+            The number of records to skip (with `limit`).
+
+        :param models: [optional]
+            Return the records as models (see :mod:`domain.models`).
+
+        Keyword arguments filter the records by their columns. A single value
+        must be equal (text is compared case-insensitively), a list or set of
+        values must contain the value, and for numbers and dates, a two-length
+        tuple gives the minimum and maximum values (either can be `None`). For
+        example: `suburb="Pyrmont", bedrooms=(2, None), price=(None, 1500000)`.
+        """
+        table, rows = self._select(table, "data", order_by, limit, offset,
+                                   **filters)
+        records = [json.loads(data) for data, in rows]
+        if models and table.model is not None:
+            return [table.model(record) for record in records]
+        return records
+
+
+    def count(self, table, **filters):
+        r"""
+        Return the number of records in a table that match the given filters
+        (see :meth:`query`).
+        """
+        return self._select(table, "COUNT(*)", **filters)[1][0][0]
+
+
+    def values(self, table, column, **filters):
+        r"""
+        Return a dictionary of the distinct values of a column and the number
+        of records with each, for the records that match the given filters.
+
+        :param table:
+            The name of the table (e.g., `listings`).
+
+        :param column:
+            The name of the column (e.g., `suburb`).
+        """
+        table = _table(table)
+        _column(table, column)
+        where, args = _where(table, filters)
+        rows = self._rows(
+            f"SELECT {column}, COUNT(*) FROM {table.name}{where} "
+            f"GROUP BY {column} ORDER BY COUNT(*) DESC", args)
+        return OrderedDict(rows)
+
+
+    def listings(self, **kwargs):
+        r"""
+        Return the stored listings that match the given filters (see
+        :meth:`query`). The columns are: `id`, `agency_id`, `property_id`,
+        `status`, `objective`, `channel`, `suburb`, `postcode`, `state`,
+        `property_type`, `bedrooms`, `bathrooms`, `carspaces`, `price`,
+        `latitude`, `longitude`, `date_listed`, and `date_updated`.
+        """
+        return self.query("listings", **kwargs)
+
+
+    def properties(self, agency_id=None, **kwargs):
+        r"""
+        Return the stored properties that match the given filters (see
+        :meth:`query`). The columns are: `id`, `address`, `suburb`,
+        `postcode`, `state`, `property_type`, `property_category`, `bedrooms`,
+        `bathrooms`, `car_spaces`, `latitude`, `longitude`, and `updated`.
+
+        :param agency_id: [optional]
+            Only return properties that have been listed by this agency (or
+            any of a list of agencies).
+        """
+        if agency_id is not None:
+            ids = [id for id, in self._select("listings", "DISTINCT property_id",
+                                              agency_id=agency_id)[1]
+                   if id is not None]
+            kwargs["id"] = set(ids) & set(kwargs["id"]) \
+                           if isinstance(kwargs.get("id", None), (list, set)) \
+                           else set(ids)
+        return self.query("properties", **kwargs)
+
+
+    def agencies(self, **kwargs):
+        r"""
+        Return the stored agencies that match the given filters (see
+        :meth:`query`). The columns are: `id`, `name`, and `date_updated`.
+        """
+        return self.query("agencies", **kwargs)
+
+
+    def agents(self, **kwargs):
+        r"""
+        Return the stored agents that match the given filters (see
+        :meth:`query`). The columns are: `id`, `agency_id`, `first_name`,
+        `last_name`, and `email`.
+        """
+        return self.query("agents", **kwargs)
+
+
+    def execute(self, sql, parameters=()):
+        r"""
+        Execute a SQL query on the store (e.g., for aggregates), and return
+        the rows.
+
+        :param sql:
+            The SQL query.
+
+        :param parameters: [optional]
+            The parameters of the query.
+        """
+        return self._rows(sql, parameters)
+
+
+    def delete(self, table, **filters):
+        r"""
+        Delete the records in a table that match the given filters (see
+        :meth:`query`), and return the number deleted.
+        """
+        table = _table(table)
+        where, args = _where(table, filters)
+        with self._transaction() as connection:
+            return connection.execute(f"DELETE FROM {table.name}{where}",
+                                      args).rowcount
+
+
+
+def _table(name):
+    try:
+        return tables[name]
+    except KeyError:
+        raise ValueError(f"unknown table '{name}' (available: "
+                         f"{', '.join(tables)})") from None
+
+
+def _column(table, name):
+    if name not in table.columns and name != "fetched":
+        raise ValueError(f"unknown column '{name}' of {table.name} (available: "
+                         f"{', '.join(table.columns)})")
+    return table.columns.get(name, None)
+
+
+def _record(record):
+    to_dict = getattr(record, "to_dict", None)
+    return record if to_dict is None else to_dict()
+
+
+def _where(table, filters):
+    r"""
+    Return the WHERE clause and its parameters for the given filters (see
+    :func:`domain.sqlite.where_clause`).
+    """
+    columns = dict((name, _column(table, name))
+                   for name, value in filters.items() if value is not None)
+
+    def convert(name, value):
+        # Values that cannot be converted (e.g., dates without times) are
+        # compared as they are given.
+        column = columns[name]
+        converted = float(value) if column is None else column.convert(value)
+        return _parameter(value if converted is None else converted)
+
+    return where_clause(filters, convert)
+
+
+def _parameter(value):
+    # Dates are stored as ISO 8601 text, so they sort (and compare) in order.
+    isoformat = getattr(value, "isoformat", None)
+    return value if isoformat is None else isoformat(sep=" ")
@@ -0,0 +1,176 @@
+
+""" Stream the items of large JSON array responses as they arrive. """
+
+import re
+
+__all__ = ["ArrayParser", "iter_items", "aiter_items"]
+
+# The characters that matter outside and inside of strings.
+_structure = re.compile(rb'["\[\]{},]')
+_string = re.compile(rb'["\\]')
+
+_QUOTE, _BACKSLASH, _COMMA, _BRACKET = b'"\\,['
+_OPEN, _CLOSE = frozenset(b"[{"), frozenset(b"]}")
+
+
+class ArrayParser(object):
+
+    r"""
+    An incremental parser that splits a JSON array into the (encoded) items of
+    the array, as chunks of the array are fed to it.
+
+    Only the structure of the array is parsed here; each item is returned as
+    bytes so that it can be decoded by a fast JSON decoder.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._done = False
+        return None
+
+
+    def feed(self, chunk):
+        r"""
+        Add a chunk of the array, and return a list of the items that are now
+        complete.
+
+        :param chunk:
+            The next bytes of the array.
+
+        :raises ValueError:
+            If the JSON is not an array.
+        """
+        if self._done:
+            if chunk.strip():
+                raise ValueError("unexpected data after the end of the array")
+            return []
+
+        buffer = self._buffer
+        buffer += chunk
+
+        items, position = ([], self._position)
+        while True:
+            match = (_string if self._in_string else _structure).search(
+                buffer, position)
+            if match is None:
+                break
+
+            index = match.start()
+            character = buffer[index]
+            position = index + 1
+
+            if self._in_string:
+                if character == _BACKSLASH:
+                    position += 1 # Skip the escaped character.
+                else:
+                    self._in_string = False
+
+            elif self._depth == 0:
+                if character != _BRACKET or buffer[:index].strip():
+                    raise ValueError("the JSON is not an array")
+                self._start = position
+                self._depth += 1
+
+            elif character == _QUOTE:
+                self._in_string = True
+
+            elif character in _OPEN:
+                self._depth += 1
+
+            elif character in _CLOSE:
+                self._depth -= 1
+                if self._depth == 0:
+                    item = buffer[self._start:index].strip()
+                    if item:
+                        items.append(bytes(item))
+                    self._done = True
+                    del buffer[:]
+                    return items
+
+            elif character == _COMMA and self._depth == 1:
+                items.append(bytes(buffer[self._start:index].strip()))
+                self._start = position
+
+        # Discard the items that have been returned.
+        if self._start:
+            del buffer[:self._start]
+            position -= self._start
+            self._start = 0
+        self._position = position
+        return items
+
+
+    def close(self):
+        r"""
+        Check that the whole array was given.
+
+        :raises ValueError:
+            If the array is incomplete.
+        """
+        if not self._done:
+            raise ValueError("the JSON array is incomplete")
+
+
+
+def iter_items(response, decode, chunk_size=65536):
+    r"""
+    Yield the decoded items of a JSON array response as the body arrives.
+
+    :param response:
+        A :class:`requests.Response` that was requested with `stream=True`.
+        It is closed when the generator finishes.
+
+    :param decode:
+        A function to decode each item (given as bytes).
+
+    :param chunk_size: [optional]
+        The number of bytes to read from the response at a time.
+    """
+    parser = ArrayParser()
+    try:
+        for chunk in response.iter_content(chunk_size):
+            for item in parser.feed(chunk):
+                yield decode(item)
+        parser.close()
+
+    finally:
+        response.close()
+
+
+
+async def aiter_items(run, response, decode, chunk_size=65536):
+    r"""
+    Asynchronously yield the decoded items of a JSON array response as the
+    body arrives.
+
+    :param run:
+        A coroutine function that runs a blocking function (with arguments) off
+        the event loop, and returns its result.
+
+    :param response:
+        A :class:`requests.Response` that was requested with `stream=True`.
+        It is closed when the generator finishes.
+
+    :param decode:
+        A function to decode each item (given as bytes).
+
+    :param chunk_size: [optional]
+        The number of bytes to read from the response at a time.
+    """
+    parser = ArrayParser()
+    chunks = response.iter_content(chunk_size)
+    try:
+        while True:
+            chunk = await run(next, chunks, None)
+            if chunk is None:
+                break
+            for item in parser.feed(chunk):
+                yield decode(item)
+        parser.close()
+
+    finally:
+        response.close()
@@ -0,0 +1,408 @@
+
+""" Incremental synchronisation of the listings of agencies and agents. """
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import (datetime, timedelta, timezone)
+from time import time
+
+from .models import parse_datetime
+from .sqlite import (Database, where_clause)
+
+__all__ = ["SyncState", "ListingSync"]
+
+
+class SyncState(Database):
+
+    r"""
+    The state of incremental listing synchronisations, backed by SQLite: the
+    high-water mark of each agency and agent, the progress of each run, and a
+    snapshot of every listing that has been synchronised.
+
+    :param path:
+        The path of the SQLite database.
+
+    :param timeout: [optional]
+        The number of seconds to wait for the database to be unlocked.
+    """
+
+    def __init__(self, path, timeout=30):
+        super(SyncState, self).__init__(path, timeout)
+        with self._transaction() as connection:
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS marks (
+                    kind TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    mark TEXT,
+                    synced REAL NOT NULL,
+                    PRIMARY KEY (kind, owner))""")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS runs (
+                    name TEXT PRIMARY KEY,
+                    started REAL NOT NULL,
+                    finished REAL)""")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS run_owners (
+                    name TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    PRIMARY KEY (name, kind, owner))""")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS listings (
+                    kind TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    date_updated TEXT,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (kind, owner, id))""")
+        return None
+
+
+    def mark(self, kind, owner):
+        r"""
+        Return the high-water mark (the latest `dateUpdated` of a synchronised
+        listing) of an agency or agent, or `None` if it has not been
+        synchronised.
+
+        :param kind:
+            Either `agencies` or `agents`.
+
+        :param owner:
+            The agency or agent identifier.
+        """
+        row = self._connection.execute(
+            "SELECT mark FROM marks WHERE kind = ? AND owner = ?",
+            (kind, f"{owner}")).fetchone()
+        return None if row is None else row[0]
+
+
+    def marks(self):
+        r"""
+        Return a dictionary of the high-water mark and the time of the last
+        successful synchronisation, keyed by `(kind, owner)`.
+        """
+        rows = self._connection.execute("SELECT kind, owner, mark, synced FROM marks")
+        return dict(((kind, owner), (mark, synced))
+                    for kind, owner, mark, synced in rows)
+
+
+    def merge(self, kind, owner, listings):
+        r"""
+        Insert or update listings in the snapshot of an agency or agent, and
+        return the number of listings merged.
+
+        :param kind:
+            Either `agencies` or `agents`.
+
+        :param owner:
+            The agency or agent identifier.
+
+        :param listings:
+            A list of listings.
+        """
+        rows = [(kind, f"{owner}", listing["id"], listing.get("dateUpdated", None),
+                 json.dumps(listing)) for listing in listings]
+        with self._transaction() as connection:
+            connection.executemany(
+                """REPLACE INTO listings (kind, owner, id, date_updated, data)
+                    VALUES (?, ?, ?, ?, ?)""", rows)
+        return len(rows)
+
+
+    def advance(self, kind, owner, mark, run=None):
+        r"""
+        Set the high-water mark of an agency or agent after a successful
+        synchronisation, and record that it is complete in a run.
+
+        :param kind:
+            Either `agencies` or `agents`.
+
+        :param owner:
+            The agency or agent identifier.
+
+        :param mark:
+            The new high-water mark.
+
+        :param run: [optional]
+            The name of the run.
+        """
+        with self._transaction() as connection:
+            connection.execute(
+                "REPLACE INTO marks (kind, owner, mark, synced) VALUES (?, ?, ?, ?)",
+                (kind, f"{owner}", mark, time()))
+            if run is not None:
+                connection.execute(
+                    "INSERT OR IGNORE INTO run_owners (name, kind, owner) VALUES (?, ?, ?)",
+                    (run, kind, f"{owner}"))
+
+
+    def begin(self, run):
+        r"""
+        Begin a run, or resume it if it did not finish, and return the set of
+        `(kind, owner)` tuples that the run has already synchronised.
+
+        :param run:
+            The name of the run.
+        """
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT finished FROM runs WHERE name = ?", (run, )).fetchone()
+            if row is None or row[0] is not None:
+                connection.execute(
+                    "REPLACE INTO runs (name, started, finished) VALUES (?, ?, NULL)",
+                    (run, time()))
+                connection.execute("DELETE FROM run_owners WHERE name = ?", (run, ))
+                return set()
+
+            return set(connection.execute(
+                "SELECT kind, owner FROM run_owners WHERE name = ?", (run, )))
+
+
+    def finish(self, run):
+        r""" Record that a run finished, so that the next run starts afresh. """
+        with self._transaction() as connection:
+            connection.execute("UPDATE runs SET finished = ? WHERE name = ?",
+                               (time(), run))
+
+
+    def reset(self, kind=None, owner=None):
+        r"""
+        Forget the high-water marks (and snapshots) of agencies or agents, so
+        that their listings are synchronised in full.
+
+        :param kind: [optional]
+            Either `agencies` or `agents`. If `None` is given, everything is
+            forgotten.
+
+        :param owner: [optional]
+            The agency or agent identifier.
+        """
+        where, args = _where(kind=kind, owner=owner)
+        with self._transaction() as connection:
+            connection.execute(f"DELETE FROM marks{where}", args)
+            connection.execute(f"DELETE FROM listings{where}", args)
+
+
+    def snapshot(self, kind=None, owner=None):
+        r"""
+        Yield the synchronised listings.
+
+        :param kind: [optional]
+            Only yield the listings of `agencies` or `agents`.
+
+        :param owner: [optional]
+            Only yield the listings of this agency or agent.
+        """
+        where, args = _where(kind=kind, owner=owner)
+        for data, in self._connection.execute(
+                f"SELECT data FROM listings{where} ORDER BY kind, owner, id", args):
+            yield json.loads(data)
+
+
+    def count(self, kind=None, owner=None):
+        r""" Return the number of synchronised listings. """
+        where, args = _where(kind=kind, owner=owner)
+        return self._connection.execute(
+            f"SELECT COUNT(*) FROM listings{where}", args).fetchone()[0]
+
+
+
+def _where(**columns):
+    return where_clause(columns, lambda name, value: f"{value}")
+
+
+def _utc(value):
+    value = parse_datetime(value)
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+
+class ListingSync(object):
+
+    r"""
+    Synchronise the listings of agencies and agents incrementally.
+
+    Each agency or agent has a high-water mark: the latest `dateUpdated` of
+    its listings. Only listings updated since the mark are requested (with
+    `date_updated_since`), and they are merged into the snapshot as they
+    arrive. The mark only advances once all of the updated listings have been
+    merged, so an interrupted synchronisation loses nothing and is repeated
+    from the same mark.
+
+    :param client:
+        A :class:`domain.client.DomainClient`.
+
+    :param state:
+        A :class:`SyncState`, or the path of one.
+
+    :param overlap: [optional]
+        The number of seconds before the high-water mark to request listings
+        from, to allow for listings that are updated while a synchronisation
+        is in progress. Listings that are requested again are merged again.
+
+    :param archived: [optional]
+        Include archived listings, so that listings that are withdrawn or sold
+        are updated in the snapshot.
+
+    :param chunk_size: [optional]
+        The number of listings to merge into the snapshot at a time.
+    """
+
+    kinds = ("agencies", "agents")
+
+    def __init__(self, client, state, overlap=300, archived=True,
+                 chunk_size=200):
+        if not isinstance(state, SyncState):
+            state = SyncState(state)
+        self.client = client
+        self.state = state
+        self.overlap = overlap
+        self.archived = archived
+        self.chunk_size = chunk_size
+        return None
+
+
+    def since(self, kind, owner):
+        r"""
+        Return the `date_updated_since` to request the listings of an agency or
+        agent with, or `None` if they have not been synchronised.
+
+        :param kind:
+            Either `agencies` or `agents`.
+
+        :param owner:
+            The agency or agent identifier.
+        """
+        mark = _utc(self.state.mark(kind, owner))
+        if mark is None:
+            return None
+        since = mark - timedelta(seconds=self.overlap)
+        return since.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+    def _listings(self, kind, owner, since):
+        if kind == "agencies":
+            status = "liveAndArchived" if self.archived else None
+            return self.client.iter_agencies_listings(
+                owner, listingStatusFilter=status, date_updated_since=since,
+                cache=False)
+        if kind == "agents":
+            return self.client.iter_agents_listings(
+                owner, date_updated_since=since,
+                includedArchivedListings=True if self.archived else None,
+                cache=False)
+        raise ValueError(f"kind must be one of: {', '.join(self.kinds)}")
+
+
+    def sync_one(self, kind, owner, full=False, run=None):
+        r"""
+        Synchronise the listings of one agency or agent, and return a
+        dictionary of the number of listings fetched, the `date_updated_since`
+        that was requested, and the new high-water mark.
+
+        :param kind:
+            Either `agencies` or `agents`.
+
+        :param owner:
+            The agency or agent identifier.
+
+        :param full: [optional]
+            Request every listing, instead of those updated since the mark.
+
+        :param run: [optional]
+            The name of the run that this is part of.
+        """
+        since = None if full else self.since(kind, owner)
+        mark_text = self.state.mark(kind, owner)
+        mark = _utc(mark_text)
+
+        fetched, chunk = (0, [])
+        for listing in self._listings(kind, owner, since):
+            chunk.append(listing)
+            updated = _utc(listing.get("dateUpdated", None))
+            if updated is not None and (mark is None or updated > mark):
+                mark, mark_text = (updated, listing["dateUpdated"])
+
+            if len(chunk) >= self.chunk_size:
+                fetched += self.state.merge(kind, owner, chunk)
+                chunk = []
+
+        fetched += self.state.merge(kind, owner, chunk)
+        self.state.advance(kind, owner, mark_text, run)
+        return dict(kind=kind, owner=owner, since=since, fetched=fetched,
+                    mark=mark_text)
+
+
+    def sync_agency(self, id, full=False):
+        r"""
+        Synchronise the listings of an agency (see :meth:`sync_one`).
+
+        :param id:
+            The agency identifier.
+        """
+        return self.sync_one("agencies", id, full)
+
+
+    def sync_agent(self, id, full=False):
+        r"""
+        Synchronise the listings of an agent (see :meth:`sync_one`).
+
+        :param id:
+            The agent identifier.
+        """
+        return self.sync_one("agents", id, full)
+
+
+    def sync(self, agencies=(), agents=(), run="default", full=False,
+             max_workers=4):
+        r"""
+        Synchronise the listings of many agencies and agents concurrently, and
+        return a list of results (see :meth:`sync_one`) in the same order. If
+        a synchronisation fails, its exception is returned in place of the
+        result, and the others continue.
+
+        A run that is interrupted (or has failures) is resumed by calling this
+        again with the same run name: agencies and agents that the run already
+        synchronised are skipped (and their result is `None`).
+
+        :param agencies: [optional]
+            The agency identifiers.
+
+        :param agents: [optional]
+            The agent identifiers.
+
+        :param run: [optional]
+            The name of the run.
+
+        :param full: [optional]
+            Request every listing, instead of those updated since the marks.
+
+        :param max_workers: [optional]
+            The number of agencies and agents to synchronise at once.
+        """
+        owners = [("agencies", f"{id}") for id in agencies] \
+               + [("agents", f"{id}") for id in agents]
+        done = self.state.begin(run)
+
+        def sync_one(kind, owner):
+            if (kind, owner) in done:
+                return None
+            try:
+                return self.sync_one(kind, owner, full, run)
+            except Exception as exception:
+                logging.exception(f"Failed to synchronise {kind}/{owner}")
+                return exception
+
+        # Pages are prefetched on the client's worker threads, so the
+        # synchronisations run on their own threads.
+        with ThreadPoolExecutor(max_workers) as executor:
+            results = list(executor.map(lambda args: sync_one(*args), owners))
+
+        if not any(isinstance(result, Exception) for result in results):
+            self.state.finish(run)
+        return results
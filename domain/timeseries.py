@@ -0,0 +1,417 @@
+
+""" Time series of suburb performance statistics, over many suburbs and years. """
+
+from collections import OrderedDict
+from datetime import (date, datetime, timezone)
+from itertools import product
+
+from . import cache as caching
+from .export import schemas
+from .utils import require
+
+__all__ = ["spans", "statistics", "period", "periods", "SuburbPerformance", "Cube"]
+
+# The number of months in each chronological span.
+spans = (3, 6, 12)
+
+# The statistics of each period, keyed by their (exported) names.
+statistics = OrderedDict(
+    (column.name, column)
+    for column in schemas["suburb_performance_statistics"].columns
+    if column.kind in ("int", "float") and column.name not in ("year", "month"))
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, tuple):
+        return date(value[0], value[1], 1)
+    return datetime.strptime(f"{value}"[:10], "%Y-%m-%d").date()
+
+
+def _ordinal(year, month, span):
+    return (12 * year + month - 1) // span
+
+
+def _period(ordinal, span):
+    year, month = divmod(ordinal * span + span - 1, 12)
+    return (year, month + 1)
+
+
+def period(day, span=3):
+    r"""
+    Return the period (a `(year, month)` tuple of its last month) of the
+    chronological span that contains a date. Spans are aligned with the
+    calendar year (e.g., quarters end in March, June, September, December).
+
+    :param day:
+        A date, a `datetime`, a `(year, month)` tuple, or a `YYYY-MM-DD` string.
+
+    :param span: [optional]
+        The number of months in each chronological span: 3, 6, or 12.
+    """
+    day = _date(day)
+    return _period(_ordinal(day.year, day.month, span), span)
+
+
+def periods(start, end, span=3):
+    r"""
+    Return a list of the periods (see :func:`period`) from the one that
+    contains the start date to the one that contains the end date.
+
+    :param start:
+        The start date.
+
+    :param end:
+        The end date.
+
+    :param span: [optional]
+        The number of months in each chronological span: 3, 6, or 12.
+    """
+    first, last = (_ordinal(*period(start, span), span),
+                   _ordinal(*period(end, span), span))
+    return [_period(ordinal, span) for ordinal in range(first, last + 1)]
+
+
+
+class SuburbPerformance(object):
+
+    r"""
+    Plan, fetch, and assemble time series of suburb performance statistics
+    across many suburbs, property categories, and numbers of bedrooms.
+
+    Each call to :meth:`domain.client.DomainClient.suburb_performance_statistics`
+    returns a window of periods counted back from the current one. The
+    statistics of each period are cached by date (not by their position from
+    the current period) so that they can be reused as time goes on, and only
+    the windows that cover missing periods are requested, concurrently.
+
+    :param client:
+        A :class:`domain.client.DomainClient`.
+
+    :param cache: [optional]
+        A response cache (see :mod:`domain.cache`), or the path of a
+        :class:`domain.cache.SQLiteCache`. Defaults to the client's cache, or
+        a :class:`domain.cache.MemoryCache` if the client has none.
+
+    :param max_periods: [optional]
+        The most periods to request in one call.
+
+    :param current_ttl: [optional]
+        The number of seconds to cache the statistics of the current period,
+        which change until it ends. Past periods do not expire.
+    """
+
+    def __init__(self, client, cache=None, max_periods=20, current_ttl=caching.DAY):
+        if isinstance(cache, str):
+            cache = caching.SQLiteCache(cache)
+        elif cache is None:
+            cache = client.cache
+            if cache is None:
+                cache = caching.MemoryCache(maxsize=1000000)
+        self.client = client
+        self.cache = cache
+        self.max_periods = max_periods
+        self.current_ttl = current_ttl
+        return None
+
+
+    @staticmethod
+    def series(suburbs, categories=("house", ), bedrooms=(None, )):
+        r"""
+        Return a list of the series (`(state, suburb_id, property_category,
+        bedrooms)` tuples) for every combination of suburb, property category,
+        and number of bedrooms.
+
+        :param suburbs:
+            A list of `(state, suburb_id)` tuples.
+
+        :param categories: [optional]
+            A list of property categories: `house`, `unit`, or `land`.
+
+        :param bedrooms: [optional]
+            A list of numbers of bedrooms (`None` for all properties).
+        """
+        return [(state, suburb_id, category.lower(), beds)
+                for (state, suburb_id), category, beds
+                in product(suburbs, categories, bedrooms)]
+
+
+    def _key(self, series, span, year, month):
+        state, suburb_id, category, bedrooms = series
+        return caching.cache_key(
+            "suburbPerformanceStatistics/periods",
+            dict(state=state, suburb_id=suburb_id, property_category=category,
+                 bedrooms=bedrooms, chronological_span=span, year=year,
+                 month=month))
+
+
+    def plan(self, series, start, end, span=3, today=None):
+        r"""
+        Return the fewest calls (as dictionaries of keyword arguments for
+        :meth:`domain.client.DomainClient.suburb_performance_statistics`) that
+        cover the periods between the start and end dates which are not
+        cached. A call can cover cached periods if that saves another call.
+
+        :param series:
+            A list of series (see :meth:`series`).
+
+        :param start:
+            The start date.
+
+        :param end:
+            The end date. Periods after the current one are not requested.
+
+        :param span: [optional]
+            The number of months in each chronological span: 3, 6, or 12.
+
+        :param today: [optional]
+            The current date. Defaults to today (in UTC).
+        """
+        return self._plan(series, start, end, span, today)[0]
+
+
+    def _plan(self, series, start, end, span, today):
+        r"""
+        Return the planned calls (see :meth:`plan`), and a dictionary of the
+        cached statistics of each `(series, period)`.
+        """
+        if span not in spans:
+            raise ValueError(f"span must be one of {spans}, not {span}")
+
+        current = _ordinal(*period(today or datetime.now(timezone.utc), span), span)
+        wanted = [_ordinal(year, month, span)
+                  for year, month in periods(start, end, span)]
+        wanted = [ordinal for ordinal in wanted if ordinal <= current]
+
+        calls, found = ([], dict())
+        for each in series:
+            missing = []
+            for ordinal in wanted:
+                key = _period(ordinal, span)
+                value = self.cache.peek(self._key(each, span, *key))
+                if value is None:
+                    missing.append(ordinal)
+                else:
+                    found[(each, key)] = value
+
+            # Each call covers the next missing period and everything within
+            # `max_periods` of it, which is the fewest fixed-size windows.
+            while missing:
+                first = missing[0]
+                last = max(o for o in missing if o < first + self.max_periods)
+                missing = [o for o in missing if o > last]
+                state, suburb_id, category, bedrooms = each
+                calls.append(dict(state=state, suburb_id=suburb_id,
+                                  property_category=category,
+                                  chronological_span=span,
+                                  tPlusFrom=current - last + 1,
+                                  tPlusTo=current - first + 1,
+                                  bedrooms=bedrooms))
+        return (calls, found)
+
+
+    def fetch(self, calls, today=None):
+        r"""
+        Make the planned calls (see :meth:`plan`) concurrently, and cache the
+        statistics of every period they cover. Periods without statistics are
+        cached as empty, so that they are not requested again.
+
+        Returns a dictionary of the statistics of each `(series, period)`. If
+        any calls fail, the statistics of the others are still cached, and
+        then the first exception is raised.
+
+        :param calls:
+            A list of calls from :meth:`plan`.
+
+        :param today: [optional]
+            The current date. Defaults to today (in UTC).
+        """
+        error, fetched = (None, dict())
+        day = today or datetime.now(timezone.utc)
+        results = self.client.map_endpoint("suburb_performance_statistics", calls)
+        for call, result in zip(calls, results):
+            if isinstance(result, Exception):
+                error = error or result
+                continue
+
+            span = call["chronological_span"]
+            current = _ordinal(*period(day, span), span)
+            found = dict()
+            series = ((result or dict()).get("series", None) or dict()).get(
+                "seriesInfo", None)
+            for each in series or []:
+                try:
+                    ordinal = _ordinal(int(each["year"]), int(each["month"]), span)
+                except (KeyError, TypeError, ValueError):
+                    continue
+                found[ordinal] = each.get("values", None) or dict()
+
+            key = (call["state"], call["suburb_id"], call["property_category"],
+                   call["bedrooms"])
+            for t in range(call["tPlusFrom"], call["tPlusTo"] + 1):
+                ordinal = current - t + 1
+                value = found.get(ordinal, dict())
+                self.cache.set(self._key(key, span, *_period(ordinal, span)),
+                               value, ttl=self.current_ttl if t == 1 else None)
+                fetched[(key, _period(ordinal, span))] = value
+
+        if error is not None:
+            raise error
+        return fetched
+
+
+    def cube(self, suburbs, start, end, categories=("house", ), bedrooms=(None, ),
+             span=3, metrics=None, today=None):
+        r"""
+        Return a :class:`Cube` of statistics (series by period by metric) for
+        every combination of suburb, property category, and number of
+        bedrooms, between the start and end dates. Only the periods that are
+        not cached are requested.
+
+        :param suburbs:
+            A list of `(state, suburb_id)` tuples.
+
+        :param start:
+            The start date (e.g., `2015-01-01`).
+
+        :param end:
+            The end date.
+
+        :param categories: [optional]
+            A list of property categories: `house`, `unit`, or `land`.
+
+        :param bedrooms: [optional]
+            A list of numbers of bedrooms (`None` for all properties).
+
+        :param span: [optional]
+            The number of months in each chronological span: 3, 6, or 12.
+
+        :param metrics: [optional]
+            A list of the names of the statistics to include (see
+            :data:`statistics`). Defaults to all.
+
+        :param today: [optional]
+            The current date. Defaults to today (in UTC).
+        """
+        series = self.series(suburbs, categories, bedrooms)
+        calls, found = self._plan(series, start, end, span, today)
+        found.update(self.fetch(calls, today))
+        return self._assemble(series, periods(start, end, span), span, metrics,
+                              found)
+
+
+    def assemble(self, series, start, end, span=3, metrics=None):
+        r"""
+        Return a :class:`Cube` of the cached statistics of some series between
+        the start and end dates. Missing statistics are `NaN`.
+
+        :param series:
+            A list of series (see :meth:`series`).
+
+        :param start:
+            The start date.
+
+        :param end:
+            The end date.
+
+        :param span: [optional]
+            The number of months in each chronological span: 3, 6, or 12.
+
+        :param metrics: [optional]
+            A list of the names of the statistics to include. Defaults to all.
+        """
+        keys = periods(start, end, span)
+        found = dict(((each, key), self.cache.peek(self._key(each, span, *key)))
+                     for each, key in product(series, keys))
+        return self._assemble(series, keys, span, metrics, found)
+
+
+    def _assemble(self, series, keys, span, metrics, found):
+        numpy = require("numpy", "export", "suburb performance cubes")
+        names = list(statistics if metrics is None else metrics)
+        columns = [statistics[name] for name in names]
+
+        values = numpy.full((len(series), len(keys), len(columns)), numpy.nan)
+        for i, each in enumerate(series):
+            for j, key in enumerate(keys):
+                value = found.get((each, key), None)
+                if not value:
+                    continue
+                for k, column in enumerate(columns):
+                    statistic = column.convert(value.get(column.key[0], None))
+                    if statistic is not None:
+                        values[i, j, k] = statistic
+        return Cube(values, series, keys, names, span)
+
+
+
+class Cube(object):
+
+    r"""
+    A cube of suburb performance statistics: series by period by metric.
+
+    :param values:
+        A three-dimensional NumPy array of the statistics, where missing
+        statistics are `NaN`.
+
+    :param series:
+        A list of the series (`(state, suburb_id, property_category,
+        bedrooms)` tuples) along the first axis.
+
+    :param periods:
+        A list of the periods (`(year, month)` tuples of their last month)
+        along the second axis.
+
+    :param metrics:
+        A list of the names of the statistics along the third axis.
+
+    :param span: [optional]
+        The number of months in each period.
+    """
+
+    def __init__(self, values, series, periods, metrics, span=3):
+        self.values = values
+        self.series = list(series)
+        self.periods = list(periods)
+        self.metrics = list(metrics)
+        self.span = span
+        return None
+
+
+    def __repr__(self):
+        return f"<Cube {len(self.series)} series × {len(self.periods)} periods "\
+               f"× {len(self.metrics)} metrics>"
+
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+
+    def metric(self, name):
+        r"""
+        Return a two-dimensional array (series by period) of one statistic.
+
+        :param name:
+            The name of the statistic (e.g., `median_sold_price`).
+        """
+        return self.values[:, :, self.metrics.index(name)]
+
+
+    def to_pandas(self):
+        r"""
+        Return the cube as a :class:`pandas.DataFrame` with a column for each
+        statistic, indexed by the series (state, suburb identifier, property
+        category, and bedrooms) and the period (as a monthly
+        :class:`pandas.Period` of its last month).
+        """
+        pandas = require("pandas", "export", "suburb performance cubes")
+        index = pandas.MultiIndex.from_tuples(
+            [(*each, pandas.Period(year=year, month=month, freq="M"))
+             for each, (year, month) in product(self.series, self.periods)],
+            names=["state", "suburb_id", "property_category", "bedrooms", "period"])
+        values = self.values.reshape((-1, len(self.metrics)))
+        return pandas.DataFrame(values, index=index, columns=self.metrics)
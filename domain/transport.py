@@ -0,0 +1,220 @@
+
+""" Transports (requests adapters) to send requests to the Domain API with. """
+
+import base64
+import io
+import json
+import os
+import threading
+from collections import (defaultdict, deque)
+from http import HTTPStatus
+from urllib.parse import (parse_qsl, urlencode, urlsplit, urlunsplit)
+
+import requests
+from requests.adapters import (BaseAdapter, HTTPAdapter)
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .exceptions import CassetteException
+
+__all__ = ["build_response", "LocalAdapter", "CassetteAdapter"]
+
+
+def build_response(request, status, headers=None, body=b"", connection=None):
+    r"""
+    Return a :class:`requests.Response` for a request, without a connection.
+
+    :param request:
+        The :class:`requests.PreparedRequest`.
+
+    :param status:
+        The HTTP status code.
+
+    :param headers: [optional]
+        A dictionary of response headers.
+
+    :param body: [optional]
+        The response body as bytes.
+
+    :param connection: [optional]
+        The adapter that the response came from.
+    """
+    response = requests.Response()
+    response.status_code = status
+    try:
+        response.reason = HTTPStatus(status).phrase
+    except ValueError:
+        response.reason = None
+    response.headers = CaseInsensitiveDict(headers or dict())
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.raw = io.BytesIO(body)
+    response.url = request.url
+    response.request = request
+    response.connection = connection
+    return response
+
+
+
+class LocalAdapter(HTTPAdapter):
+
+    r"""
+    A transport that sends every request to another host (e.g., a local
+    :class:`domain.standin.StandInServer`), keeping the path and query.
+
+    :param url:
+        The scheme and host to send requests to (e.g., `http://127.0.0.1:8080`).
+
+    Any other keyword arguments are given to :class:`requests.adapters.HTTPAdapter`.
+    """
+
+    def __init__(self, url, **kwargs):
+        parts = urlsplit(url)
+        self._target = (parts.scheme, parts.netloc)
+        super(LocalAdapter, self).__init__(**kwargs)
+        return None
+
+
+    def send(self, request, **kwargs):
+        request = request.copy()
+        parts = urlsplit(request.url)
+        request.url = urlunsplit(self._target + tuple(parts[2:]))
+        return super(LocalAdapter, self).send(request, **kwargs)
+
+
+
+def _request_key(request):
+    r"""
+    Return the key that a request is recorded and replayed by: the method and
+    the URL with sorted query parameters.
+    """
+    parts = urlsplit(request.url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{request.method} {urlunsplit(parts[:3] + (query, ''))}"
+
+
+# Headers that are not recorded, because the recorded body is already decoded.
+_unrecorded_headers = ("content-encoding", "content-length", "transfer-encoding",
+                       "connection", "set-cookie")
+
+
+class CassetteAdapter(BaseAdapter):
+
+    r"""
+    A transport that records requests and responses to a cassette (a JSON
+    file), or replays responses from one without any network access.
+
+    Authorization headers and access tokens are not recorded.
+
+    :param path:
+        The path of the cassette.
+
+    :param mode: [optional]
+        Either `record` (send requests, and record them), `replay` (only
+        replay recorded responses), or `once` (replay if the cassette exists,
+        otherwise record).
+
+    :param adapter: [optional]
+        The transport to send requests with while recording. Defaults to a
+        :class:`requests.adapters.HTTPAdapter`.
+    """
+
+    def __init__(self, path, mode="once", adapter=None):
+        super(CassetteAdapter, self).__init__()
+        if mode not in ("record", "replay", "once"):
+            raise ValueError("mode must be one of: record, replay, once")
+
+        self.path = path
+        self.recording = mode == "record" \
+                         or (mode == "once" and not os.path.exists(path))
+        self._adapter = adapter
+        self._interactions = []
+        self._replays = defaultdict(deque)
+        self._lock = threading.Lock()
+
+        if not self.recording:
+            with open(path, "r") as fp:
+                for interaction in json.load(fp):
+                    key = interaction["request"]["key"]
+                    self._replays[key].append(interaction["response"])
+        return None
+
+
+    def __len__(self):
+        return len(self._interactions) if self.recording \
+               else sum(map(len, self._replays.values()))
+
+
+    def send(self, request, **kwargs):
+        if self.recording:
+            return self._record(request, **kwargs)
+
+        key = _request_key(request)
+        with self._lock:
+            responses = self._replays.get(key, None)
+            if not responses:
+                raise CassetteException(f"no recorded response for {key} "
+                                        f"in {self.path}")
+            # Responses are replayed in order, and the last is repeated.
+            response = responses.popleft() if len(responses) > 1 \
+                       else responses[0]
+
+        body = response["body"]
+        body = base64.b64decode(body) if response.get("base64", False) \
+               else body.encode("utf-8")
+        return build_response(request, response["status"], response["headers"],
+                              body, connection=self)
+
+
+    def _record(self, request, **kwargs):
+        if self._adapter is None:
+            self._adapter = HTTPAdapter()
+
+        response = self._adapter.send(request, **kwargs)
+        body = response.content
+
+        if urlsplit(request.url).path.endswith("/connect/token"):
+            body = _redact_token(body)
+
+        try:
+            recorded_body, is_base64 = (body.decode("utf-8"), False)
+        except UnicodeDecodeError:
+            recorded_body, is_base64 = (base64.b64encode(body).decode(), True)
+
+        headers = dict((k, v) for k, v in response.headers.items()
+                       if k.lower() not in _unrecorded_headers)
+        interaction = dict(
+            request=dict(key=_request_key(request)),
+            response=dict(status=response.status_code, headers=headers,
+                          body=recorded_body, base64=is_base64))
+        with self._lock:
+            self._interactions.append(interaction)
+        return response
+
+
+    def save(self):
+        r""" Write the recorded interactions to the cassette. """
+        if not self.recording:
+            return None
+
+        with self._lock:
+            interactions = list(self._interactions)
+        with open(self.path, "w") as fp:
+            json.dump(interactions, fp, indent=1)
+        return None
+
+
+    def close(self):
+        self.save()
+        if self._adapter is not None:
+            self._adapter.close()
+
+
+
+def _redact_token(body):
+    try:
+        content = json.loads(body)
+    except ValueError:
+        return body
+    if isinstance(content, dict) and "access_token" in content:
+        content["access_token"] = "recorded"
+    return json.dumps(content).encode("utf-8")
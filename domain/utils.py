@@ -1,7 +1,12 @@
 
 """ General utilities. """
 
-__all__ = ["uri"]
+import importlib
+import pickle
+from email.utils import parsedate_to_datetime
+from time import time
+
+__all__ = ["uri", "number", "retry_after_seconds", "copied", "require"]
 
 def uri(end_point, host, version, scheme):
     r"""
@@ -21,3 +26,71 @@ def uri(end_point, host, version, scheme):
         The connection scheme (e.g., "https").
     """
     return f"{scheme}://{host}/{version}/{end_point}"
+
+
+def number(value):
+    r"""
+    Return the given value as a float, or `None` if it is not a number.
+
+    :param value:
+        The value (e.g., the value of a response header).
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(value):
+    r"""
+    Return the number of seconds given by a `Retry-After` header, or `None` if
+    the header is missing or invalid.
+
+    :param value:
+        The value of the header, which is either a number of seconds or an
+        HTTP date.
+    """
+    if value is None:
+        return None
+    seconds = number(value)
+    if seconds is not None:
+        return max(0, seconds)
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time())
+    except (TypeError, ValueError):
+        return None
+
+
+def copied(value):
+    r"""
+    Return a copy of a decoded response, so that it can be modified without
+    changing the response given to anyone else. Raw (immutable) responses are
+    returned as is.
+
+    :param value:
+        The decoded response.
+    """
+    if value is None or isinstance(value, (bytes, str, memoryview)):
+        return value
+    return pickle.loads(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def require(name, extra, purpose):
+    r"""
+    Return an optional package, or raise an `ImportError` that says how to
+    install it.
+
+    :param name:
+        The name of the package (e.g., `numpy`).
+
+    :param extra:
+        The name of the extra that installs the package (e.g., `export`).
+
+    :param purpose:
+        What the package is required for (e.g., `this export`).
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        raise ImportError(f"the {name} package is required for {purpose} "
+                          f"(e.g., pip install domain[{extra}])") from None
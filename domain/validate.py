@@ -1,41 +1,83 @@
 # -*- coding: utf-8 -*-
 
+from functools import lru_cache
+from types import MappingProxyType
+
+available_listing_types = ("Sale", "Rent", "Share", "Sold", "NewHomes")
+
+available_property_types = (
+    "AcreageSemiRural", "ApartmentUnitFlat",  "BlockOfUnits", "CarSpace",
+    "DevelopmentSite", "Duplex", "Farm", "NewHomeDesigns", "House",
+    "NewHouseLand", "NewLand", "NewApartments", "Penthouse",
+    "RetirementVillage", "Rural", "SemiDetached", "SpecialistFarm",
+    "Studio", "Terrace", "Townhouse", "VacantLand", "Villa")
+
+available_listing_attributes = ("HasPhotos", "HasPrice", "NotUpForAuction",
+    "NotUnderContract", "MarkedAsNew")
+
+available_cities = ("Sydney", "Melbourne", "Brisbane", "Adelaide", "Canberra")
+
+available_demographics_types = (
+    "AgeGroupOfPopulation",
+    "CountryOfBirth",
+    "NatureOfOccupancy",
+    "GeographicalPopulation",
+    "DwellingStructure",
+    "HousingLoanRepayment",
+    "MaritalStatus",
+    "Religion",
+    "Occupation",
+    "EducationAttendance",
+    "TransportToWork"
+)
+
+
+@lru_cache(maxsize=256)
+def lookup(available):
+    r"""
+    Return a read-only dictionary of the casefolded values and the values of
+    the given tuple, so that a value can be validated with one look up.
+
+    :param available:
+        A tuple of the valid values.
+    """
+    return MappingProxyType(dict((f"{each}".casefold(), each)
+                                 for each in reversed(available)))
+
+
+_listing_types = lookup(available_listing_types)
+_property_types = lookup(available_property_types)
+_listing_attributes = lookup(available_listing_attributes)
+_demographics_types = lookup(available_demographics_types)
+
 
 def case_insensitive_string(string, available, default=None):
 
     if string is None:
         return default
 
-    _available = [each.lower() for each in available]
+    if not isinstance(available, tuple):
+        available = tuple(available)
 
     try:
-        index = _available.index(f"{string}".lower())
+        return lookup(available)[f"{string}".casefold()]
 
-    except ValueError:
+    except KeyError:
         raise ValueError(f"unrecognised input ('{string}') - must be in {available}")
 
-    else:
-        return available[index]
-
 
 
 def listing_type(entry):
     if entry is None:
         return ""
 
-    available_listing_types = ["Sale", "Rent", "Share", "Sold", "NewHomes"]
-    _alt = [each.lower() for each in available_listing_types]
-
     try:
-        index = _alt.index(str(entry).lower())
+        return _listing_types[f"{entry}".casefold()]
 
-    except ValueError:
+    except KeyError:
         raise ValueError("listing type must be one of: {}".format(
             ", ".join(available_listing_types)))
 
-    else:
-        return available_listing_types[index]
-
 
 
 def property_types(entries):
@@ -43,29 +85,19 @@ def property_types(entries):
     if entries is None: 
         return [""]
 
-    available_property_types = [
-        "AcreageSemiRural", "ApartmentUnitFlat",  "BlockOfUnits", "CarSpace", 
-        "DevelopmentSite", "Duplex", "Farm", "NewHomeDesigns", "House", 
-        "NewHouseLand", "NewLand", "NewApartments", "Penthouse", 
-        "RetirementVillage", "Rural", "SemiDetached", "SpecialistFarm", 
-        "Studio", "Terrace", "Townhouse", "VacantLand", "Villa"]
-    _lower_pt = [each.lower() for each in available_property_types]
-
-    if isinstance(entries, (str, unicode)):
+    if isinstance(entries, str):
         entries = [entries]
 
     validated_entries = []
     for entry in entries:
         try:
-            index = _lower_pt.index(str(entry).lower())
+            validated_entries.append(_property_types[f"{entry}".casefold()])
 
-        except IndexError:
+        except KeyError:
             raise ValueError(
                 "Unrecognised property type '{}'. Available types: {}".format(
                     entry, ", ".join(available_property_types)))
 
-        validated_entries.append(available_property_types[index])
-
     return validated_entries
 
 
@@ -74,24 +106,39 @@ def listing_attributes(entries):
     if entries is None:
         return [""]
 
-    available_listing_attributes = ["HasPhotos", "HasPrice", "NotUpForAuction",
-        "NotUnderContract", "MarkedAsNew"]
-    _lower_la = [each.lower() for each in available_listing_attributes]
-
-    if isinstance(entries, (str, unicode)):
+    if isinstance(entries, str):
         entries = [entries]
 
     validated_entries = []
     for entry in entries:
         try:
-            index = _lower_la.index(str(entry).lower())
+            validated_entries.append(_listing_attributes[f"{entry}".casefold()])
 
-        except IndexError:
+        except KeyError:
             raise ValueError(
                 "Unrecognised listing attribute {}. Available attributes: {}"\
                 .format(entry, ", ".join(available_listing_attributes)))
 
-        validated_entries.append(available_listing_attributes[index])
+    return validated_entries
+
+
+
+def demographics_types(entries):
+    if entries is None:
+        return None
+
+    if isinstance(entries, str):
+        entries = [entries]
+
+    validated_entries = []
+    for entry in entries:
+        try:
+            validated_entries.append(_demographics_types[f"{entry}".casefold()])
+
+        except KeyError:
+            raise ValueError(
+                "Unrecognised demographics type '{}'. Available types: {}"\
+                .format(entry, ", ".join(available_demographics_types)))
 
     return validated_entries
 
@@ -111,8 +158,7 @@ def integer_range(entry, default_value=-1):
 
 
 def city(string, **kwargs):
-    cities = ("Sydney", "Melbourne", "Brisbane", "Adelaide", "Canberra")
-    return case_insensitive_string(string, cities, **kwargs)
+    return case_insensitive_string(string, available_cities, **kwargs)
 
 
 def advertiser_ids(entries):
@@ -120,8 +166,69 @@ def advertiser_ids(entries):
     if entries is None:
         return [""]
 
-    if isinstance(entries, (str, unicode)):
+    if isinstance(entries, str):
         entries = [entries]
 
     return entries
 
+
+
+def _hashable(value):
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def batch(parameters, **validators):
+    r"""
+    Validate many sets of parameters (e.g., for :meth:`DomainClient.batch`),
+    and return a list of the validated parameter dictionaries.
+
+    Each distinct value of a parameter is only validated once, so repeated
+    values cost one dictionary look up.
+
+    :param parameters:
+        An iterable of parameter dictionaries.
+
+    Keyword arguments give the validator for each parameter: either a function
+    (e.g., `city=validate.city`) or a tuple of the valid values, which are
+    matched case-insensitively (e.g., `level=("Postcode", "Suburb")`).
+    Parameters without a validator are unchanged.
+
+    :raises ValueError:
+        If any value is invalid. The message gives the index of the parameter
+        set.
+    """
+
+    functions = dict()
+    for name, validator in validators.items():
+        if not callable(validator):
+            validator = lambda value, available=tuple(validator): \
+                case_insensitive_string(value, available)
+        functions[name] = (validator, dict())
+
+    validated = []
+    for index, params in enumerate(parameters):
+        params = dict(params)
+        for name, (validator, memo) in functions.items():
+            value = params.get(name, None)
+            try:
+                key = _hashable(value)
+                params[name] = memo[key]
+                continue
+            except KeyError:
+                pass
+            except TypeError: # Unhashable values are not memoised.
+                key = None
+
+            try:
+                result = validator(value)
+            except ValueError as exception:
+                raise ValueError(f"parameter set {index}: {exception}") from None
+
+            if key is not None:
+                memo[key] = result
+            params[name] = result
+
+        validated.append(params)
+    return validated
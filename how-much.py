@@ -1,45 +1,116 @@
+import argparse
+import csv
+import json
 import sys
 import yaml
 
+from domain.address import AddressResolver
 from domain.client import DomainClient
 
 
-if __name__ == "__main__":
+def sold_details(dc, recent_listing_id):
 
-    dc = DomainClient("client_credentials.yaml")
+    # Get sold details.
+    listing = dc.listings(recent_listing_id)
 
-    # TODO: Check if it's a listing ID or URL
-    address_parts = sys.argv[1:]
-    if len(address_parts) == 1:
-        try:
-            recent_listing_id = int(address_parts[0])
-        except:
-            # URL
-            None
+    return dict(addressParts=listing["addressParts"],
+                saleDetails=listing["saleDetails"])
 
-    else:            
 
-        input_address = " ".join(sys.argv[1:])
+def most_recent_listing_id(dc, property_id):
 
-        properties_suggest = dc.properties_suggest(input_address)
+    property_ = dc.properties(property_id)
 
-        if properties_suggest[0]["relativeScore"] < 100:
-            raise a
+    # Get most recent listing.
+    try:
+        return sorted(set([ph["advertId"] for ph in property_.get("photos", [])]))[-1]
 
-        property_ = dc.properties(properties_suggest[0]["id"])
+    except IndexError:
+        raise ValueError(f"no property listings found for {property_['address']}")
 
-        # Get most recent listing.
-        try:
-            recent_listing_id = sorted(set([ph["advertId"] for ph in property_.get("photos", [])]))[-1]
 
-        except IndexError:
-            raise ValueError(f"no property listings found for {property_['address']}")
+def read_addresses(path):
+    with (sys.stdin if path == "-" else open(path, "r")) as fp:
+        for line in fp:
+            line = line.strip()
+            if line:
+                yield line
 
 
-    # Get sold details.
-    listing = dc.listings(recent_listing_id)
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(
+        description="Resolve addresses to Domain properties (in bulk), or give "
+                    "the sold details of a single address or listing.")
+    parser.add_argument("address", nargs="*",
+                        help="an address (or a listing ID) to give the sold details of")
+    parser.add_argument("-i", "--input",
+                        help="a file of addresses (one per line) to resolve, or - for stdin")
+    parser.add_argument("-o", "--output", default="-",
+                        help="where to write the resolutions (default: stdout)")
+    parser.add_argument("-f", "--format", choices=("csv", "json"), default="csv",
+                        help="the format of the resolutions (default: csv)")
+    parser.add_argument("-c", "--credentials", default="client_credentials.yaml",
+                        help="the path of the client credentials")
+    parser.add_argument("--cache", default="addresses.db",
+                        help="the path of the cache of resolved addresses")
+    parser.add_argument("--min-confidence", type=float, default=0.8,
+                        help="the minimum confidence of a resolution (default: 0.8)")
+    parser.add_argument("--max-workers", type=int, default=None,
+                        help="the number of concurrent requests")
+    parser.add_argument("--refresh", action="store_true",
+                        help="request addresses from the API, even if they are cached")
+    args = parser.parse_args(argv)
+    if not args.address and args.input is None:
+        parser.error("give an address, a listing ID, or --input")
+    return args
+
+
+if __name__ == "__main__":
+
+    args = parse_args()
+
+    kwds = dict() if args.max_workers is None else dict(max_workers=args.max_workers)
+    dc = DomainClient(args.credentials, **kwds)
+    resolver = AddressResolver(dc, cache=args.cache,
+                               min_confidence=args.min_confidence)
+
+    if args.input is not None:
+        # Resolve addresses in bulk.
+        fields = ("input", "normalised", "property_id", "address", "confidence",
+                  "source", "error")
+        output = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+        with output:
+            if args.format == "csv":
+                writer = csv.DictWriter(output, fields, extrasaction="ignore")
+                writer.writeheader()
+                write = writer.writerow
+            else:
+                write = lambda row: output.write(
+                    json.dumps({k: row.get(k, None) for k in fields}) + "\n")
+
+            for resolution in resolver.resolve_many(read_addresses(args.input),
+                                                    refresh=args.refresh):
+                write(resolution)
+
+    else:
+        address_parts = args.address
+        try:
+            if len(address_parts) != 1:
+                raise ValueError("an address, not a listing ID")
+            recent_listing_id = int(address_parts[0])
+
+        except ValueError:
+            input_address = " ".join(address_parts)
+            resolution = resolver.resolve(input_address, refresh=args.refresh)
+            if resolution.get("error", None) is not None:
+                raise RuntimeError(f"could not resolve {input_address}: "
+                                   f"{resolution['error']}")
+            if resolution["property_id"] is None:
+                raise ValueError(f"could not resolve {input_address} "
+                                 f"(best match: {resolution['address']} with "
+                                 f"confidence {resolution['confidence']:.2f})")
 
-    details = dict(addressParts=listing["addressParts"],
-                   saleDetails=listing["saleDetails"])
+            recent_listing_id = most_recent_listing_id(dc, resolution["property_id"])
 
-    print(yaml.dump(details, sort_keys=True, indent=2))
+        print(yaml.dump(sold_details(dc, recent_listing_id), sort_keys=True, indent=2))
@@ -34,7 +34,10 @@ setup(
     packages=["domain", "domain.authorisation"],
     install_requires=["requests", "pyyaml"],
     extras_require={
-        "test": ["coverage"]
+        "test": ["coverage", "pytest"],
+        "fast": ["orjson"],
+        "export": ["numpy", "pandas", "pyarrow"],
+        "geo": ["numpy"]
     },
     package_data={
         "": ["LICENSE"],
@@ -0,0 +1,45 @@
+
+""" Fixtures for testing the client against the stand-in API. """
+
+import pytest
+import yaml
+
+from domain.client import DomainClient
+from domain.standin import (StandIn, StandInAdapter)
+
+
+@pytest.fixture
+def credentials(tmp_path):
+    r"""
+    Return a function that writes client credentials for a package and plan,
+    and returns their path.
+    """
+    def write(plans=("PropertyAndLocationBusinessPlan", ), rate_limit=1000,
+              **kwargs):
+        path = tmp_path / "client_credentials.yaml"
+        path.write_text(yaml.dump([
+            dict(client_id=f"client-{i}", client_secret="secret",
+                 package_and_plan=plan, rate_limit=rate_limit, **kwargs)
+            for i, plan in enumerate(plans)]))
+        return f"{path}"
+    return write
+
+
+@pytest.fixture
+def client(credentials):
+    r"""
+    Return a function that returns a client of a stand-in API with some
+    routes (and any other keywords given to :class:`domain.standin.StandIn`).
+    """
+    clients = []
+    def make(plans=("PropertyAndLocationBusinessPlan", ), rate_limit=1000,
+             standin=None, **kwargs):
+        standin = standin or StandIn()
+        kwargs.setdefault("retry", False)
+        dc = DomainClient(credentials(plans, rate_limit),
+                          transport=StandInAdapter(standin), **kwargs)
+        clients.append(dc)
+        return dc
+    yield make
+    for dc in clients:
+        dc.close()
@@ -0,0 +1,114 @@
+
+""" Tests of resolving addresses to properties. """
+
+from domain.address import (AddressResolver, given, normalise)
+from domain.standin import StandIn
+
+
+def suggest(suggestions, calls=None):
+    r""" Return a route that suggests the same addresses for every term. """
+    def route(standin, end_point, params):
+        if calls is not None:
+            calls.append(params["terms"])
+        return suggestions
+    return route
+
+
+def test_normalise():
+    assert normalise("Unit 3, 12 Smith Street, Kew, Victoria 3101") \
+        == "3/12 smith st kew vic 3101"
+    assert normalise("U4 55 High St.") == "4/55 high st"
+    assert normalise("Unley Road, Unley SA 5061") == "unley rd unley sa 5061"
+    assert normalise("12 Flat Rock Road") == "12 flat rock rd"
+
+
+def test_given():
+    assert given("12 smith st kew vic 3101", "12 smith st kew") \
+        == "12 smith st kew"
+    assert given("3/12 smith st kew vic 3101", "3/12 smith st kew 3101") \
+        == "3/12 smith st kew 3101"
+
+
+def test_resolve_without_state_or_postcode(client):
+    standin = StandIn(routes={"properties/_suggest": suggest([
+        dict(id="A", address="12 Smith Street, Kew VIC 3101", relativeScore=100),
+        dict(id="B", address="21 Smith Street, Kew VIC 3101", relativeScore=60)])})
+    resolver = AddressResolver(client(standin=standin))
+
+    resolution = resolver.resolve("12 Smith St, Kew")
+    assert resolution["property_id"] == "A"
+    assert resolution["confidence"] == 1.0
+    assert resolution["source"] == "suggest"
+
+
+def test_min_confidence_applied_to_cached(client):
+    calls = []
+    standin = StandIn(routes={"properties/_suggest": suggest([
+        dict(id="A", address="12 Smith Street, Kew VIC 3101", relativeScore=60)],
+        calls)})
+    dc = client(standin=standin)
+    resolver = AddressResolver(dc)
+
+    resolution = resolver.resolve("12 Smith St, Kew")
+    assert resolution["property_id"] is None
+    assert resolution["address"] == "12 Smith Street, Kew VIC 3101"
+    assert resolution["confidence"] == 0.6
+
+    lenient = AddressResolver(dc, cache=resolver.cache, min_confidence=0.5)
+    resolution = lenient.resolve("12 Smith St, Kew")
+    assert resolution["property_id"] == "A"
+    assert resolution["source"] == "cache"
+    assert len(calls) == 1
+
+
+def test_failed_requests_are_not_cached(client):
+    calls = []
+    def route(standin, end_point, params):
+        calls.append(params["terms"])
+        if len(calls) == 1:
+            return (500, dict(message="Internal Server Error"))
+        return [dict(id="A", address="12 Smith St, Kew", relativeScore=100)]
+
+    resolver = AddressResolver(client(
+        standin=StandIn(routes={"properties/_suggest": route})))
+    failed = resolver.resolve("12 Smith St, Kew")
+    assert failed["source"] == "error"
+    assert failed["error"] is not None
+
+    resolution = resolver.resolve("12 Smith St, Kew")
+    assert resolution["property_id"] == "A"
+    assert resolution["source"] == "suggest"
+    assert len(calls) == 2
+
+
+def test_failed_locate_keeps_suggestion(client):
+    def locate(standin, end_point, params):
+        return (500, dict(message="Internal Server Error"))
+
+    standin = StandIn(routes={
+        "properties/_suggest": suggest([
+            dict(id="A", address="12 Smith St, Kew", relativeScore=100)]),
+        "addressLocators": locate})
+    resolver = AddressResolver(client(standin=standin), locate=True)
+
+    resolution = resolver.resolve("12 Smith St, Kew")
+    assert resolution["property_id"] == "A"
+    assert resolution["source"] == "suggest"
+    assert resolution.get("error", None) is None
+    assert resolution["locate_error"] is not None
+    assert resolver.resolve("12 Smith St, Kew")["source"] == "cache"
+
+
+def test_resolve_many_keeps_order(client):
+    resolver = AddressResolver(client(standin=StandIn(routes={
+        "properties/_suggest": lambda standin, end_point, params: [
+            dict(id=params["terms"], address=params["terms"], relativeScore=100)]
+    })), chunk_size=2)
+
+    addresses = ["1 High St Kew", "2 High St Kew", "1 High Street, Kew", "",
+                 "3 High St Kew"]
+    resolutions = list(resolver.resolve_many(addresses))
+    assert [r["input"] for r in resolutions] == addresses
+    assert [r["property_id"] for r in resolutions] \
+        == ["1 high st kew", "2 high st kew", "1 high st kew", None,
+            "3 high st kew"]
@@ -0,0 +1,49 @@
+
+""" Tests of caching and coalescing responses. """
+
+import hashlib
+import json
+import time
+
+from domain.cache import (DAY, MemoryCache, cache_ttl)
+from domain.standin import (StandIn, _property)
+
+
+def test_cached_responses_are_copies(client):
+    dc = client(cache=MemoryCache())
+    first = dc.properties(12)
+    first["address"] = "changed"
+
+    second = dc.properties(12)
+    assert second is not first
+    assert second["address"] != "changed"
+    assert dc.cache.stats == dict(hits=1, misses=1)
+
+
+def test_sales_results_expire():
+    assert cache_ttl("salesResults/Melbourne") == DAY
+    assert cache_ttl("salesResults/Melbourne/listings") == DAY
+
+
+def test_coalesced_responses_are_copies(client):
+    standin = StandIn(latency=0.2)
+    dc = client(standin=standin)
+    results = list(dc.map_endpoint("properties", [12] * 4))
+
+    assert standin.stats["requests"] == 1
+    assert all(result == results[0] for result in results)
+    assert len(set(map(id, results))) == 4
+
+
+def test_not_modified_without_cached_response(client):
+    dc = client()
+    etag = '"' + hashlib.md5(json.dumps(_property(12)).encode()).hexdigest() + '"'
+    assert dc.properties(12, headers={"If-None-Match": etag}) == _property(12)
+
+
+def test_revalidated_response(client):
+    dc = client(cache=MemoryCache(), cache_ttls={"properties/*": 0.01})
+    assert dc.properties(12) == _property(12)
+    time.sleep(0.02)
+    assert dc.properties(12) == _property(12)
+    assert dc.cache.stats == dict(hits=1, misses=1)
@@ -0,0 +1,74 @@
+
+""" Tests of exporting results to columnar formats. """
+
+from datetime import datetime
+
+import pytest
+
+from domain import export
+from domain.standin import (StandIn, _listing)
+
+numpy = pytest.importorskip("numpy")
+
+
+def listings():
+    listings = [_listing(i) for i in range(100)]
+    listings[1]["dateUpdated"] = "2019-05-20T14:28:43+10:00"
+    listings[2]["dateUpdated"] = "2019-05-20"
+    listings[3]["priceDetails"] = dict(price="12")
+    listings[4]["id"] = None
+    listings[5]["priceDetails"] = None
+    return listings
+
+
+@pytest.mark.parametrize("name", export.schemas["agencies_listings"].names)
+def test_arrays_match_values(name):
+    records = listings()
+    column = dict(zip(export.schemas["agencies_listings"].names,
+                      export.schemas["agencies_listings"].columns))[name]
+    values, missing = column.array(records, numpy)
+    expected = column.values(records)
+    assert list(missing) == [value is None for value in expected]
+    assert [value.item() if hasattr(value, "item") else value
+            for value, absent in zip(values, missing) if not absent] \
+        == [value for value in expected if value is not None]
+
+
+def test_dates_are_utc():
+    column = export.Column("date_updated", "dateUpdated", "datetime")
+    values, missing = column.array(listings()[:3], numpy)
+    assert values[1].item() == datetime(2019, 5, 20, 4, 28, 43)
+    assert values[2].item() == datetime(2019, 5, 20)
+    assert column.values(listings()[:3])[1:] == [datetime(2019, 5, 20, 4, 28, 43),
+                                                 datetime(2019, 5, 20)]
+
+
+def test_unordered_map_endpoint(client):
+    dc = client(("AgentsAndListingsBusinessPlan", ), standin=StandIn(listings=30))
+    results = dc.map_endpoint("agencies_listings", [1, 2, 3], ordered=False)
+    frame = export.to_pandas(results, "agencies_listings")
+    assert len(frame) == 60
+    assert frame["id"].is_unique
+
+
+def test_to_pandas():
+    pandas = pytest.importorskip("pandas")
+    frame = export.to_pandas(listings(), "agencies_listings", chunk_size=30)
+    assert len(frame) == 100
+    assert str(frame["id"].dtype) == "Int64"
+    assert frame["id"].isna().sum() == 1
+    assert frame["price"][3] == 12
+    assert pandas.isna(frame["price"][5])
+
+
+def test_to_arrow():
+    pytest.importorskip("pyarrow")
+    table = export.to_arrow(listings(), "agencies_listings", chunk_size=30)
+    assert table.num_rows == 100
+    assert table.column("id").null_count == 1
+
+
+def test_to_numpy():
+    array = export.to_numpy(listings(), "agencies_listings", chunk_size=30)
+    assert len(array) == 100
+    assert array["id"].mask.sum() == 1
@@ -0,0 +1,46 @@
+
+""" Tests of the response models. """
+
+import pickle
+from datetime import datetime
+
+from domain import models
+from domain.standin import _listing
+
+
+def test_nested_models_are_built_on_first_access():
+    listing = models.Listing(_listing(1))
+    assert isinstance(models.Listing._address.__get__(listing), dict)
+
+    address = listing.address
+    assert isinstance(address, models.Address)
+    assert listing.address is address
+    assert models.Listing._address.__get__(listing) is address
+    assert listing["addressParts"] is address
+
+
+def test_dates_are_parsed_once():
+    data = _listing(1)
+    listing = models.Listing(data)
+    date_listed = listing.date_listed
+    assert isinstance(date_listed, datetime)
+    assert listing.date_listed is date_listed
+    assert listing["dateListed"] == data["dateListed"]
+
+
+def test_to_dict_gives_the_response():
+    data = _listing(1)
+    listing = models.Listing(data)
+    for name in ("address", "media", "date_listed", "date_updated"):
+        getattr(listing, name)
+    assert listing.to_dict() == data
+    assert pickle.loads(pickle.dumps(listing)) == listing
+
+
+def test_missing_and_extra_keys():
+    listing = models.Listing(dict(id=1, virtualTourUrl="https://example.com"))
+    assert listing.address is None
+    assert listing.date_listed is None
+    assert listing.virtual_tour_url == "https://example.com"
+    assert "addressParts" not in listing
+    assert set(listing) == {"id", "virtualTourUrl"}
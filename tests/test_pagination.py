@@ -0,0 +1,49 @@
+
+""" Tests of iterating over paginated end points. """
+
+import asyncio
+
+from domain.client import AsyncDomainClient
+from domain.standin import (StandIn, StandInAdapter)
+
+
+PLANS = ("AgentsAndListingsBusinessPlan", )
+
+
+def test_iter_agencies_listings(client):
+    standin = StandIn(listings=450)
+    dc = client(PLANS, standin=standin)
+    listings = list(dc.iter_agencies_listings(1, prefetch=0))
+
+    assert len(listings) == 450
+    assert len(set(listing["id"] for listing in listings)) == 450
+    assert standin.stats["requests"] == 3
+
+
+def test_iter_agencies_listings_page_size(client):
+    standin = StandIn(listings=450)
+    dc = client(PLANS, standin=standin)
+    listings = list(dc.iter_agencies_listings(1, page_size=50, prefetch=0))
+
+    assert len(listings) == 450
+    assert standin.stats["requests"] == 10
+
+
+def test_iter_agents_search_page_size(client):
+    dc = client(PLANS)
+    assert len(list(dc.iter_agents_search("smith"))) == 50
+    assert len(list(dc.iter_agents_search("smith", page_size=7))) == 50
+
+
+def test_async_iter_agencies_listings(credentials):
+    async def collect():
+        client = AsyncDomainClient(credentials(PLANS),
+                                   transport=StandInAdapter(StandIn(listings=450)),
+                                   retry=False)
+        try:
+            return [listing async for listing in
+                    client.iter_agencies_listings(1, page_size=100)]
+        finally:
+            client.close()
+
+    assert len(asyncio.run(collect())) == 450
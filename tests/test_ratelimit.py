@@ -0,0 +1,56 @@
+""" Tests of client-side rate limiting. """
+
+import time
+
+import pytest
+
+from domain.exceptions import QuotaExceededException
+from domain.ratelimit import (Quota, RateLimiter, SlidingWindow, TokenBucket)
+from domain.standin import StandIn
+
+
+def test_sliding_window_reservations():
+    limiter = RateLimiter(SlidingWindow(5))
+    delays = [limiter.reserve() for _ in range(10)]
+    assert max(delays[:5]) == 0
+    assert all(0.9 < delay <= 1 for delay in delays[5:])
+
+
+def test_token_bucket_reservations():
+    limiter = RateLimiter(TokenBucket(10, capacity=2))
+    delays = [limiter.reserve() for _ in range(4)]
+    assert delays[:2] == [0, 0]
+    assert delays[2] == pytest.approx(0.1, abs=0.01)
+    assert delays[3] == pytest.approx(0.2, abs=0.01)
+
+
+def test_quota_exhausted():
+    limiter = RateLimiter(quota=Quota(2))
+    limiter.reserve()
+    limiter.reserve()
+    assert limiter.exhausted
+    with pytest.raises(QuotaExceededException):
+        limiter.reserve()
+
+
+def test_headers_update_limiter():
+    limiter = RateLimiter(quota=Quota(500))
+    limiter.update({"Retry-After": "1", "X-Quota-PerDay-Limit": "100",
+                    "X-Quota-PerDay-Remaining": "40"})
+    assert limiter.remaining == 40
+    assert 0.9 < limiter.reserve() <= 1
+
+
+def test_client_is_not_throttled(client):
+    # The client keeps under the server's rate limit instead of relying on 429s
+    # (with some room for the time that requests take to arrive).
+    standin = StandIn(rate_limit=10)
+    dc = client(rate_limit=8, standin=standin)
+    t_init = time.time()
+    results = list(dc.map_endpoint("properties", range(15)))
+    elapsed = time.time() - t_init
+
+    assert not any(isinstance(result, Exception) for result in results)
+    assert standin.stats["requests"] == 15
+    assert standin.stats["throttled"] == 0
+    assert elapsed >= 0.9
@@ -0,0 +1,91 @@
+
+""" Tests of retrying failed requests. """
+
+import pytest
+import requests
+
+from domain.exceptions import CircuitOpenException
+from domain.retry import (CircuitBreaker, Retry, RetryPolicy)
+from domain.standin import StandIn
+
+
+class Response(object):
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or dict()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def sender(*status_codes):
+    r""" Return a function that sends responses with the given status codes. """
+    responses = [Response(status_code) for status_code in status_codes]
+    sent = iter(responses)
+    return (lambda: next(sent), responses)
+
+
+def test_retry_until_success():
+    send, responses = sender(503, 500, 200)
+    retry = Retry(RetryPolicy(backoff_factor=0), budget=False)
+    assert retry.call("host", send) is responses[-1]
+    assert [response.closed for response in responses] == [True, True, False]
+
+
+def test_retry_limits():
+    send, responses = sender(500, 500, 500, 200)
+    retry = Retry(RetryPolicy(backoff_factor=0), budget=False)
+    assert retry.call("host", send).status_code == 500
+    assert not responses[2].closed
+
+
+def test_rate_limiting_is_not_a_success():
+    breaker = CircuitBreaker(threshold=3)
+    breaker.failure()
+    breaker.failure()
+    breaker.neutral()
+    assert breaker.failures == 2
+    breaker.failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_circuit_opens():
+    send, responses = sender(*([503] * 10))
+    retry = Retry(RetryPolicy(backoff_factor=0, statuses={503: 10}, total=10),
+                  budget=False, breaker_threshold=3)
+    with pytest.raises(CircuitOpenException):
+        retry.call("host", send)
+    assert retry.breaker("host").failures == 3
+
+
+def test_half_open_trial_rate_limited():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    breaker.failure()
+    assert breaker.allow()
+    assert breaker.state == "half-open"
+    breaker.neutral()
+    assert breaker.state == "open"
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed"
+
+
+def test_client_retries_transient_failures(client):
+    standin = StandIn(failures={503: 0.3, 502: 0.1}, seed=1)
+    policy = RetryPolicy(backoff_factor=0, respect_retry_after=False)
+    dc = client(standin=standin, retry=Retry(policy, budget=False))
+    results = list(dc.map_endpoint("properties", range(50)))
+    assert not any(isinstance(result, Exception) for result in results)
+    assert standin.stats["failed 503"] > 0
+    assert standin.stats["failed 502"] > 0
+
+
+def test_client_without_retries(client):
+    standin = StandIn(failures={503: 1.0})
+    dc = client(standin=standin, retry=False)
+    with pytest.raises(requests.HTTPError):
+        dc.properties(1)
+    assert standin.stats["requests"] == 1
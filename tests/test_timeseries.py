@@ -0,0 +1,66 @@
+""" Tests of planning and assembling suburb performance time series. """
+
+import math
+from datetime import (datetime, timezone)
+
+import numpy
+
+from domain.standin import StandIn
+from domain.timeseries import (SuburbPerformance, period, periods)
+
+
+def test_periods():
+    assert period((2020, 5), 3) == (2020, 6)
+    assert period("2020-05-17", 6) == (2020, 6)
+    assert period((2020, 7), 12) == (2020, 12)
+    assert periods((2020, 1), (2020, 12)) == [(2020, 3), (2020, 6), (2020, 9),
+                                              (2020, 12)]
+
+
+def test_plan_uses_fewest_calls(client):
+    ts = SuburbPerformance(client(), max_periods=8)
+    series = ts.series([("VIC", 1)], categories=("house", "unit"))
+    calls = ts.plan(series, (2020, 1), (2022, 12), today=(2022, 12))
+
+    # 12 quarters for each of two series, in windows of at most 8 quarters.
+    assert len(calls) == 4
+    for each in series:
+        windows = sorted((call["tPlusFrom"], call["tPlusTo"]) for call in calls
+                         if call["property_category"] == each[2])
+        assert windows == [(1, 4), (5, 12)]
+
+
+def test_plan_skips_future_periods(client):
+    ts = SuburbPerformance(client())
+    calls = ts.plan(ts.series([("VIC", 1)]), (2022, 1), (2025, 12),
+                    today=(2022, 6))
+    assert [(call["tPlusFrom"], call["tPlusTo"]) for call in calls] == [(1, 2)]
+
+
+def test_cube_requests_only_missing_periods(client):
+    standin = StandIn()
+    ts = SuburbPerformance(client(standin=standin), max_periods=4)
+    today = datetime.now(timezone.utc)
+    end = (today.year, today.month)
+    start = (today.year - 1, today.month)
+    suburbs = [("VIC", 1), ("NSW", 2)]
+
+    cube = ts.cube(suburbs, start, end)
+    assert cube.shape[:2] == (2, len(periods(start, end)))
+    assert not math.isnan(cube.metric("median_sold_price").sum())
+    requests = standin.stats["requests"]
+    assert requests == 2 * 2
+
+    # Everything is cached now.
+    assert ts.plan(ts.series(suburbs), start, end) == []
+    again = ts.cube(suburbs, start, end)
+    assert standin.stats["requests"] == requests
+    assert numpy.array_equal(again.values, cube.values, equal_nan=True)
+
+    # Extending the range only requests the earlier periods.
+    earlier = (today.year - 2, today.month)
+    calls = ts.plan(ts.series(suburbs), earlier, end)
+    assert len(calls) == 2
+    assert all(call["tPlusFrom"] > len(periods(start, end)) for call in calls)
+    ts.cube(suburbs, earlier, end)
+    assert standin.stats["requests"] == requests + 2